@@ -0,0 +1,490 @@
+#!/usr/bin/env python
+
+import os, sys, random, time
+
+BENCHES = {}
+
+def bench(name):
+    def wrap(fn):
+        BENCHES[name] = fn
+        return fn
+    return wrap
+
+def timed(label, fn, *args, n=1):
+    start = time.perf_counter()
+    for _ in range(n):
+        r = fn(*args)
+    elapsed = (time.perf_counter() - start) / n
+    print(f"  {label:<40} {elapsed * 1000:>10.2f} ms")
+    return r, elapsed
+
+LATIN_LETTERS = "abcdefghilmnopqrstuvxāēīōūăĕĭŏŭ"
+
+def random_forms(count, seed=0):
+    rnd = random.Random(seed)
+    return [
+        "".join(rnd.choice(LATIN_LETTERS) for _ in range(rnd.randint(3, 12)))
+        for _ in range(count)
+    ]
+
+@bench("normalize")
+def bench_normalize(count=2_000_000):
+    from normalize import fold, _slow_fold, normalize_key
+
+    forms = random_forms(count)
+    print(f"normalize {count} forms")
+    _, base = timed("NFD + unicodedata.category", lambda: [_slow_fold(f) for f in forms])
+    _, fast = timed("precomputed fold", lambda: [fold(f) for f in forms])
+    timed("precomputed normalize_key (interned)", lambda: [normalize_key(f) for f in forms])
+    print(f"  speedup: {base / fast:.1f}x")
+
+def synthetic_page(rnd, i):
+    boiler = "".join(
+        f'<div class="menu-item"><a href="/section{k}.php">Section {k}</a></div>\n' for k in range(300)
+    )
+    words = random_forms(40, seed=i)
+    body = "".join(
+        f'<div class="ff_tbl_container"><span class="radice">{w[:4]}</span>'
+        f'<span class="desinenza">{w[4:]}</span></div>\n' for w in words
+    )
+    return (f"<html><head><title>Latin dictionary</title></head><body>\n{boiler}"
+            f'<div id="myth">\n{body}</div>\n{boiler}</body></html>')
+
+def sample_pages(count):
+    from core import default_core
+    page_cache = default_core().pages
+
+    pages = []
+    for p in page_cache.pages():
+        with open(p, 'rb') as f:
+            pages.append(page_cache.codec.decode(f.read()))
+        if len(pages) >= count:
+            return pages, "cached"
+
+    rnd = random.Random(0)
+    return [synthetic_page(rnd, i) for i in range(count)], "synthetic"
+
+@bench("pagecache")
+def bench_pagecache(count=300):
+    import tempfile
+    from cache import PageCache
+
+    pages, origin = sample_pages(count)
+    raw_size = sum(len(str.encode(p)) for p in pages)
+    print(f"page cache with {len(pages)} {origin} pages, {raw_size / 1024:.0f} KiB raw")
+
+    variants = [("raw", False, False), ("zlib", True, False), ("zlib + dictionary", True, True)]
+    for label, compress, trained in variants:
+        with tempfile.TemporaryDirectory() as root:
+            cache = PageCache(root, compress=compress, auto_train=False)
+            if trained:
+                cache.codec.train(pages[:100])
+
+            urls = [f"page{i}" for i in range(len(pages))]
+            for u, p in zip(urls, pages):
+                cache.put(u, p)
+            size = sum(os.path.getsize(cache.path(u)) for u in urls)
+
+            _, hit = timed(f"{label} ({size / 1024:.0f} KiB, {raw_size / size:.1f}x)",
+                           lambda: [cache.get(u) for u in urls])
+            print(f"  {'':<40} {hit / len(pages) * 1e6:>10.0f} us per hit")
+
+    try:
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return
+    _, parse = timed("BeautifulSoup parse", lambda: [BeautifulSoup(p, 'html.parser') for p in pages])
+    print(f"  per parse: {parse / len(pages) * 1e6:.0f} us")
+
+@bench("batching")
+def bench_batching(count=200, threads=16, latency=0.3):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from openai import OpenAI
+    from explainer import Explaination, ExplainBatcher, OpenAIBackend
+    import fakellm
+
+    server = fakellm.serve(0, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+
+    # a fifth of the requests repeat a word, as in real use
+    words = random_forms(count * 4 // 5, seed=1)
+    words += words[:count - len(words)]
+    print(f"explain {len(words)} words from {threads} threads, {latency * 1000:.0f} ms per call")
+
+    with ThreadPoolExecutor(threads) as pool:
+        _, single = timed("one call per word",
+                          lambda: list(pool.map(lambda w: Explaination(client, [w]), words)))
+
+        batcher = ExplainBatcher(OpenAIBackend(client))
+        _, batched = timed("micro-batched",
+                           lambda: list(pool.map(lambda w: batcher.submit(w).result(), words)))
+        batcher.close()
+
+    print(f"  {'':<40} {len(words) / single:>10.1f} words/s per call")
+    print(f"  {'':<40} {len(words) / batched:>10.1f} words/s batched")
+    server.shutdown()
+
+@bench("backends")
+def bench_backends(count=10_000):
+    from explainer import LocalBackend, FakeBackend, ExplainSubject
+
+    subjects = [
+        ExplainSubject(w, "verb, 1st conjugation", ["to love", "to like", "to be fond of"])
+        for w in random_forms(count, seed=2)
+    ]
+    words = [s.expression for s in subjects]
+    print(f"explain {count} words one at a time")
+
+    for backend in (LocalBackend(), FakeBackend(latency=0.0)):
+        _, t = timed(backend.name, lambda: [
+            backend.explain([w], subjects=[s]) for w, s in zip(words, subjects)
+        ])
+        print(f"  {'':<40} {t / count * 1e6:>10.1f} us per word")
+
+class SyntheticEntry:
+    # duck-types the LatinDictEntry fields a snapshot stores
+    def __init__(self, rnd, lemma):
+        from snapshot import _Meaning, _Table, _Plane, _Cell
+
+        self.meaning = _Meaning(lemma, "verb, 1st conjugation", random_forms(4, seed=rnd.random()))
+        self.require_clarify = False
+        stem = lemma[:-1]
+        table = _Table()
+        for mood in ("Indicativo", "Congiuntivo", "Imperativo"):
+            plane = _Plane()
+            for tense in ("Presente", "Imperfetto", "Futuro"):
+                plane.groups[tense] = [
+                    _Cell(person, [(stem, ending, "")])
+                    for person, ending in zip("123456", ("o", "as", "at", "amus", "atis", "ant"))
+                ]
+            table.planes[mood] = plane
+        self.__flexions = { "Attivo": table, "Passivo": None }
+
+    def variant(self):
+        return ""
+
+    def sources(self):
+        from xdict import LookupContext
+        return [LookupContext(self.meaning.lemma).entry]
+
+    def is_partial(self):
+        return False
+
+    def is_generated(self):
+        return False
+
+    def similars(self):
+        return []
+
+    def explaination(self):
+        return None
+
+    def flexions(self):
+        return self.__flexions
+
+def memory_usage():
+    usage = {}
+    for path, keys in (("/proc/self/status", ("VmRSS", )), ("/proc/self/smaps_rollup", ("Pss", ))):
+        try:
+            with open(path) as f:
+                for line in f:
+                    k, _, v = line.partition(":")
+                    if k in keys:
+                        usage[k] = int(v.split()[0])
+        except FileNotFoundError:
+            pass
+    return usage
+
+def snapshot_worker(kind, path, lemmas, out):
+    import pickle
+    from snapshot import Snapshot
+
+    start = time.perf_counter()
+    if kind == "mmap":
+        snap = Snapshot(path)
+        get = snap.get
+    else:
+        with open(path, 'rb') as f:
+            entries = pickle.load(f)
+        get = entries.get
+    cold = time.perf_counter() - start
+
+    for w in lemmas:
+        get(w).flexions()
+    out.put((cold, time.perf_counter() - start, memory_usage()))
+
+@bench("snapshot")
+def bench_snapshot(count=10_000, lookups=1_000):
+    import pickle, tempfile, multiprocessing
+    from snapshot import build_snapshot
+
+    rnd = random.Random(3)
+    lemmas = list(dict.fromkeys(f + "o" for f in random_forms(count, seed=3)))
+    entries = [SyntheticEntry(rnd, w) for w in lemmas]
+    probe = rnd.sample(lemmas, min(lookups, len(lemmas)))
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as root:
+        snap_path = os.path.join(root, "entries.snap")
+        pickle_path = os.path.join(root, "entries.pickle")
+        timed("build snapshot", build_snapshot, entries, snap_path)
+        with open(pickle_path, 'wb') as f:
+            pickle.dump({ e.meaning.lemma: e for e in entries }, f)
+        del entries
+
+        print(f"{len(lemmas)} entries, snapshot {os.path.getsize(snap_path) / 2**20:.1f} MiB, "
+              f"pickle {os.path.getsize(pickle_path) / 2**20:.1f} MiB, {len(probe)} lookups per worker")
+        print(f"  {'':<24} {'cold start':>12} {'+ lookups':>12} {'RSS/proc':>12} {'PSS total':>12}")
+
+        for procs in (1, 4, 16):
+            for kind, path in (("pickle", pickle_path), ("mmap", snap_path)):
+                out = ctx.Queue()
+                workers = [ctx.Process(target=snapshot_worker, args=(kind, path, probe, out))
+                           for _ in range(procs)]
+                for p in workers:
+                    p.start()
+                results = [out.get() for _ in workers]
+                for p in workers:
+                    p.join()
+
+                cold = sum(r[0] for r in results) / procs
+                total = sum(r[1] for r in results) / procs
+                rss = sum(r[2].get("VmRSS", 0) for r in results) / procs
+                pss = sum(r[2].get("Pss", 0) for r in results)
+                print(f"  {f'{kind} x{procs}':<24} {cold * 1000:>9.1f} ms {total * 1000:>9.1f} ms "
+                      f"{rss / 1024:>8.1f} MiB {pss / 1024:>8.1f} MiB")
+
+@bench("meanings")
+def bench_meanings(count=40_000, queries=2_000):
+    import tempfile
+    from cache import MeaningIndex
+
+    rnd = random.Random(4)
+    vocab = random_forms(5_000, seed=4)
+    lemmas = random_forms(count, seed=5)
+
+    with tempfile.TemporaryDirectory() as root:
+        index = MeaningIndex(os.path.join(root, "meanings.pickle"))
+
+        def build():
+            for lemma in lemmas:
+                for _ in range(3):
+                    gloss = "to " + " ".join(rnd.choices(vocab, k=rnd.randint(1, 4)))
+                    index.add(gloss, lemma, '', "verb")
+        timed(f"index {count} lemmas", build)
+        timed("save", index.save)
+        print(f"{len(index)} meanings, {os.path.getsize(index.path) / 2**20:.1f} MiB on disk")
+
+        timed("load", lambda: len(MeaningIndex(index.path)))
+
+        for words in (1, 2, 3):
+            qs = [" ".join(rnd.choices(vocab, k=words)) for _ in range(queries)]
+            _, t = timed(f"{words} word queries", lambda: [index.search(q, 20) for q in qs])
+            print(f"  {'':<40} {t / queries * 1000:>10.3f} ms per query")
+
+def misspell(rnd, word):
+    i = rnd.randrange(len(word))
+    op = rnd.randrange(3)
+    if op == 0:
+        return word[:i] + word[i + 1:]
+    c = rnd.choice("abcdefilmnoprstu")
+    return word[:i] + c + word[i + (op == 1):]
+
+@bench("fuzzy")
+def bench_fuzzy(queries=500):
+    from fuzzy import FuzzyIndex, fuzzy_key, edit_distance
+
+    rnd = random.Random(6)
+    for count in (10_000, 100_000, 300_000):
+        keys = list({ fuzzy_key(f) for f in random_forms(count, seed=6) })
+        index = FuzzyIndex()
+        timed(f"index {len(keys)} keys", lambda: [index.add(k) for k in keys])
+
+        qs = [misspell(rnd, rnd.choice(keys)) for _ in range(queries)]
+        _, t = timed(f"{queries} lookups", lambda: [index.lookup(q, limit=5) for q in qs])
+        print(f"  {'':<40} {t / queries * 1000:>10.3f} ms per lookup")
+
+        sample = qs[:5]
+        _, scan = timed("linear scan, 5 lookups",
+                        lambda: [[k for k in keys if edit_distance(q, k, 2) <= 2] for q in sample])
+        print(f"  {'':<40} {scan / len(sample) * 1000:>10.3f} ms per lookup")
+
+PERSONS = ["I sing.", "II sing.", "III sing.", "I plur.", "II plur.", "III plur."]
+
+def synthetic_flexion_page(rnd, i):
+    stem = random_forms(1, seed=i)[0]
+    planes = []
+    for mood in ("INDICATIVE", "SUBJUNCTIVE", "IMPERATIVE", "INFINITIVE"):
+        groups = []
+        for tense in ("PRESENT", "IMPERFECT", "FUTURE", "PERFECT", "PLUPERFECT", "FUTURE PERFECT"):
+            rows = "".join(
+                f'<div class="ff_row"><span>{p}:</span><span><span class="radice">{stem}</span>'
+                f'<span class="desinenza">{e}</span>, <span class="radice">{stem}</span>'
+                f'<span class="desinenza">{e}e</span></span></div>'
+                for p, e in zip(PERSONS, random_forms(6, seed=rnd.random()))
+            )
+            groups.append(f'<div class="background-green">{tense}</div>'
+                          f'<div class="ff_tbl_container">{rows}</div>')
+        planes.append(f'<div class="background-red">{mood}</div>' + "".join(groups))
+    return ('<html><body><div class="conjugation-container"><div class="title">ACTIVE</div>'
+            f'<span class="lnk"><a href="latin-dictionary-flexion.php?lemma={stem}&amp;p=1">passive</a></span>'
+            + "".join(planes) + '</div></body></html>')
+
+def flexion_pages(count):
+    from core import default_core
+    page_cache = default_core().pages
+
+    pages = []
+    for p in page_cache.pages():
+        with open(p, 'rb') as f:
+            text = page_cache.codec.decode(f.read())
+        if "conjugation-container" in text:
+            pages.append(text)
+        if len(pages) >= count:
+            return pages, "cached"
+
+    rnd = random.Random(7)
+    return [synthetic_flexion_page(rnd, i) for i in range(count)], "synthetic"
+
+@bench("parsing")
+def bench_parsing(count=200):
+    import pickle
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+    from xdict import parse_flexion_page
+
+    pages, origin = flexion_pages(count)
+    cores = os.cpu_count() or 1
+    print(f"parse {len(pages)} {origin} flexion pages, {cores} cores")
+
+    def run(pool):
+        return list(pool.map(parse_flexion_page, pages, chunksize=4) if pool else map(parse_flexion_page, pages))
+
+    _, base = timed("inline", run, None)
+    print(f"  {'':<40} {len(pages) / base:>10.1f} pages/s")
+    with ThreadPoolExecutor(4) as pool:
+        _, t = timed("4 threads", run, pool)
+        print(f"  {'':<40} {len(pages) / t:>10.1f} pages/s")
+
+    for procs in sorted({ 1, 2, 4, cores }):
+        with ProcessPoolExecutor(procs) as pool:
+            pool.submit(int).result()
+            _, t = timed(f"{procs} processes", run, pool)
+            print(f"  {'':<40} {len(pages) / t:>10.1f} pages/s, {base / t:.1f}x")
+
+    sizes = [len(pickle.dumps(parse_flexion_page(p))) for p in pages[:20]]
+    print(f"  result {sum(sizes) / len(sizes) / 1024:.1f} KiB pickled vs "
+          f"{sum(len(p) for p in pages[:20]) / 20 / 1024:.1f} KiB of html per page")
+
+@bench("cells")
+def bench_cells(count=2_000):
+    from xdict import FlexionTable, parse_flexion_page
+    from columnar import ParadigmColumnsBuilder
+
+    rnd = random.Random(8)
+    tables = []
+    for i in range(count):
+        _, plain, _, _ = parse_flexion_page(synthetic_flexion_page(rnd, i))
+        tables.append(FlexionTable.from_plain(plain))
+    print(f"one cell of {count} lemmas")
+
+    def walk():
+        out = []
+        for t in tables:
+            for title, plane in t.planes.items():
+                if title != "SUBJUNCTIVE":
+                    continue
+                for c in plane.groups["FUTURE PERFECT"]:
+                    if c.type == "III plur.":
+                        out.append(c.forms[0])
+        return out
+
+    timed("walking planes and groups", walk)
+    timed("cell(), first call builds the index",
+          lambda: [t.cell("subjunctive", "future perfect", "3rd plural", 0) for t in tables])
+    timed("cell(), indexed",
+          lambda: [t.cell("subjunctive", "future perfect", "3rd plural", 0) for t in tables])
+
+    builder = ParadigmColumnsBuilder()
+    for i, t in enumerate(tables):
+        builder.add_table(f"lemma{i}", "", "active", t)
+    cols = builder.build()
+    timed("columnar, all lemmas at once",
+          lambda: cols.cell("active", "subjunctive", "future perfect", "3rd plural"))
+
+@bench("core")
+def bench_core(count=2_000, lookups=20_000):
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from cache import PageCache
+    from core import LookupCore
+
+    rnd = random.Random(9)
+    lemmas = list(dict.fromkeys(f + "o" for f in random_forms(count, seed=9)))
+    print(f"cached lookups of {len(lemmas)} lemmas shared by all threads, {os.cpu_count()} cores")
+
+    with tempfile.TemporaryDirectory() as root:
+        core = LookupCore(root=root, pages=PageCache(os.path.join(root, "pages"), auto_train=False))
+        for w in lemmas:
+            ent = SyntheticEntry(rnd, w)
+            core.entries.put(w, '', ent)
+            for url in ent.sources():
+                core.pages.put(url, "<html></html>")
+
+        for threads in (1, 2, 4, 8, 16):
+            probe = [rnd.choice(lemmas) for _ in range(lookups)]
+            chunks = [probe[i::threads] for i in range(threads)]
+            with ThreadPoolExecutor(threads) as pool:
+                pool.submit(int).result()
+                _, t = timed(f"{threads} threads", lambda: list(pool.map(
+                    lambda chunk: [core.lookup(w) for w in chunk], chunks)))
+            print(f"  {'':<40} {lookups / t:>10.0f} lookups/s")
+
+@bench("bundle")
+def bench_bundle(count=20_000):
+    import tempfile
+    from cache import EntryCache, FormIndex, MeaningIndex
+    from paradigm import Paradigms
+    from snapshot import Snapshot
+    from bundle import export_bundle, import_bundle
+
+    rnd = random.Random(10)
+    lemmas = list(dict.fromkeys(f + "o" for f in random_forms(count, seed=10)))
+    entries = [SyntheticEntry(rnd, w) for w in lemmas]
+
+    with tempfile.TemporaryDirectory() as root:
+        def indexes(name):
+            d = os.path.join(root, name)
+            return (FormIndex(os.path.join(d, "forms.pickle")),
+                    MeaningIndex(os.path.join(d, "meanings.pickle")),
+                    Paradigms(os.path.join(d, "paradigms.pickle")))
+
+        forms, meanings, paradigms = indexes("src")
+        for e in entries:
+            forms.add_entry(e)
+            meanings.add_entry(e)
+        print(f"{len(entries)} entries, {len(forms)} forms, {len(meanings)} meanings")
+
+        path = os.path.join(root, "dict.bundle")
+        timed("export", export_bundle, path, entries, forms, meanings, paradigms)
+        print(f"  {'':<40} {os.path.getsize(path) / 2**20:>10.1f} MiB")
+
+        snap_path = os.path.join(root, "dst", "entries.snap")
+        _, t = timed("import: verify, install snapshot, indexes",
+                     lambda: import_bundle(path, *indexes("dst"), snapshot_path=snap_path))
+        print(f"  {'':<40} {len(entries) / t:>10.0f} entries/s")
+
+        snap = Snapshot(snap_path)
+        timed("first lookup after import", lambda: snap.get(lemmas[0]).flexions())
+        snap.close()
+
+        cache = EntryCache(os.path.join(root, "entries"))
+        _, t = timed("entry cache, one file per entry",
+                     lambda: [cache.put(e.meaning.lemma, '', e) for e in entries])
+        print(f"  {'':<40} {len(entries) / t:>10.0f} entries/s")
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHES)
+    for name in names:
+        BENCHES[name]()
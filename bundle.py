@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+import os, sys, json, time, zlib, struct, hashlib, argparse, tempfile
+
+from cache import CACHE_DIR, EntryCache, atomic_write
+import snapshot
+
+# Offline bundle: everything a machine without network needs to answer
+# lookups, in one file.
+#
+#   header    magic, format version, manifest size, sha256 of the manifest
+#   manifest  json: created, counts, sections [{name, offset, size, codec, sha256}]
+#   sections  entries (a snapshot, explanations included), forms,
+#             meanings and paradigms (json, see their dump()), offsets
+#             from the end of the manifest, sha256 of the stored bytes
+#
+# Import checks every checksum before touching the caches. The entries are
+# installed as the default snapshot, a single sequential write mapped on
+# the next offline start, rather than unpacked into one cache file per
+# entry. Nothing in a bundle is ever unpickled, the checksums only catch
+# corruption and a bundle is data whoever wrote it.
+
+MAGIC = b"PLTLBNDL"
+VERSION = 2
+HEADER = struct.Struct("<8sII32s")
+CHUNK = 1 << 20
+
+class BundleError(Exception):
+    pass
+
+def bundle_entries(entries, snap=None):
+    """
+        Cached entries, then those of `snap` not cached, once per key
+    """
+    seen = set()
+    for ent in entries:
+        if not ent.meaning or ent.is_partial():
+            continue
+        seen.add(EntryCache.key(ent.meaning.lemma, ent.variant()))
+        yield ent
+
+    if snap is None:
+        return
+    for eid in range(len(snap)):
+        ent = snap.entry(eid)
+        if ent.meaning and EntryCache.key(ent.meaning.lemma, ent.variant()) not in seen:
+            yield ent
+
+def export_bundle(path, entries, forms, meanings, paradigms, compress=True):
+    """
+        Write a bundle of `entries` and the dump() of the indexes to
+        `path`, returns its manifest
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        snap_path = os.path.join(tmp, "entries.snap")
+        n = snapshot.build_snapshot(entries, snap_path)
+        with open(snap_path, 'rb') as f:
+            payloads = [("entries", f.read())]
+
+    payloads += [
+        (name, str.encode(json.dumps(index.dump(), ensure_ascii=False)))
+        for name, index in (("forms", forms), ("meanings", meanings), ("paradigms", paradigms))
+    ]
+
+    sections, offset, blobs = [], 0, []
+    for name, data in payloads:
+        codec = "zlib" if compress else "raw"
+        if compress:
+            data = zlib.compress(data, 6)
+        sections.append({
+            "name": name, "offset": offset, "size": len(data),
+            "codec": codec, "sha256": hashlib.sha256(data).hexdigest(),
+        })
+        offset += len(data)
+        blobs.append(data)
+
+    manifest = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "entries": n,
+        "forms": len(forms),
+        "meanings": len(meanings),
+        "byteorder": sys.byteorder,
+        "sections": sections,
+    }
+    raw = str.encode(json.dumps(manifest, ensure_ascii=False))
+
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(raw), hashlib.sha256(raw).digest()))
+            f.write(raw)
+            for data in blobs:
+                f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return manifest
+
+class Bundle:
+    def __init__(self, path):
+        self.path = path
+        self.__f = open(path, 'rb')
+        try:
+            self.manifest = self.__read_manifest()
+        except BaseException:
+            self.__f.close()
+            raise
+        self.sections = { s["name"]: s for s in self.manifest["sections"] }
+
+    def __read_manifest(self):
+        head = self.__f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            raise BundleError(f"{self.path} is not a bundle")
+        magic, version, size, digest = HEADER.unpack(head)
+        if magic != MAGIC:
+            raise BundleError(f"{self.path} is not a bundle")
+        if version != VERSION:
+            raise BundleError(f"{self.path} is a version {version} bundle, "
+                              f"only version {VERSION} is supported")
+
+        raw = self.__f.read(size)
+        if hashlib.sha256(raw).digest() != digest:
+            raise BundleError(f"{self.path}: corrupted manifest")
+        self.__data = HEADER.size + size
+        return json.loads(raw)
+
+    def close(self):
+        self.__f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stored(self, name):
+        s = self.sections[name]
+        self.__f.seek(self.__data + s["offset"])
+        data = self.__f.read(s["size"])
+        if len(data) != s["size"] or hashlib.sha256(data).hexdigest() != s["sha256"]:
+            raise BundleError(f"{self.path}: section {name} is corrupted")
+        return data
+
+    def section(self, name):
+        data = self.stored(name)
+        return zlib.decompress(data) if self.sections[name]["codec"] == "zlib" else data
+
+    def verify(self):
+        for name in self.sections:
+            self.stored(name)
+
+    def index(self, name):
+        try:
+            return json.loads(self.section(name))
+        except ValueError:
+            raise BundleError(f"{self.path}: section {name} is not valid json")
+
+def import_bundle(path, forms, meanings, paradigms, snapshot_path=None, entries=()):
+    """
+        Install the entries of a bundle as the snapshot at `snapshot_path`,
+        replacing a previously imported one, and rebuild the form and
+        meaning indexes from the bundle and the locally cached `entries`,
+        so that none points at a lemma of the previous bundle. Paradigm
+        scores are merged. Returns the manifest.
+    """
+    snapshot_path = snapshot_path or snapshot.DEFAULT_PATH
+    with Bundle(path) as b:
+        b.verify()
+        if b.manifest["byteorder"] != sys.byteorder:
+            raise BundleError(f"{path} was written on a {b.manifest['byteorder']} endian machine")
+        indexes = { name: b.index(name) for name in ("forms", "meanings", "paradigms") }
+
+        atomic_write(snapshot_path, b.section("entries"))
+
+    forms.reset()
+    forms.merge(indexes["forms"])
+    meanings.reset()
+    meanings.merge(indexes["meanings"])
+    for ent in entries:
+        forms.add_entry(ent)
+        meanings.add_entry(ent)
+    paradigms.merge(indexes["paradigms"])
+
+    forms.save()
+    meanings.save()
+    paradigms.save()
+    return b.manifest
+
+if __name__ == "__main__":
+    from core import default_core
+
+    parser = argparse.ArgumentParser(description="Offline dictionary bundles")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    e = sub.add_parser("export", help="bundle every cached entry, explanation and index")
+    e.add_argument("output")
+    e.add_argument("--raw", action="store_true", help="do not compress the sections")
+    i = sub.add_parser("import", help="install a bundle, then run with PULVIS_OFFLINE=1")
+    i.add_argument("input")
+    v = sub.add_parser("verify", help="check the version and checksums of a bundle")
+    v.add_argument("input")
+    args = parser.parse_args()
+
+    if args.cmd == "export":
+        core = default_core()
+        # online the installed snapshot is not opened, its entries still go along
+        snap = core.snapshot or snapshot.open_default(offline=True)
+        entries = bundle_entries(core.entries.entries(), snap)
+        m = export_bundle(args.output, entries, core.forms, core.meanings, core.paradigms, not args.raw)
+        print(f"{m['entries']} entries, {m['forms']} forms, {m['meanings']} meanings, "
+              f"{os.path.getsize(args.output) / 2**20:.1f} MiB written to {args.output}")
+    elif args.cmd == "import":
+        # the installed snapshot is replaced, not written through its mapping
+        core = default_core()
+        if core.snapshot is not None:
+            core.snapshot.close()
+        m = import_bundle(args.input, core.forms, core.meanings, core.paradigms,
+                          entries=core.entries.entries())
+        print(f"{m['entries']} entries of {m['created']} installed in {CACHE_DIR}")
+    else:
+        try:
+            with Bundle(args.input) as b:
+                b.verify()
+                m = b.manifest
+        except BundleError as err:
+            print(err)
+            sys.exit(1)
+        print(f"version {VERSION} bundle of {m['created']}: {m['entries']} entries, "
+              f"{m['forms']} forms, {m['meanings']} meanings, checksums ok")
@@ -0,0 +1,601 @@
+import os, re, json, math, time, zlib, pickle, struct, hashlib, tempfile, itertools
+from collections import Counter
+from threading import Lock, RLock
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from normalize import normalize_key, fold
+
+CACHE_DIR = os.environ.get(
+    "PULVIS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "pulvis")
+)
+
+PAGE_MAX_AGE = 7 * 24 * 3600
+
+# zlib only looks back 32K, so a preset dictionary larger than that is wasted
+DICT_SIZE = 32 * 1024
+TRAIN_SAMPLES = 200
+TRAIN_AFTER = 100
+
+def url_key(url):
+    return hashlib.sha256(str.encode(url)).hexdigest()
+
+def atomic_write(path, data):
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+class FetchStats:
+    def __init__(self):
+        self.__lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.not_modified = 0
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+
+    def record(self, **counts):
+        with self.__lock:
+            for k, v in counts.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def revalidation_hit_ratio(self):
+        if not self.revalidations:
+            return 0.0
+        return self.not_modified / self.revalidations
+
+    def summary(self):
+        return [
+            f"fresh hits:       {self.hits}",
+            f"misses:           {self.misses}",
+            f"revalidations:    {self.revalidations} "
+                f"({self.not_modified} not modified, {self.revalidation_hit_ratio():.0%})",
+            f"bytes downloaded: {self.bytes_downloaded}",
+            f"bytes saved:      {self.bytes_saved}",
+        ]
+
+class CachedPage:
+    def __init__(self, text, fetched, etag=None, last_modified=None):
+        self.text = text
+        self.fetched = fetched
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, max_age):
+        return not max_age or time.time() - self.fetched <= max_age
+
+    def validators(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+def train_zlib_dictionary(samples, size=DICT_SIZE):
+    # lines shared by many pages are the boilerplate. zlib favours matches
+    # close to the data, so the most frequent lines go last.
+    counts = Counter()
+    for text in samples:
+        counts.update(set(text.splitlines(keepends=True)))
+
+    threshold = max(2, len(samples) // 4)
+    common = [l for l, c in counts.most_common() if c >= threshold]
+
+    out = []
+    total = 0
+    for l in common:
+        b = str.encode(l)
+        if total + len(b) > size:
+            break
+        out.append(b)
+        total += len(b)
+
+    return b"".join(reversed(out))
+
+# Stored page layout: b"\0" + codec + dictionary id (u32) + payload.
+# Anything not starting with NUL is a legacy raw utf-8 page.
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+HEADER = struct.Struct(">cc I")
+
+class UnreadablePage(ValueError):
+    pass
+
+class PageCodec:
+    def __init__(self, root):
+        self.root = root
+        self.__dicts = {}
+        self.codec = CODEC_ZSTD if zstandard else CODEC_ZLIB
+        self.dict_id = 0
+
+        try:
+            with open(os.path.join(root, "current"), 'rb') as f:
+                codec, dict_id = f.read().split(b":")
+            if codec == CODEC_ZLIB or zstandard:
+                self.codec, self.dict_id = codec, int(dict_id)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def __dict_path(self, codec, dict_id):
+        return os.path.join(self.root, f"{codec.decode()}-{dict_id:08x}")
+
+    def __dictionary(self, codec, dict_id):
+        if not dict_id:
+            return None
+
+        key = (codec, dict_id)
+        d = self.__dicts.get(key)
+        if d is None:
+            with open(self.__dict_path(codec, dict_id), 'rb') as f:
+                d = f.read()
+            self.__dicts[key] = d
+        return d
+
+    def train(self, samples):
+        if self.codec == CODEC_ZSTD:
+            d = zstandard.train_dictionary(
+                DICT_SIZE * 4, [str.encode(s) for s in samples]
+            ).as_bytes()
+        else:
+            d = train_zlib_dictionary(samples)
+
+        if not d:
+            return
+        dict_id = zlib.crc32(d) or 1
+        atomic_write(self.__dict_path(self.codec, dict_id), d)
+        atomic_write(os.path.join(self.root, "current"), self.codec + b":%d" % dict_id)
+
+        self.__dicts[(self.codec, dict_id)] = d
+        self.dict_id = dict_id
+
+    def encode(self, text):
+        raw = str.encode(text)
+        d = self.__dictionary(self.codec, self.dict_id)
+
+        if self.codec == CODEC_ZSTD:
+            zd = zstandard.ZstdCompressionDict(d) if d else None
+            payload = zstandard.ZstdCompressor(level=10, dict_data=zd).compress(raw)
+        else:
+            c = zlib.compressobj(9, zdict=d) if d else zlib.compressobj(9)
+            payload = c.compress(raw) + c.flush()
+
+        return HEADER.pack(b"\0", self.codec, self.dict_id) + payload
+
+    def decode(self, data):
+        if data[:1] != b"\0":
+            return data.decode()
+
+        _, codec, dict_id = HEADER.unpack_from(data)
+        if codec == CODEC_ZSTD and zstandard is None:
+            raise UnreadablePage("page compressed with zstd, which is not installed")
+        payload = memoryview(data)[HEADER.size:]
+        d = self.__dictionary(codec, dict_id)
+
+        if codec == CODEC_ZSTD:
+            zd = zstandard.ZstdCompressionDict(d) if d else None
+            raw = zstandard.ZstdDecompressor(dict_data=zd).decompress(payload)
+        else:
+            dc = zlib.decompressobj(zdict=d) if d else zlib.decompressobj()
+            raw = dc.decompress(payload) + dc.flush()
+
+        return raw.decode()
+
+class PageCache:
+    def __init__(self, root=None, max_age=PAGE_MAX_AGE, compress=True, auto_train=True):
+        self.root = root or os.path.join(CACHE_DIR, "pages")
+        self.max_age = max_age
+        self.compress = compress
+        self.auto_train = auto_train
+        self.codec = PageCodec(os.path.join(self.root, "dicts"))
+        self.__puts = 0
+        self.__train_lock = Lock()
+
+    def path(self, url):
+        k = url_key(url)
+        return os.path.join(self.root, k[:2], k)
+
+    def load(self, url):
+        p = self.path(url)
+        try:
+            fetched = os.path.getmtime(p)
+            with open(p, 'rb') as f:
+                text = self.codec.decode(f.read())
+        except FileNotFoundError:
+            return None
+        except UnreadablePage:
+            # written where zstandard is installed, fetched again
+            return None
+
+        meta = {}
+        try:
+            with open(p + ".meta", 'rb') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+        return CachedPage(text, fetched, meta.get("etag"), meta.get("last_modified"))
+
+    def is_fresh(self, url, max_age=None):
+        """
+            Whether `url` is cached and younger than `max_age`,
+            without reading the page
+        """
+        max_age = self.max_age if max_age is None else max_age
+        try:
+            age = time.time() - os.path.getmtime(self.path(url))
+        except FileNotFoundError:
+            return False
+        # the rule of CachedPage.is_fresh: no max_age, never stale
+        return not max_age or age <= max_age
+
+    def get(self, url, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        page = self.load(url)
+        if page is None or not page.is_fresh(max_age):
+            return None
+        return page.text
+
+    def put(self, url, text, etag=None, last_modified=None):
+        p = self.path(url)
+        data = self.codec.encode(text) if self.compress else str.encode(text)
+        atomic_write(p, data)
+        meta = { "etag": etag, "last_modified": last_modified }
+        atomic_write(p + ".meta", str.encode(json.dumps(meta)))
+
+        self.__puts += 1
+        if self.auto_train and self.compress and not self.codec.dict_id and self.__puts >= TRAIN_AFTER:
+            # only one of the threads putting pages trains
+            if self.__train_lock.acquire(blocking=False):
+                try:
+                    if not self.codec.dict_id:
+                        self.train()
+                finally:
+                    self.__train_lock.release()
+
+    def pages(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d != "dicts"]
+            for name in filenames:
+                if "." not in name:
+                    yield os.path.join(dirpath, name)
+
+    def train(self, n_samples=TRAIN_SAMPLES):
+        samples = []
+        for p in self.pages():
+            with open(p, 'rb') as f:
+                try:
+                    samples.append(self.codec.decode(f.read()))
+                except UnreadablePage:
+                    continue
+            if len(samples) >= n_samples:
+                break
+        if len(samples) >= 2:
+            self.codec.train(samples)
+
+    def touch(self, url):
+        os.utime(self.path(url))
+
+    def __contains__(self, url):
+        return os.path.exists(self.path(url))
+
+class EntryCache:
+    def __init__(self, root=None):
+        self.root = root or os.path.join(CACHE_DIR, "entries")
+        self.__mem = {}
+
+    @staticmethod
+    def key(word, variant=''):
+        return f"{normalize_key(word)}#{variant}"
+
+    def path(self, key):
+        k = url_key(key)
+        return os.path.join(self.root, k[:2], k)
+
+    def get(self, word, variant=''):
+        key = EntryCache.key(word, variant)
+        ent = self.__mem.get(key)
+        if ent is not None:
+            return ent
+
+        try:
+            with open(self.path(key), 'rb') as f:
+                ent = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+        self.__mem[key] = ent
+        return ent
+
+    def put(self, word, variant, entry):
+        key = EntryCache.key(word, variant)
+        self.__mem[key] = entry
+        atomic_write(self.path(key), pickle.dumps(entry))
+
+    def cached(self):
+        # (key, entry) of the entries held in memory
+        return list(self.__mem.items())
+
+    def entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    with open(os.path.join(dirpath, name), 'rb') as f:
+                        yield pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    continue
+
+    def __contains__(self, key):
+        word, variant = key
+        key = EntryCache.key(word, variant)
+        return key in self.__mem or os.path.exists(self.path(key))
+
+# maps a normalized inflected form to the lemmas it may belong to,
+# each lemma is a (lemma, variant, gramma) tuple
+class FormIndex:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "forms.pickle")
+        self.__forms = None
+        self.__dirty = False
+        # writers only, lookups read the dict as it is
+        self.__lock = RLock()
+
+    def __load(self):
+        if self.__forms is not None:
+            return self.__forms
+
+        with self.__lock:
+            if self.__forms is None:
+                try:
+                    with open(self.path, 'rb') as f:
+                        forms = pickle.load(f)
+                except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                    forms = {}
+                self.__forms = forms
+        return self.__forms
+
+    def lookup(self, form):
+        return self.__load().get(normalize_key(form), ())
+
+    def add(self, form, lemma, variant='', gramma=''):
+        forms = self.__load()
+        key = normalize_key(form)
+        val = (lemma, variant, gramma)
+        with self.__lock:
+            lemmas = forms.get(key, ())
+            if val in lemmas:
+                return
+            forms[key] = lemmas + (val, )
+            self.__dirty = True
+
+    def add_entry(self, entry):
+        if not entry.meaning:
+            return
+
+        lemma, gramma = entry.meaning.lemma, entry.meaning.gramma
+        variant = entry.variant()
+        self.add(lemma, lemma, variant, gramma)
+
+        for table in entry.flexions().values():
+            if table is None:
+                continue
+            for plane in table.planes.values():
+                for cells in plane.groups.values():
+                    for cell in cells:
+                        for stem, ending, _ in cell.forms:
+                            self.add(f"{stem}{ending}", lemma, variant, gramma)
+
+    def dump(self):
+        # plain lists, fit for json
+        with self.__lock:
+            return { k: [list(l) for l in lemmas] for k, lemmas in self.__load().items() }
+
+    def merge(self, forms):
+        # {normalized form: [[lemma, variant, gramma], ...]} of another index, see dump()
+        with self.__lock:
+            own = self.__load()
+            for key, lemmas in forms.items():
+                known = own.get(key, ())
+                new = tuple(l for l in (tuple(l) for l in lemmas) if l not in known)
+                if new:
+                    own[key] = known + new
+            self.__dirty = True
+
+    def reset(self):
+        with self.__lock:
+            self.__forms = {}
+            self.__dirty = True
+
+    def forms(self, start=0):
+        # in insertion order, so newer forms come last
+        forms = self.__load()
+        with self.__lock:
+            return list(itertools.islice(forms, start, None))
+
+    def __len__(self):
+        return len(self.__load())
+
+    def save(self):
+        with self.__lock:
+            if not self.__dirty:
+                return
+            atomic_write(self.path, pickle.dumps(self.__forms))
+            self.__dirty = False
+
+ENGLISH_TOKEN = re.compile(r"[a-z]+")
+STOPWORDS = frozenset([
+    "a", "an", "the", "to", "of", "for", "in", "on", "at", "by", "with",
+    "and", "or", "be", "is", "as", "one", "something", "someone", "sth", "sb",
+])
+
+def english_tokens(text):
+    tokens = ENGLISH_TOKEN.findall(fold(text).lower())
+    content = [t for t in tokens if t not in STOPWORDS]
+    # a query made only of stopwords still has to match something
+    return content or tokens
+
+# inverted index from the english tokens of every parsed meaning to the
+# meanings containing them, each meaning lists the lemmas it glosses as
+# (lemma, variant, gramma) tuples.
+# Writers replace posting and lemma sets instead of changing them in place,
+# so searches never see a set changing size under them and take no lock.
+class MeaningIndex:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "meanings.pickle")
+        self.__index = None
+        self.__dirty = False
+        self.__lock = RLock()
+
+    def __load(self):
+        if self.__index is not None:
+            return self.__index
+
+        with self.__lock:
+            if self.__index is None:
+                try:
+                    with open(self.path, 'rb') as f:
+                        index = pickle.load(f)
+                except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                    index = self.__empty()
+                self.__index = index
+        return self.__index
+
+    @staticmethod
+    def __empty():
+        return {
+            "glosses": [],      # gloss id -> [text, {lemma tuple}, n tokens]
+            "gloss_ids": {},    # normalized gloss text -> gloss id
+            "postings": {},     # token -> {gloss id}
+            "lemmas": {},       # (lemma, variant) -> {gloss id}
+        }
+
+    def add(self, gloss, lemma, variant='', gramma=''):
+        idx = self.__load()
+        text = " ".join(gloss.split())
+        tokens = english_tokens(text)
+        if not tokens:
+            return
+
+        key = " ".join(tokens)
+        val = (lemma, variant, gramma)
+        with self.__lock:
+            gid = idx["gloss_ids"].get(key)
+            if gid is None:
+                gid = len(idx["glosses"])
+                idx["glosses"].append([text, frozenset(), len(tokens)])
+                idx["gloss_ids"][key] = gid
+                postings = idx["postings"]
+                for t in tokens:
+                    postings[t] = postings.get(t, frozenset()) | { gid }
+
+            gloss = idx["glosses"][gid]
+            if val not in gloss[1]:
+                gloss[1] = gloss[1] | { val }
+                idx["lemmas"].setdefault((lemma, variant), set()).add(gid)
+                self.__dirty = True
+
+    def remove(self, lemma, variant=''):
+        idx = self.__load()
+        with self.__lock:
+            for gid in idx["lemmas"].pop((lemma, variant), ()):
+                gloss = idx["glosses"][gid]
+                gloss[1] = frozenset(v for v in gloss[1] if v[:2] != (lemma, variant))
+                self.__dirty = True
+
+    def add_entry(self, entry):
+        if not entry.meaning:
+            return
+
+        # a reparsed entry replaces whatever its lemma contributed before
+        lemma, gramma = entry.meaning.lemma, entry.meaning.gramma
+        variant = entry.variant()
+        with self.__lock:
+            self.remove(lemma, variant)
+            for m in entry.meaning.meanings:
+                self.add(m, lemma, variant, gramma)
+
+    def search(self, query, limit=None, require_all=False):
+        """
+            Glosses matching the english `query`, best first, as
+            (gloss, [(lemma, variant, gramma)], score) tuples
+        """
+        idx = self.__load()
+        tokens = english_tokens(query)
+        if not tokens:
+            return []
+
+        n = len(idx["glosses"]) or 1
+        scores = {}
+        matched = {}
+        for t in set(tokens):
+            postings = idx["postings"].get(t, ())
+            if not postings:
+                continue
+            idf = math.log(1 + n / len(postings))
+            for gid in postings:
+                scores[gid] = scores.get(gid, 0.0) + idf
+                matched[gid] = matched.get(gid, 0) + 1
+
+        glosses = idx["glosses"]
+        ranked = []
+        for gid, score in scores.items():
+            text, lemmas, length = glosses[gid]
+            if not lemmas or (require_all and matched[gid] < len(set(tokens))):
+                continue
+            # glosses made of exactly the query words rank first
+            score /= 1 + 0.25 * (length - matched[gid])
+            ranked.append((matched[gid], score, gid))
+        ranked.sort(key=lambda r: (-r[0], -r[1], glosses[r[2]][0]))
+
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(glosses[gid][0], sorted(glosses[gid][1]), score) for m, score, gid in ranked]
+
+    def __len__(self):
+        return len(self.__load()["glosses"])
+
+    def dump(self):
+        # the glosses and their lemmas as plain lists, fit for json
+        with self.__lock:
+            return [
+                [text, sorted(list(l) for l in lemmas)]
+                for text, lemmas, _ in self.__load()["glosses"] if lemmas
+            ]
+
+    def merge(self, glosses):
+        # [[gloss, [[lemma, variant, gramma], ...]], ...] of another index, see dump()
+        with self.__lock:
+            for text, lemmas in glosses:
+                for val in lemmas:
+                    self.add(text, *val)
+
+    def reset(self):
+        with self.__lock:
+            self.__index = self.__empty()
+            self.__dirty = True
+
+    def save(self):
+        with self.__lock:
+            if not self.__dirty:
+                return
+            atomic_write(self.path, pickle.dumps(self.__index))
+            self.__dirty = False
+
@@ -0,0 +1,129 @@
+import re
+from functools import lru_cache
+
+from normalize import normalize_key
+
+# Cell labels as the pages write them ("III plur.") and as people ask for
+# them ("3rd plural") reduce to the same words
+WORD_ALIASES = {
+    "i": "1", "1st": "1", "first": "1",
+    "ii": "2", "2nd": "2", "second": "2",
+    "iii": "3", "3rd": "3", "third": "3",
+    "sing": "sg", "singular": "sg",
+    "plur": "pl", "plural": "pl",
+    "nominative": "nom", "genitive": "gen", "dative": "dat",
+    "accusative": "acc", "vocative": "voc", "ablative": "abl",
+    "masculine": "masc", "feminine": "fem", "neuter": "neut",
+}
+WORD = re.compile(r"\w+")
+
+def canonical_words(text):
+    return tuple(WORD_ALIASES.get(w, w) for w in WORD.findall(normalize_key(text or "")))
+
+# titles and labels repeat across every table
+@lru_cache(maxsize=4096)
+def canonical(text):
+    return " ".join(canonical_words(text))
+
+class CellIndex:
+    """
+        The cells of a table keyed by canonical (plane, group, cell) and
+        (plane, group, position), and the keys holding each label word
+    """
+    def __init__(self, table):
+        self.cells = {}
+        self.titles = {}
+        self.words = {}
+        for title, plane in table.planes.items():
+            p = canonical(title)
+            for gtitle, cells in plane.groups.items():
+                g = canonical(gtitle)
+                for position, c in enumerate(cells):
+                    key = (p, g, canonical(c.type))
+                    self.cells[(p, g, position)] = c
+                    if key in self.cells:
+                        continue
+                    self.cells[key] = c
+                    self.titles[key] = (title, gtitle, c.type)
+                    for w in set(" ".join(key).split()):
+                        self.words.setdefault(w, []).append(key)
+
+    def having(self, words):
+        """
+            Keys of the cells whose labels hold every one of `words`
+        """
+        if not words:
+            return list(self.titles)
+        found = None
+        for w in sorted(words, key=lambda w: len(self.words.get(w, ()))):
+            keys = self.words.get(w)
+            if not keys:
+                return []
+            found = set(keys) if found is None else found & set(keys)
+        return [k for k in self.titles if k in found]
+
+class CellLookup:
+    """
+        Indexed access to the cells of a table with `planes`, the index
+        is built on first use and kept on the table, but never pickled
+    """
+    __index = None
+
+    def index(self):
+        if self.__index is None:
+            self.__index = CellIndex(self)
+        return self.__index
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop("_CellLookup__index", None)
+        return state
+
+    def cell(self, plane, group, cell, alt=None):
+        """
+            The cell (or its `alt`-th form) at plane/group/cell, `cell`
+            may be a label ("3rd plural") or a position in the group
+        """
+        key = cell if isinstance(cell, int) else canonical(cell)
+        c = self.index().cells.get((canonical(plane), canonical(group), key))
+        if c is None or alt is None:
+            return c
+        return c.forms[alt] if alt < len(c.forms) else None
+
+    def cells(self):
+        return [(k, self.index().cells[k]) for k in self.index().titles]
+
+def matches(words, voice, plane, group, cell):
+    """
+        Every query word must be found in the key, and a plane or group
+        title mentioned at all must be mentioned whole: "perfect" does
+        not select "future perfect"
+    """
+    key_words = set(voice.split()) | set(plane.split()) | set(group.split()) | set(cell.split())
+    if not words <= key_words:
+        return False
+    for title in (voice, plane, group):
+        t = set(title.split())
+        if t & words and not t <= words:
+            return False
+    return True
+
+def find_cells(flexions, query):
+    """
+        [((voice, plane, group, cell), FlexionEntry)] of all the tables of
+        an entry matching a free text query like "perfect indicative 3rd plural"
+    """
+    words = set(canonical_words(query))
+    out = []
+    for voice, table in flexions.items():
+        if table is None:
+            continue
+        v = canonical(voice)
+        index = table.index()
+        for key in index.having(words - set(v.split())):
+            if matches(words, v, *key):
+                out.append(((voice, ) + index.titles[key], table.cell(*key)))
+    return out
+
+def format_forms(forms):
+    return ", ".join(f"{stem}{ending} {suffix}".strip() for stem, ending, suffix in forms)
@@ -0,0 +1,194 @@
+import numpy as np
+from array import array
+
+from normalize import normalize_key
+from cells import canonical
+
+# One row per inflected form. Every string column is dictionary encoded:
+# `codes[col]` is an int32 array indexing into `categories[col]`.
+CATEGORICAL = ["lemma", "variant", "voice", "plane", "group", "cell", "stem", "ending", "suffix"]
+NUMERIC = ["position", "alt"]
+COLUMNS = CATEGORICAL + NUMERIC
+
+def npz_path(path):
+    path = str(path)
+    return path if path.endswith(".npz") else path + ".npz"
+
+class ParadigmColumnsBuilder:
+    def __init__(self):
+        self.__dicts = { c: {} for c in CATEGORICAL }
+        self.__codes = { c: array('i') for c in COLUMNS }
+
+    def __encode(self, col, val):
+        d = self.__dicts[col]
+        code = d.get(val)
+        if code is None:
+            code = len(d)
+            d[val] = code
+        self.__codes[col].append(code)
+
+    def add_row(self, **row):
+        for col in CATEGORICAL:
+            self.__encode(col, row[col])
+        for col in NUMERIC:
+            self.__codes[col].append(row[col])
+
+    def add_table(self, lemma, variant, voice, table):
+        for plane_title, plane in table.planes.items():
+            for group_title, cells in plane.groups.items():
+                for position, cell in enumerate(cells):
+                    for alt, (stem, ending, suffix) in enumerate(cell.forms):
+                        self.add_row(
+                            lemma=lemma, variant=variant, voice=voice,
+                            plane=plane_title or "", group=group_title,
+                            cell=cell.type, position=position, alt=alt,
+                            stem=stem, ending=ending, suffix=suffix
+                        )
+
+    def add_entry(self, entry):
+        if not entry.meaning:
+            return
+
+        for voice, table in entry.flexions().items():
+            if table is None:
+                continue
+            self.add_table(entry.meaning.lemma, entry.variant(), voice, table)
+
+    def build(self):
+        codes = { c: np.frombuffer(self.__codes[c], dtype=np.int32).copy() for c in COLUMNS }
+        categories = {
+            c: np.array(list(d.keys()), dtype=str) for c, d in self.__dicts.items()
+        }
+        return ParadigmColumns(codes, categories)
+
+class ParadigmColumns:
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+        self.__canonical = {}
+
+    @staticmethod
+    def from_entries(entries):
+        builder = ParadigmColumnsBuilder()
+        for ent in entries:
+            builder.add_entry(ent)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.codes["position"])
+
+    def __wanted_codes(self, col, values):
+        if isinstance(values, str):
+            values = [values]
+        keys = set(normalize_key(v) for v in values)
+        cats = self.categories[col]
+        return [i for i, c in enumerate(cats) if normalize_key(c) in keys]
+
+    def where(self, **conds):
+        """
+            Boolean row mask, e.g. where(voice="active", group="perfect", cell="they").
+            String columns are compared accent and case insensitively, a list
+            of values matches any of them.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for col, values in conds.items():
+            if col in NUMERIC:
+                mask &= np.isin(self.codes[col], np.atleast_1d(values))
+            else:
+                mask &= np.isin(self.codes[col], self.__wanted_codes(col, values))
+        return mask
+
+    def __canonical_codes(self, col, value):
+        cats = self.__canonical.get(col)
+        if cats is None:
+            cats = self.__canonical[col] = np.array([canonical(c) for c in self.categories[col]], dtype=str)
+        return np.flatnonzero(cats == canonical(value))
+
+    def cell(self, voice, plane, group, cell, alt=0):
+        """
+            One cell of every lemma at once, as (lemmas, forms) arrays.
+            Titles are matched like CellLookup.cell, "3rd plural" finds "III plur."
+        """
+        mask = self.codes["alt"] == alt
+        for col, value in (("voice", voice), ("plane", plane), ("group", group), ("cell", cell)):
+            mask &= np.isin(self.codes[col], self.__canonical_codes(col, value))
+        return self.column("lemma", mask), self.forms(mask)
+
+    def take(self, mask):
+        return ParadigmColumns(
+            { c: v[mask] for c, v in self.codes.items() },
+            self.categories
+        )
+
+    def column(self, col, mask=None):
+        codes = self.codes[col] if mask is None else self.codes[col][mask]
+        if col in NUMERIC:
+            return codes
+        return self.categories[col][codes]
+
+    def forms(self, mask=None):
+        stem   = self.column("stem", mask)
+        ending = self.column("ending", mask)
+        suffix = self.column("suffix", mask)
+        form = np.char.add(stem, ending)
+        return np.char.strip(np.char.add(np.char.add(form, " "), suffix))
+
+    def save(self, path):
+        """
+            Write to `path` and return it, with the .npz suffix
+            numpy adds to any other path
+        """
+        if str(path).endswith(".parquet"):
+            self.__save_parquet(path)
+            return path
+
+        path = npz_path(path)
+
+        arrays = {}
+        for c, v in self.codes.items():
+            arrays[f"codes_{c}"] = v
+        for c, v in self.categories.items():
+            arrays[f"cat_{c}"] = v
+        np.savez_compressed(path, **arrays)
+        return path
+
+    def __save_parquet(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        cols = {}
+        for c in COLUMNS:
+            if c in NUMERIC:
+                cols[c] = pa.array(self.codes[c])
+            else:
+                cols[c] = pa.DictionaryArray.from_arrays(
+                    pa.array(self.codes[c]), pa.array(self.categories[c].tolist(), type=pa.string())
+                )
+        pq.write_table(pa.table(cols), path)
+
+    @staticmethod
+    def load(path):
+        if str(path).endswith(".parquet"):
+            return ParadigmColumns.__load_parquet(path)
+
+        with np.load(npz_path(path), allow_pickle=False) as f:
+            codes = { c: f[f"codes_{c}"] for c in COLUMNS }
+            categories = { c: f[f"cat_{c}"] for c in CATEGORICAL }
+        return ParadigmColumns(codes, categories)
+
+    @staticmethod
+    def __load_parquet(path):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        codes, categories = {}, {}
+        for c in COLUMNS:
+            col = table.column(c).combine_chunks()
+            if c in NUMERIC:
+                codes[c] = col.to_numpy().astype(np.int32)
+                continue
+            if not hasattr(col, "indices"):
+                col = col.dictionary_encode()
+            codes[c] = col.indices.to_numpy(zero_copy_only=False).astype(np.int32)
+            categories[c] = np.array(col.dictionary.to_pylist(), dtype=str)
+        return ParadigmColumns(codes, categories)
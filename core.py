@@ -0,0 +1,207 @@
+import os
+import requests
+from threading import Lock
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from cache import CACHE_DIR, PageCache, EntryCache, FormIndex, MeaningIndex, FetchStats
+from paradigm import Paradigms
+from fuzzy import Suggester
+from deadline import LookupCancelled
+from normalize import normalize_key
+from xdict import Ambiguity, LookupContext, LatinDictEntry, ReverseDict, Transport
+
+class LookupCore:
+    """
+        Everything a lookup needs: transport, caches, indexes and explainer.
+        A core may be shared by any number of threads. Cache hits take no
+        lock, concurrent misses on the same word share a single fetch.
+
+        Without arguments a core keeps its caches under `root` (CACHE_DIR
+        by default), every component may also be passed in.
+
+        An `offline` core never goes to the network: cached entries are
+        used without revalidation, anything else is an OfflineError, and
+        the explainer it builds answers from the local backend. A given
+        explainer is used as it is configured.
+
+        A `snapshot` only answers for words not in the entry cache.
+    """
+    def __init__(self, root=None, pages=None, entries=None, forms=None, meanings=None,
+                 paradigms=None, stats=None, explainer=None, snapshot=None,
+                 rate_limiter=None, strip_pages=False, parser=None, offline=False):
+        root = root or CACHE_DIR
+        self.pages = pages or PageCache(os.path.join(root, "pages"))
+        self.entries = entries or EntryCache(os.path.join(root, "entries"))
+        self.forms = forms or FormIndex(os.path.join(root, "forms.pickle"))
+        self.meanings = meanings or MeaningIndex(os.path.join(root, "meanings.pickle"))
+        self.paradigms = paradigms or Paradigms(os.path.join(root, "paradigms.pickle"))
+        self.suggester = Suggester(self.forms)
+        self.stats = stats or FetchStats()
+        self.transport = Transport(self.pages, self.stats, rate_limiter, strip_pages, offline)
+        self.snapshot = snapshot
+
+        if explainer is None:
+            from explainer import Explainer
+            explainer = Explainer()
+            if offline:
+                explainer.select(explainer.local.name)
+        self.explainer = explainer
+
+        # optional concurrent.futures executor (a process pool for bulk jobs),
+        # pages are then parsed there and only plain tuples come back
+        self.parser = parser
+
+        self.__lock = Lock()
+        self.__inflight = {}
+
+    @property
+    def offline(self):
+        return self.transport.offline
+
+    def parse(self, fn, text):
+        if self.parser is None:
+            return fn(text)
+        return self.parser.submit(fn, text).result()
+
+    def lookup(self, word, variant='', on_explain=None, deadline=None):
+        """
+            Cached LatinDictEntry of `word`, which may also be a LookupContext.
+            Partial entries (see `deadline`) are not cached. Offline an
+            inflected form is the entry of its lemma, or asks which lemma
+            is meant when it has several.
+        """
+        ctx = word if isinstance(word, LookupContext) else LookupContext(word, variant)
+
+        # reuse the parsed entry as long as none of its pages changed
+        ent = self.entries.get(ctx.word, ctx.variant)
+        if ent is not None and (self.offline or self.__current(ent, deadline)):
+            return ent
+
+        if ent is None and self.snapshot is not None:
+            ent = self.snapshot.get(ctx.word, ctx.variant)
+            if ent is not None:
+                return ent
+
+        # offline an inflected form is only known through the indexes
+        if ent is None and self.offline and not ctx.variant:
+            found = self.__lemmas_of(ctx.word)
+            if len(found) == 1:
+                lemma, variant, _, _ = found[0]
+                return self.lookup(LookupContext(lemma, variant), on_explain=on_explain, deadline=deadline)
+            if found:
+                return LatinDictEntry.clarify(ctx.word, [
+                    Ambiguity.from_plain(lemma, variant, lemma, explain, gramma)
+                    for lemma, variant, gramma, explain in found
+                ])
+
+        key = self.entries.key(ctx.word, ctx.variant)
+        with self.__lock:
+            fut = self.__inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self.__inflight[key] = Future()
+
+        if not owner:
+            ent = self.__wait(fut, deadline)
+            if not ent.is_partial():
+                return ent
+            # the owner ran out of its own budget, this lookup has its own
+            return self.__build(ctx, on_explain, deadline)
+
+        try:
+            ent = self.__build(ctx, on_explain, deadline)
+            fut.set_result(ent)
+            return ent
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self.__lock:
+                del self.__inflight[key]
+
+    def __lemmas_of(self, form):
+        # (lemma, variant, gramma, first meaning) of the entries having
+        # `form` among their forms, from the snapshot and the form index
+        found = {}
+        if self.snapshot is not None:
+            for e in self.snapshot.lemmas_for(form):
+                m = e.meaning
+                found.setdefault((normalize_key(m.lemma), e.variant()),
+                                 (m.lemma, e.variant(), m.gramma, m.meanings[0] if m.meanings else ""))
+        for lemma, variant, gramma in self.forms.lookup(form):
+            key = (normalize_key(lemma), variant)
+            if key in found:
+                continue
+            ent = self.entries.get(lemma, variant)
+            if ent is None and self.snapshot is not None:
+                ent = self.snapshot.get(lemma, variant)
+            meanings = ent.meaning.meanings if ent is not None and ent.meaning else []
+            found[key] = (lemma, variant, gramma, meanings[0] if meanings else "")
+
+        # the bare form itself was looked up already
+        found.pop((normalize_key(form), ''), None)
+        return list(found.values())
+
+    def __wait(self, fut, deadline):
+        # another thread is building the entry, wait for it no longer
+        # than this lookup may take
+        if deadline is None:
+            return fut.result()
+        while True:
+            try:
+                return fut.result(min(deadline.remaining(), 0.1))
+            except FutureTimeout:
+                if deadline.expired():
+                    raise LookupCancelled("timed out waiting for the entry")
+
+    def __current(self, ent, deadline):
+        sources = ent.sources()
+        if sources is None:
+            return False
+        for url in sources:
+            # out of budget the cached copy beats no answer at all
+            if deadline is not None and deadline.expired():
+                return True
+            try:
+                if not self.transport.revalidate(url, deadline.timeout() if deadline else None):
+                    return False
+            except requests.Timeout:
+                return True
+        return True
+
+    def __build(self, ctx, on_explain, deadline):
+        ent = LatinDictEntry(ctx, on_explain=on_explain, deadline=deadline, core=self)
+        self.forms.add_entry(ent)
+        self.meanings.add_entry(ent)
+        if not ent.is_partial():
+            self.entries.put(ctx.word, ctx.variant, ent)
+            if not ent.is_generated():
+                self.paradigms.observe(ent)
+        return ent
+
+    def reverse(self, word, limit=None, on_explain=None, deadline=None, local=True):
+        return ReverseDict(word, limit, on_explain, deadline, local, core=self)
+
+    def save(self):
+        self.forms.save()
+        self.meanings.save()
+        self.paradigms.save()
+
+__default = None
+__default_lock = Lock()
+
+def default_core():
+    """
+        The core of the command line tools, built on first use with its
+        caches under CACHE_DIR, offline when PULVIS_OFFLINE is set
+    """
+    global __default
+    if __default is not None:
+        return __default
+
+    with __default_lock:
+        if __default is None:
+            import snapshot
+            offline = bool(os.environ.get("PULVIS_OFFLINE"))
+            __default = LookupCore(snapshot=snapshot.open_default(offline), offline=offline)
+    return __default
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+import re, sys, json, argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from xdict import LookupContext, parse_entry_page
+from normalize import normalize_key
+from core import default_core
+
+TOKEN = re.compile(r"[^\W\d_]+")
+
+FOUND     = "found"
+AMBIGUOUS = "ambiguous"
+NOTFOUND  = "notfound"
+ERROR     = "error"
+
+def tokenize(text):
+    return [(m.group(), m.start()) for m in TOKEN.finditer(text)]
+
+def fetch_entry_page(core, word):
+    return core.transport.fetch_text(LookupContext(word).entry)
+
+def parse_lemma_page(text):
+    # runs in a worker process, only plain tuples cross the process boundary
+    candidates, ambiguous, meaning, _ = parse_entry_page(text)
+    if ambiguous:
+        return AMBIGUOUS, [(word, variant, prop) for _, variant, word, _, prop in candidates]
+
+    if not meaning:
+        return NOTFOUND, []
+
+    lemma, gramma, _ = meaning
+    return FOUND, [(lemma, '', gramma)]
+
+class CorpusLemmatizer:
+    def __init__(self, core, max_fetch=8, processes=None):
+        self.core = core
+        self.max_fetch = max_fetch
+        self.processes = processes
+        self.types = {}
+        self.stats = { "local": 0, "remote": 0 }
+
+    def resolve_local(self, word):
+        snap = self.core.snapshot
+        if snap is not None:
+            ents = [e for e in snap.lemmas_for(word) if e.meaning]
+            if ents:
+                lemmas = [(e.meaning.lemma, e.variant(), e.meaning.gramma) for e in ents]
+                return (FOUND if len(lemmas) == 1 else AMBIGUOUS), lemmas
+
+        ent = self.core.entries.get(word)
+        if ent is not None:
+            if ent.require_clarify:
+                return AMBIGUOUS, [(a.word, a.lctx.variant, a.property) for a in ent.similars()]
+            if ent.meaning:
+                return FOUND, [(ent.meaning.lemma, ent.variant(), ent.meaning.gramma)]
+
+        lemmas = self.core.forms.lookup(word)
+        if not lemmas:
+            return None
+        return (FOUND if len(lemmas) == 1 else AMBIGUOUS), list(lemmas)
+
+    def resolve_remote(self, words):
+        results = {}
+        with ThreadPoolExecutor(self.max_fetch) as fetchers, \
+             ProcessPoolExecutor(self.processes) as parsers:
+            fetches = { fetchers.submit(fetch_entry_page, self.core, w): w for w in words }
+            parses = {}
+
+            # parsing starts as soon as a page arrives, while others are in flight
+            for fut in as_completed(fetches):
+                w = fetches[fut]
+                try:
+                    parses[parsers.submit(parse_lemma_page, fut.result())] = w
+                except Exception as e:
+                    results[w] = (ERROR, [str(e)])
+
+            for fut in as_completed(parses):
+                w = parses[fut]
+                try:
+                    results[w] = fut.result()
+                except Exception as e:
+                    results[w] = (ERROR, [str(e)])
+
+        for w, (status, lemmas) in results.items():
+            if status in (FOUND, AMBIGUOUS):
+                for lemma in lemmas:
+                    self.core.forms.add(w, *lemma)
+
+        return results
+
+    def resolve(self, words):
+        pending = []
+        for w in words:
+            r = self.resolve_local(w)
+            if r is None:
+                pending.append(w)
+                continue
+            self.types[normalize_key(w)] = r
+            self.stats["local"] += 1
+
+        for w, r in self.resolve_remote(pending).items():
+            self.types[normalize_key(w)] = r
+            self.stats["remote"] += 1
+
+        self.core.forms.save()
+
+    def lemmatize(self, text):
+        tokens = tokenize(text)
+
+        # one lookup per word type, not per token
+        surfaces = {}
+        for tok, _ in tokens:
+            k = normalize_key(tok)
+            if k not in self.types and k not in surfaces:
+                surfaces[k] = tok
+        self.resolve(surfaces.values())
+
+        out = []
+        for tok, offset in tokens:
+            status, lemmas = self.types[normalize_key(tok)]
+            out.append({
+                "token": tok,
+                "offset": offset,
+                "status": status,
+                "lemmas": lemmas if status != ERROR else [],
+            })
+        return out
+
+    def ambiguous_types(self):
+        return { k: v for k, (s, v) in self.types.items() if s == AMBIGUOUS }
+
+def main():
+    parser = argparse.ArgumentParser(description="Lemmatize a latin text file")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", default="-", help="json lines output, '-' for stdout")
+    parser.add_argument("-j", "--fetch", type=int, default=8, help="concurrent remote lookups")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="parser processes")
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        text = f.read()
+
+    lemmatizer = CorpusLemmatizer(default_core(), args.fetch, args.processes)
+    rows = lemmatizer.lemmatize(text)
+
+    out = sys.stdout if args.output == "-" else open(args.output, 'w', encoding="utf-8")
+    try:
+        for row in rows:
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{len(rows)} tokens, {len(lemmatizer.types)} types "
+          f"({lemmatizer.stats['local']} local, {lemmatizer.stats['remote']} remote), "
+          f"{len(lemmatizer.ambiguous_types())} ambiguous", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
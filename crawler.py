@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+
+import os, sys, json, time, string, argparse, itertools
+from collections import deque
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from xdict import EntryNotFoundException
+from cache import CACHE_DIR, EntryCache, atomic_write
+from core import default_core
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.__interval = 1.0 / rate if rate else 0
+        self.__next = time.monotonic()
+        self.__lock = Lock()
+
+    def acquire(self):
+        if not self.__interval:
+            return
+
+        with self.__lock:
+            now = time.monotonic()
+            at = max(now, self.__next)
+            self.__next = at + self.__interval
+
+        if at > now:
+            time.sleep(at - now)
+
+def prefix_seeds(length):
+    return ["".join(p) for p in itertools.product(string.ascii_lowercase, repeat=length)]
+
+class Crawler:
+    """
+        Breadth-first walk over lemmas and their variant links, filling the
+        page and entry caches. Progress (frontier and visited keys) is
+        checkpointed so an interrupted crawl resumes where it stopped.
+    """
+    def __init__(self, core, checkpoint, concurrency=4, max_frontier=100_000, checkpoint_every=50):
+        self.core = core
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.max_frontier = max_frontier
+        self.checkpoint_every = checkpoint_every
+
+        self.frontier = deque()
+        self.seen = set()
+        self.in_flight = {}
+        self.stats = { "visited": 0, "notfound": 0, "failed": 0, "dropped": 0 }
+
+    def load(self):
+        if not os.path.exists(self.checkpoint):
+            return False
+
+        with open(self.checkpoint, encoding="utf-8") as f:
+            state = json.load(f)
+
+        self.frontier = deque(tuple(x) for x in state["frontier"])
+        self.seen = set(state["seen"])
+        self.stats.update(state["stats"])
+        return True
+
+    def save(self):
+        state = {
+            "frontier": [*self.in_flight.values(), *self.frontier],
+            "seen": list(self.seen),
+            "stats": self.stats,
+        }
+        atomic_write(self.checkpoint, str.encode(json.dumps(state, ensure_ascii=False)))
+        self.core.save()
+
+    def enqueue(self, word, variant=''):
+        key = EntryCache.key(word, variant)
+        if key in self.seen:
+            return
+        if len(self.frontier) >= self.max_frontier:
+            self.stats["dropped"] += 1
+            return
+
+        self.seen.add(key)
+        self.frontier.append((word, variant))
+
+    def visit(self, word, variant):
+        ent = self.core.lookup(word, variant)
+        return [(a.lctx.word, a.lctx.variant) for a in ent.similars()]
+
+    def __done(self, fut):
+        item = self.in_flight.pop(fut)
+        try:
+            for link in fut.result():
+                self.enqueue(*link)
+            self.stats["visited"] += 1
+        except EntryNotFoundException:
+            self.stats["notfound"] += 1
+        except Exception as e:
+            print(f"failed: {item}: {e}", file=sys.stderr)
+            self.stats["failed"] += 1
+
+    def run(self, limit=None):
+        processed = 0
+        since_save = 0
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            try:
+                while self.frontier or self.in_flight:
+                    while self.frontier and len(self.in_flight) < self.concurrency:
+                        if limit is not None and processed >= limit:
+                            break
+                        item = self.frontier.popleft()
+                        self.in_flight[pool.submit(self.visit, *item)] = item
+                        processed += 1
+
+                    if not self.in_flight:
+                        break
+
+                    done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        self.__done(fut)
+
+                    since_save += len(done)
+                    if since_save >= self.checkpoint_every:
+                        since_save = 0
+                        self.save()
+                        print(f"  {self.stats} frontier={len(self.frontier)}", end='\r')
+            except KeyboardInterrupt:
+                for fut in self.in_flight:
+                    fut.cancel()
+                print("\ninterrupted, saving checkpoint")
+            finally:
+                self.save()
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warm the dictionary caches")
+    parser.add_argument("seeds", nargs="?", help="file with one seed word per line")
+    parser.add_argument("--prefix", type=int, default=0, help="seed with all alphabet prefixes of this length")
+    parser.add_argument("--checkpoint", default=os.path.join(CACHE_DIR, "crawl.json"))
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("-j", "--concurrency", type=int, default=4)
+    parser.add_argument("-r", "--rate", type=float, default=2.0, help="max requests per second")
+    parser.add_argument("--max-frontier", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=None, help="stop after visiting this many lemmas")
+    parser.add_argument("--explain", action="store_true", help="also cache GPT explanations")
+    parser.add_argument("-p", "--parse-processes", type=int, default=0,
+                        help="parse pages in this many processes, 0 parses in the fetching threads")
+    args = parser.parse_args()
+
+    core = default_core()
+    core.explainer.set_enabled(args.explain)
+    if args.explain and core.explainer.notice:
+        print(core.explainer.notice, file=sys.stderr)
+    core.transport.rate_limiter = RateLimiter(args.rate)
+    if args.parse_processes:
+        core.parser = ProcessPoolExecutor(args.parse_processes)
+
+    crawler = Crawler(core, args.checkpoint, args.concurrency, args.max_frontier)
+    if not args.fresh and crawler.load():
+        print(f"resuming, {len(crawler.frontier)} lemmas in frontier")
+    else:
+        seeds = []
+        if args.seeds:
+            with open(args.seeds, encoding="utf-8") as f:
+                seeds += [l.strip() for l in f if l.strip()]
+        if args.prefix:
+            seeds += prefix_seeds(args.prefix)
+        for s in seeds:
+            crawler.enqueue(s)
+
+    try:
+        crawler.run(args.limit)
+    finally:
+        if core.parser:
+            core.parser.shutdown(cancel_futures=True)
+    print(f"\n{crawler.stats}")
+
+if __name__ == "__main__":
+    main()
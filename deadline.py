@@ -0,0 +1,89 @@
+from time import monotonic
+from threading import Event
+
+# seconds each stage of a lookup may take, `total` caps the whole lookup
+DEFAULT_BUDGETS = {
+    "entry":       8.0,
+    "flexion":     6.0,
+    "opposite":    4.0,
+    "explanation": 8.0,
+}
+DEFAULT_TOTAL = 20.0
+
+class LookupCancelled(Exception):
+    def __init__(self, *args):
+        super().__init__(*args)
+
+class Deadline:
+    """
+        Cooperative cancellation and time budgets of a single lookup.
+        Stages call begin()/end() and size their blocking calls with
+        remaining(); skipped or cut-short stages are kept in `missing`.
+    """
+    def __init__(self, total=DEFAULT_TOTAL, budgets=None, on_stage=None):
+        self.total = total
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.missing = []
+
+        self.__on_stage = on_stage
+        self.__start = monotonic()
+        self.__cancelled = Event()
+        self.__stage = None
+        self.__stage_start = None
+
+    def cancel(self):
+        self.__cancelled.set()
+
+    def cancelled(self):
+        return self.__cancelled.is_set()
+
+    def stage(self):
+        return self.__stage
+
+    def remaining(self):
+        left = self.total - (monotonic() - self.__start) if self.total else float("inf")
+        if self.__stage is not None:
+            budget = self.budgets.get(self.__stage)
+            if budget:
+                left = min(left, budget - (monotonic() - self.__stage_start))
+        return max(0.0, left)
+
+    def timeout(self):
+        # for calls taking a `timeout` argument, where None means forever
+        left = self.remaining()
+        return None if left == float("inf") else left
+
+    def expired(self):
+        return self.cancelled() or self.remaining() <= 0
+
+    def begin(self, stage):
+        """
+            Enter `stage`, returns False (and records it as missing)
+            if the lookup was cancelled or ran out of time
+        """
+        if self.cancelled():
+            self.skip(stage, "cancelled")
+            return False
+
+        self.__stage = stage
+        self.__stage_start = monotonic()
+        if self.remaining() <= 0:
+            self.__stage = None
+            self.skip(stage, "out of time")
+            return False
+
+        if self.__on_stage:
+            self.__on_stage(stage)
+        return True
+
+    def end(self):
+        self.__stage = None
+        if self.__on_stage:
+            self.__on_stage(None)
+
+    def skip(self, stage, reason):
+        self.missing.append((stage, reason))
+
+    def check(self):
+        if self.cancelled():
+            raise LookupCancelled()
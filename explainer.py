@@ -1,6 +1,16 @@
-from openai import OpenAI
 from pydantic import BaseModel
-import os
+from time import perf_counter, monotonic, sleep
+from threading import Thread, Event, Lock, Timer
+from queue import Queue, Empty
+from concurrent.futures import Future, ThreadPoolExecutor, InvalidStateError, TimeoutError as FutureTimeout
+from normalize import normalize_key
+import os, re, hashlib
+from abc import ABC, abstractmethod
+
+try:
+    from openai import OpenAI
+except ImportError:
+    OpenAI = None
 
 class LatinEntry(BaseModel):
     expression: str
@@ -12,15 +22,34 @@ class LatinResponse(BaseModel):
     entries: list[LatinEntry]
 
 class Explaination:
-    def __init__(self, client: OpenAI, words):
+    def __init__(self, client, words, on_partial=None, model="gpt-4o"):
+        self.__model = model
         self.__client = client
-        response = self.__get_response(words)
+        self.ttft = None
+        start = perf_counter()
+
+        response = None
+        if on_partial:
+            try:
+                response = self.__stream_response(words, on_partial, start)
+            except Exception:
+                response = None
+        if response is None:
+            response = self.__get_response(words)
+
+        self.elapsed = perf_counter() - start
+        if self.ttft is None:
+            self.ttft = self.elapsed
+
         self.__refusal = response.refusal
         
         if self.is_refused():
             return
         
-        self.entries = response.parsed.entries
+        parsed = response.parsed
+        if not isinstance(parsed, LatinResponse):
+            parsed = LatinResponse.model_validate_json(response.content)
+        self.entries = parsed.entries
     
 
     def is_refused(self):
@@ -56,33 +85,508 @@ If the expression is not a valid Classical Latin, explain why.
     
     def __get_response(self, words):
         return self.__client.beta.chat.completions.parse(
-            model="gpt-4o",
+            model=self.__model,
             messages=self.__create_prompt(words),
             response_format=LatinResponse,
         ).choices[0].message
+
+    def __stream_response(self, words, on_partial, start):
+        with self.__client.beta.chat.completions.stream(
+            model=self.__model,
+            messages=self.__create_prompt(words),
+            response_format=LatinResponse,
+        ) as stream:
+            for event in stream:
+                if event.type != "content.delta" or not event.parsed:
+                    continue
+                if self.ttft is None:
+                    self.ttft = perf_counter() - start
+
+                partial = event.parsed
+                if hasattr(partial, "model_dump"):
+                    partial = partial.model_dump()
+                on_partial(partial)
+
+            return stream.get_final_completion().choices[0].message
     
+# rough prompt + structured output cost of one expression
+OUTPUT_TOKENS_PER_WORD = 200
+
+def estimate_tokens(word):
+    return len(word) // 4 + 1 + OUTPUT_TOKENS_PER_WORD
+
+class BatchedExplaination:
+    def __init__(self, entries, backend=None, elapsed=0.0):
+        self.entries = entries
+        self.backend = backend
+        self.elapsed = elapsed
+        self.ttft = elapsed
+
+    def is_refused(self):
+        return False
+
+    def refused_message(self):
+        return None
+
+# What the local backends know about an expression, taken from the parsed
+# dictionary entry: grammatical description, english meanings and the
+# flexion tables (voice -> FlexionTable) if any.
+class ExplainSubject:
+    def __init__(self, expression, gramma='', meanings=(), flexions=None):
+        self.expression = expression
+        self.gramma = gramma
+        self.meanings = list(meanings)
+        self.flexions = flexions or {}
+
+class ExplainBackend(ABC):
+    name = "none"
+
+    @abstractmethod
+    def explain(self, words, on_partial=None, subjects=None):
+        """
+            An explaination of `words` with `entries` in their order
+        """
+
+class OpenAIBackend(ExplainBackend):
+    name = "openai"
+
+    def __init__(self, client, model="gpt-4o"):
+        self.client = client
+        self.model = model
+
+    def explain(self, words, on_partial=None, subjects=None):
+        e = Explaination(self.client, words, on_partial, self.model)
+        e.backend = self.name
+        return e
+
+GRAMMA_TERMS = [
+    (r"\b1st\b|\bfirst\b", "of the first {}"),
+    (r"\b2nd\b|\bsecond\b", "of the second {}"),
+    (r"\b3rd\b|\bthird\b", "of the third {}"),
+    (r"\b4th\b|\bfourth\b", "of the fourth {}"),
+    (r"\b5th\b|\bfifth\b", "of the fifth {}"),
+]
+
+GENDERS = [
+    (r"\bmasc|\bm\.?$|\bm\b", "masculine"),
+    (r"\bfem|\bf\.?$|\bf\b", "feminine"),
+    (r"\bneut|\bn\.?$|\bn\b", "neuter"),
+]
+
+class LocalBackend(ExplainBackend):
+    """
+        Rule based explainations built from the dictionary data alone,
+        it needs `subjects` and answers in microseconds
+    """
+    name = "local"
+
+    def __grammar(self, s):
+        g = s.gramma.strip() or "a Latin word"
+        kind = "conjugation" if "verb" in g.lower() else "declension"
+
+        parts = [f"{s.expression} is listed as {g}"]
+        for pat, desc in GRAMMA_TERMS:
+            if kind not in g.lower() and re.search(pat, g, re.I):
+                parts.append(desc.format(kind))
+                break
+        for pat, gender in GENDERS:
+            if re.search(pat, g, re.I) and gender not in g.lower():
+                parts.append(f"and {gender}")
+                break
+        sentence = " ".join(parts) + "."
+
+        voices = [v for v, t in s.flexions.items() if t is not None]
+        planes = []
+        for t in s.flexions.values():
+            if t is None:
+                continue
+            planes += [p for p in t.planes if p and p not in planes]
+
+        if voices and voices != ["inflection"]:
+            sentence += f" It is attested in the {' and '.join(voices)} voice."
+        if planes:
+            sentence += f" Its paradigm covers {', '.join(p.strip().lower() for p in planes)}."
+        return sentence
+
+    def __semantic(self, s):
+        if not s.meanings:
+            return f"No meaning of {s.expression} is recorded locally."
+        return f"{s.expression} means {s.meanings[0]}."
+
+    def __nuances(self, s):
+        others = s.meanings[1:]
+        if not others:
+            return "No further senses are recorded in the dictionary."
+        return "It may also mean " + "; ".join(others) + "."
+
+    def explain_subject(self, s):
+        return LatinEntry(
+            expression=s.expression,
+            explain_grammar=self.__grammar(s),
+            explain_semantic=self.__semantic(s),
+            explain_nuances=self.__nuances(s),
+        )
+
+    def explain(self, words, on_partial=None, subjects=None):
+        start = perf_counter()
+        subjects = subjects or [None] * len(words)
+        entries = [
+            self.explain_subject(s or ExplainSubject(w)) for w, s in zip(words, subjects)
+        ]
+        return BatchedExplaination(entries, self.name, perf_counter() - start)
+
+class FakeBackend(ExplainBackend):
+    """
+        Deterministic answers after a configurable delay, for benchmarks
+    """
+    name = "fake"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def explain(self, words, on_partial=None, subjects=None):
+        start = perf_counter()
+        sleep(self.latency)
+        entries = []
+        for w in words:
+            h = hashlib.sha256(str.encode(w)).hexdigest()[:8]
+            entries.append(LatinEntry(
+                expression=w,
+                explain_grammar=f"grammar of {w} ({h})",
+                explain_semantic=f"semantic of {w} ({h})",
+                explain_nuances=f"nuances of {w} ({h})",
+            ))
+        return BatchedExplaination(entries, self.name, perf_counter() - start)
+
+class BackendStats:
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.last = None
+        self.__lock = Lock()
+
+    def record(self, elapsed):
+        with self.__lock:
+            self.calls += 1
+            self.total += elapsed
+            self.last = elapsed
+
+    def mean(self):
+        return self.total / self.calls if self.calls else None
+
+def match_entries(words, entries):
+    """
+        The entry answering each word, by expression: a model may reorder,
+        drop or repeat them. Entries whose expression matches no word are
+        given in order to the words left unanswered.
+    """
+    keys = [normalize_key(w) for w in words]
+    by_expr = {}
+    for e in entries:
+        by_expr.setdefault(normalize_key(e.expression), e)
+
+    wanted = set(keys)
+    rest = iter([e for e in entries if normalize_key(e.expression) not in wanted])
+    return [by_expr[k] if k in by_expr else next(rest, None) for k in keys]
+
+class ExplainBatcher:
+    """
+        Packs explain requests arriving within `window` seconds (or until
+        `max_batch` words / `max_tokens` estimated tokens) into a single
+        structured call. Equal words within a batch share one slot.
+
+        `record(name, result)` is called with every answer. The words of a
+        batch still unanswered after `fallback_after` seconds are given
+        the answer of the `fallback` backend, if any.
+    """
+    def __init__(self, backend: ExplainBackend, window=0.05, max_batch=16, max_tokens=4000, max_inflight=4,
+                 record=None, fallback=None, fallback_after=None):
+        self.__backend = backend
+        self.window = window
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.record = record
+        self.fallback = fallback
+        self.fallback_after = fallback_after
+
+        self.__queue = Queue()
+        self.__pool = ThreadPoolExecutor(max_inflight)
+        self.__th = Thread(target=self.__collect, daemon=True)
+        self.__th.start()
+
+    def submit(self, word, subject=None):
+        fut = Future()
+        self.__queue.put((word, subject, fut))
+        return fut
+
+    def explain(self, words, subjects=None):
+        subjects = subjects or [None] * len(words)
+        futs = [self.submit(w, s) for w, s in zip(words, subjects)]
+        return BatchedExplaination([f.result() for f in futs], self.__backend.name)
+
+    def close(self):
+        self.__queue.put(None)
+        self.__th.join()
+        self.__pool.shutdown()
+
+    def __collect(self):
+        stop = False
+        while not stop:
+            item = self.__queue.get()
+            if item is None:
+                return
+
+            batch = {}
+            tokens = 0
+            deadline = monotonic() + self.window
+            while True:
+                word, subject, fut = item
+                key = normalize_key(word)
+                if key in batch:
+                    batch[key][2].append(fut)
+                else:
+                    batch[key] = (word, subject, [fut])
+                    tokens += estimate_tokens(word)
+
+                if len(batch) >= self.max_batch or tokens >= self.max_tokens:
+                    break
+
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.__queue.get(timeout=timeout)
+                except Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+
+            self.__pool.submit(self.__dispatch, list(batch.values()))
+
+    def __dispatch(self, batch):
+        timer = None
+        if self.fallback is not None and self.fallback_after is not None:
+            timer = Timer(self.fallback_after, self.__fall_back, [batch])
+            timer.daemon = True
+            timer.start()
+        try:
+            self.__answer(self.__backend, batch)
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    def __fall_back(self, batch):
+        waiting = [b for b in batch if not all(f.done() for f in b[2])]
+        if waiting:
+            self.__answer(self.fallback, waiting)
+
+    def __answer(self, backend, batch):
+        # a future may have been answered already, by the other backend
+        def settle(f, value=None, error=None):
+            try:
+                if error is not None:
+                    f.set_exception(error)
+                else:
+                    f.set_result(value)
+            except InvalidStateError:
+                pass
+
+        words = [w for w, _, _ in batch]
+        try:
+            expl = backend.explain(words, subjects=[s for _, s, _ in batch])
+        except Exception as e:
+            for _, _, futs in batch:
+                for f in futs:
+                    settle(f, error=e)
+            return
+
+        if self.record is not None:
+            self.record(backend.name, expl)
+
+        if expl.is_refused():
+            err = RuntimeError(expl.refused_message())
+            for _, _, futs in batch:
+                for f in futs:
+                    settle(f, error=err)
+            return
+
+        for (_, _, futs), ent in zip(batch, match_entries(words, expl.entries)):
+            for f in futs:
+                settle(f, ent)
+
+# seconds to wait for the remote backend before answering locally
+FALLBACK_AFTER = 3.0
+MAX_LATE = 256
+
 class Explainer:
-    def __init__(self, api_key_file="apikey"):
+    def __init__(self, api_key_file="apikey", fallback_after=FALLBACK_AFTER):
         self.__en = True
+        self.__streaming = True
+        self.__batcher = None
+        self.__lock = Lock()
+        self.__late = {}
+
+        self.fallback_after = fallback_after
+        self.local = LocalBackend()
+        self.backends = { self.local.name: self.local }
+        self.stats = { self.local.name: BackendStats() }
+        self.__backend = self.local
 
-        if not os.path.exists(api_key_file):
-            print("No ApiKey to OpenAI is detected, disabled explainer.")
-            self.__client = None
+        # without an apikey explaining stays off until a backend is selected,
+        # telling the user so is left to the front end
+        self.__selected = False
+        self.notice = None
+
+        if OpenAI is None or not os.path.exists(api_key_file):
+            self.notice = "No ApiKey to OpenAI is detected, disabled explainer."
             self.__en = False
             return
-        
 
         with open(api_key_file, 'r') as f: 
-            self.__client = OpenAI(api_key=f.read())
+            self.add_backend(OpenAIBackend(OpenAI(api_key=f.read())), select=True)
+
+    def add_backend(self, backend, select=False):
+        self.backends[backend.name] = backend
+        self.stats[backend.name] = BackendStats()
+        if select:
+            self.select(backend.name)
+
+    def select(self, name):
+        with self.__lock:
+            self.__backend = self.backends[name]
+            self.__selected = True
+            self.__en = True
+            batcher, self.__batcher = self.__batcher, None
+        if batcher is not None:
+            batcher.close()
+
+    def backend(self):
+        return self.__backend
 
     def set_enabled(self, val):
-        if self.__client:
+        if self.__selected:
             self.__en = val
 
-    def explain(self, words):
+    def enabled(self):
+        return self.__en
+
+    def set_streaming(self, val):
+        self.__streaming = val
+
+    def __record(self, name, result):
+        if result is not None:
+            self.stats[name].record(getattr(result, "elapsed", 0.0))
+
+    def explain(self, words, on_partial=None, subjects=None, deadline=None):
+        """
+            With a `deadline` (see deadline.Deadline) the wait for a remote
+            backend is bounded by its remaining time and cancellation,
+            falling back to the local answer
+        """
         if not self.__en:
             return None
-        return Explaination(self.__client, words)
+        if not self.__streaming:
+            on_partial = None
+
+        backend = self.__backend
+        if backend is self.local:
+            r = self.local.explain(words, subjects=subjects)
+            self.__record(self.local.name, r)
+            return r
+
+        key = tuple(words)
+        with self.__lock:
+            late = self.__late.pop(key, None)
+        if late is not None:
+            return late
+
+        return self.__explain_remote(backend, key, words, on_partial, subjects, deadline)
+
+    def __explain_remote(self, backend, key, words, on_partial, subjects, deadline):
+        # the remote call runs aside, if it shows no sign of life within
+        # `fallback_after` the local answer is returned and the remote one
+        # is kept for the next time these words are asked for
+        started = Event()
+        abandoned = Event()
+        result = Future()
+
+        def partial(p):
+            started.set()
+            if not abandoned.is_set():
+                on_partial(p)
+
+        def run():
+            try:
+                r = backend.explain(words, partial if on_partial else None, subjects)
+                self.__record(backend.name, r)
+                result.set_result(r)
+            except Exception as e:
+                result.set_exception(e)
+            finally:
+                started.set()
+
+        Thread(target=run, daemon=True).start()
+
+        limit = self.fallback_after
+        if deadline is not None:
+            limit = min(limit, deadline.remaining())
+        until = monotonic() + limit
+        while not started.is_set() and monotonic() < until:
+            if deadline is not None and deadline.cancelled():
+                break
+            started.wait(min(0.1, max(0.0, until - monotonic())))
+
+        if started.is_set():
+            if deadline is None:
+                return result.result()
+            while not deadline.expired():
+                try:
+                    return result.result(timeout=0.1)
+                except FutureTimeout:
+                    pass
+
+        abandoned.set()
+
+        def keep_late(f):
+            if f.exception() is None:
+                with self.__lock:
+                    if len(self.__late) >= MAX_LATE:
+                        del self.__late[next(iter(self.__late))]
+                    self.__late[key] = f.result()
+        result.add_done_callback(keep_late)
+
+        r = self.local.explain(words, subjects=subjects)
+        self.__record(self.local.name, r)
+        return r
+
+    def submit(self, word, subject=None):
+        """
+            Queue `word` for a micro-batched explaination,
+            returns a future of its LatinEntry, answered locally if the
+            remote backend takes longer than `fallback_after`
+        """
+        if not self.__en:
+            fut = Future()
+            fut.set_result(None)
+            return fut
+
+        with self.__lock:
+            if self.__batcher is None:
+                backend = self.__backend
+                fallback = None if backend is self.local else self.local
+                self.__batcher = ExplainBatcher(backend, record=self.__record,
+                                                fallback=fallback, fallback_after=self.fallback_after)
+            batcher = self.__batcher
+        return batcher.submit(word, subject)
 
+    def status(self):
+        lines = []
+        for name in self.backends:
+            st = self.stats[name]
+            mark = "*" if self.backends[name] is self.__backend else " "
+            mean = st.mean()
+            lat = f"{mean * 1000:.1f} ms mean, {st.last * 1000:.1f} ms last" if mean is not None else "unused"
+            lines.append(f"{mark} {name:<8} {st.calls:>5} calls, {lat}")
+        return lines
 
-explainer = Explainer()
\ No newline at end of file
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# A local stand-in for the OpenAI chat completion endpoint, answering the
+# explainer prompt with deterministic LatinResponse JSON, either at once or
+# as a server-sent event stream. Point the explainer at it with
+#
+#     OPENAI_BASE_URL=http://127.0.0.1:8765/v1 ./main.py
+
+import json, time, argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+def fake_entries(words):
+    return [{
+        "expression": w,
+        "explain_grammar": f"{w} is explained grammatically here.",
+        "explain_semantic": f"{w} carries this meaning.",
+        "explain_nuances": f"{w} differs from its synonyms in usage.",
+    } for w in words]
+
+def fake_content(messages):
+    user = [m["content"] for m in messages if m["role"] == "user"]
+    words = user[-1].split("|") if user else []
+    return json.dumps({ "entries": fake_entries(words) })
+
+class FakeCompletionHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    chunk_delay = 0.0
+    chunk_size = 8
+
+    def log_message(self, *args):
+        pass
+
+    def __send_json(self, obj):
+        body = str.encode(json.dumps(obj))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __send_event(self, obj):
+        self.wfile.write(str.encode(f"data: {json.dumps(obj)}\n\n"))
+        self.wfile.flush()
+
+    def __chunk(self, delta, finish=None):
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": self.model,
+            "choices": [{ "index": 0, "delta": delta, "finish_reason": finish }],
+        }
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.model = req.get("model", "gpt-4o")
+        content = fake_content(req["messages"])
+        time.sleep(self.latency)
+
+        if not req.get("stream"):
+            self.__send_json({
+                "id": "chatcmpl-fake", "object": "chat.completion",
+                "created": int(time.time()), "model": self.model,
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": { "role": "assistant", "content": content, "refusal": None },
+                }],
+                "usage": { "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0 },
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        self.__send_event(self.__chunk({ "role": "assistant", "content": "" }))
+        for i in range(0, len(content), self.chunk_size):
+            time.sleep(self.chunk_delay)
+            self.__send_event(self.__chunk({ "content": content[i:i + self.chunk_size] }))
+        self.__send_event(self.__chunk({}, "stop"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+def serve(port=8765, latency=0.0, chunk_delay=0.0):
+    handler = type("Handler", (FakeCompletionHandler, ), {
+        "latency": latency, "chunk_delay": chunk_delay
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completion endpoint")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    args = parser.parse_args()
+
+    serve(args.port, args.latency, args.chunk_delay).serve_forever()
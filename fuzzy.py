@@ -0,0 +1,154 @@
+from threading import Lock
+
+from normalize import normalize_key
+
+# u/v and i/j are spelling conventions, not different letters
+ORTHOGRAPHY = str.maketrans("jv", "iu")
+
+MAX_DISTANCE = 2
+PREFIX_LENGTH = 7
+
+def fuzzy_key(text):
+    return normalize_key(text).translate(ORTHOGRAPHY)
+
+def edit_distance(a, b, max_distance):
+    """
+        Optimal string alignment distance between `a` and `b`, anything
+        above `max_distance` is reported as max_distance + 1
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        lo = max(1, i - max_distance)
+        hi = min(len(b), i + max_distance)
+        if lo > 1:
+            cur[lo - 1] = max_distance + 1
+        best = cur[lo - 1]
+        for j in range(lo, hi + 1):
+            cost = a[i - 1] != b[j - 1]
+            d = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if cost and prev2 is not None and i > 1 and j > 1 \
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d = min(d, prev2[j - 2] + 1)
+            cur[j] = d
+            best = min(best, d)
+        if hi < len(b):
+            cur[hi + 1:] = [max_distance + 1] * (len(b) - hi)
+        if best > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+
+    return min(prev[len(b)], max_distance + 1)
+
+def deletes(word, max_distance):
+    out = { word }
+    edge = { word }
+    for _ in range(max_distance):
+        edge = { w[:i] + w[i + 1:] for w in edge if len(w) > 1 for i in range(len(w)) } - out
+        out |= edge
+    return out
+
+class FuzzyIndex:
+    """
+        Symmetric delete index: every key is stored under all the strings
+        obtained by deleting up to `max_distance` letters from its prefix,
+        so a lookup only probes the deletes of the query
+    """
+    def __init__(self, max_distance=MAX_DISTANCE, prefix_length=PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.__deletes = {}
+        self.__keys = set()
+
+    def add(self, key):
+        if key in self.__keys:
+            return
+        self.__keys.add(key)
+
+        for d in deletes(key[:self.prefix_length], self.max_distance):
+            bucket = self.__deletes.get(d)
+            if bucket is None:
+                self.__deletes[d] = key
+            elif isinstance(bucket, str):
+                self.__deletes[d] = [bucket, key]
+            else:
+                bucket.append(key)
+
+    def __contains__(self, key):
+        return key in self.__keys
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def lookup(self, key, max_distance=None, limit=None):
+        """
+            Keys within `max_distance` of `key` as (key, distance) tuples,
+            closest first
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        if key in self.__keys:
+            return [(key, 0)]
+
+        seen = set()
+        found = []
+        for d in deletes(key[:self.prefix_length], max_distance):
+            bucket = self.__deletes.get(d)
+            if bucket is None:
+                continue
+            for cand in (bucket, ) if isinstance(bucket, str) else bucket:
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                dist = edit_distance(key, cand, max_distance)
+                if dist <= max_distance:
+                    found.append((cand, dist))
+
+        found.sort(key=lambda c: (c[1], abs(len(c[0]) - len(key)), c[0]))
+        return found[:limit] if limit is not None else found
+
+class Suggester:
+    """
+        Closest known forms for a misspelled or unknown word, kept in
+        step with the form index as new entries are parsed
+    """
+    def __init__(self, index):
+        self.form_index = index
+        self.__index = FuzzyIndex()
+        self.__surfaces = {}
+        self.__synced = 0
+        # one thread at a time catches up with the form index
+        self.__lock = Lock()
+
+    def __sync(self):
+        if len(self.form_index) == self.__synced:
+            return
+        with self.__lock:
+            new = self.form_index.forms(self.__synced)
+            for form in new:
+                k = fuzzy_key(form)
+                self.__surfaces.setdefault(k, []).append(form)
+                self.__index.add(k)
+            self.__synced += len(new)
+
+    def known(self, word):
+        return bool(self.form_index.lookup(word))
+
+    def suggest(self, word, limit=5):
+        """
+            Up to `limit` (form, distance, lemmas) tuples,
+            lemmas as stored in the form index
+        """
+        self.__sync()
+        out = []
+        for k, dist in self.__index.lookup(fuzzy_key(word)):
+            for form in self.__surfaces[k]:
+                out.append((form, dist, self.form_index.lookup(form)))
+            if len(out) >= limit:
+                break
+        return out[:limit]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+import gc, sys, types, argparse, tracemalloc
+from collections import deque
+
+from bs4.element import PageElement
+
+# Objects reached from a cache or an entry but not owned by it: code,
+# classes and modules are shared by everything
+NOT_OWNED = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+    types.MethodType, types.CodeType, types.FrameType,
+)
+
+def referents(obj):
+    """
+        (name, object) pairs of what `obj` refers to, names are
+        only there to tell where a retained object hangs from
+    """
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            yield "<key>", k
+            yield f"[{k!r}]", v
+        return
+    if isinstance(obj, (list, tuple, deque)):
+        for i, v in enumerate(obj):
+            yield f"[{i}]", v
+        return
+    if isinstance(obj, (set, frozenset)):
+        for v in obj:
+            yield "<item>", v
+        return
+    if isinstance(obj, types.GeneratorType):
+        # a suspended generator keeps its locals alive
+        if obj.gi_frame is not None:
+            for k, v in obj.gi_frame.f_locals.items():
+                yield f"<{obj.__name__}>.{k}", v
+        return
+
+    d = getattr(obj, "__dict__", None)
+    if isinstance(d, dict):
+        for k, v in d.items():
+            yield f".{k}", v
+    for cls in type(obj).__mro__:
+        for k in getattr(cls, "__slots__", ()):
+            if hasattr(obj, k) and k not in ("__dict__", "__weakref__"):
+                yield f".{k}", getattr(obj, k)
+    for v in gc.get_referents(obj):
+        if v is not d and not isinstance(v, type):
+            yield "<ref>", v
+
+def walk(obj, seen=None, stop=lambda o: False):
+    """
+        (path, object) of everything reachable from `obj` once, depth
+        first. Objects for which `stop` holds are yielded but not entered.
+    """
+    seen = set() if seen is None else seen
+    stack = [("", obj)]
+    while stack:
+        path, o = stack.pop()
+        if id(o) in seen or isinstance(o, NOT_OWNED):
+            continue
+        seen.add(id(o))
+        yield path, o
+        if stop(o) or isinstance(o, (str, bytes, int, float, complex, bool)):
+            continue
+        for name, v in referents(o):
+            if id(v) not in seen:
+                stack.append((path + name, v))
+
+def deep_size(obj, seen=None):
+    """
+        Bytes of `obj` and all it references. Pass the same `seen` set to
+        a series of calls to count shared objects only once.
+    """
+    return sum(sys.getsizeof(o) for _, o in walk(obj, seen))
+
+def retained_trees(obj, limit=None):
+    """
+        Paths from `obj` to parse tree nodes (BeautifulSoup tags and
+        strings) it still references, empty when parsing left none behind
+    """
+    out = []
+    is_node = lambda o: isinstance(o, PageElement)
+    for path, o in walk(obj, stop=is_node):
+        if is_node(o):
+            out.append((path or "<self>", type(o).__name__))
+            if limit is not None and len(out) >= limit:
+                break
+    return out
+
+def format_size(n):
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+def cache_sizes(core, extra=()):
+    """
+        [(name, bytes)] of the in-memory caches of a LookupCore, and of
+        the `extra` (name, object) pairs. An object reachable from several
+        caches is counted in the first one only.
+    """
+    parts = [
+        ("entry cache", core.entries),
+        ("form index", core.forms),
+        ("meaning index", core.meanings),
+        ("paradigms", core.paradigms),
+        ("suggestions", core.suggester),
+        ("explainer", core.explainer),
+        *extra,
+    ]
+    seen = set()
+    return [(name, deep_size(obj, seen)) for name, obj in parts]
+
+def largest_entries(entries, n=10):
+    """
+        [(key, bytes)] of the `n` largest of the (key, entry) pairs
+    """
+    sizes = [(key, deep_size(ent)) for key, ent in entries]
+    sizes.sort(key=lambda s: -s[1])
+    return sizes[:n]
+
+class AllocationTrace:
+    def __init__(self, diff, peak):
+        self.stats = diff
+        self.peak = peak
+
+    def retained(self):
+        return sum(s.size_diff for s in self.stats)
+
+    def top(self, n=10):
+        return [s for s in self.stats if s.size_diff > 0][:n]
+
+def trace(fn, *args, **kwargs):
+    """
+        (result, AllocationTrace) of calling `fn`: what the call allocated
+        and still holds, by source line, and the peak while it ran
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__), )
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    return result, AllocationTrace(after.compare_to(before, "lineno"), peak - base)
+
+def parsed_objects(text):
+    """
+        What the parsers keep of a cached page: the plain results and
+        the objects built from them, as (label, object)
+    """
+    from xdict import (parse_entry_page, parse_flexion_page, parse_reverse_entries,
+                       Ambiguity, WordMeaning, FlexionTable, ReverseDictTokenStream)
+    from bs4 import BeautifulSoup
+    from cache import MeaningIndex
+    import os
+
+    if 'class="english"' in text:
+        container = BeautifulSoup(text, 'html.parser').find('div', id="myth")
+        if container is None:
+            return []
+        meanings = MeaningIndex(os.devnull)
+        ents = list(parse_reverse_entries(ReverseDictTokenStream(container), meanings))
+        return [("reverse entries", ents), ("meaning index", meanings)]
+
+    if "conjugation-container" in text:
+        plain = parse_flexion_page(text)
+        out = [("flexion page", plain)]
+        if plain:
+            out.append(("flexion table", FlexionTable.from_plain(plain[1])))
+        return out
+
+    plain = parse_entry_page(text)
+    candidates, _, meaning, _ = plain
+    out = [("entry page", plain), ("ambiguities", [Ambiguity.from_plain(*a) for a in candidates])]
+    if meaning:
+        out.append(("meaning", WordMeaning.from_plain(*meaning)))
+    return out
+
+def check(pages=(), entries=()):
+    """
+        Regression check: [(what, path, node type)] for every parse tree
+        node still referenced by parsed pages or cached entries
+    """
+    leaks = []
+    for i, text in enumerate(pages):
+        for label, obj in parsed_objects(text):
+            leaks += [(f"page {i} {label}", path, t) for path, t in retained_trees(obj, 1)]
+    for i, ent in enumerate(entries):
+        leaks += [(f"entry {i}", path, t) for path, t in retained_trees(ent, 1)]
+    return leaks
+
+if __name__ == "__main__":
+    import itertools
+    from core import default_core
+
+    parser = argparse.ArgumentParser(description="Memory diagnostics")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("check", help="fail if parsed pages or cached entries keep parse trees alive")
+    c.add_argument("-n", "--limit", type=int, default=500, help="pages and entries to check")
+    sub.add_parser("sizes", help="deep size of the cached entries")
+    args = parser.parse_args()
+
+    core = default_core()
+    if args.cmd == "check":
+        def pages():
+            for p in core.pages.pages():
+                with open(p, 'rb') as f:
+                    yield core.pages.codec.decode(f.read())
+
+        leaks = check(itertools.islice(pages(), args.limit),
+                      itertools.islice(core.entries.entries(), args.limit))
+        for what, path, t in leaks:
+            print(f"{what}: {t} at {path}")
+        print(f"{len(leaks)} parse trees retained")
+        sys.exit(1 if leaks else 0)
+
+    entries = [(f"{e.meaning.lemma if e.meaning else '?'}{e.variant()}", e)
+               for e in core.entries.entries()]
+    total = sum(deep_size(e) for _, e in entries)
+    print(f"{len(entries)} entries, {format_size(total)}, "
+          f"{format_size(total / (len(entries) or 1))} per entry")
+    for key, size in largest_entries(entries):
+        print(f"  {key:<32} {format_size(size):>12}")
@@ -0,0 +1,75 @@
+import re, sys, unicodedata
+
+# Codepoints covered by the precomputed tables: Latin-1, Latin Extended-A/B,
+# combining diacritics and Latin Extended Additional. This is every letter
+# the dictionary pages (and macronized Latin input) ever produce.
+TABLE_RANGES = [
+    (0x0000, 0x0250),
+    (0x0300, 0x0370),
+    (0x1E00, 0x1F00),
+]
+
+def _slow_fold(text):
+    decomposed_text = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in decomposed_text if unicodedata.category(char) != 'Mn')
+
+def _build_table():
+    table = {}
+    for lo, hi in TABLE_RANGES:
+        for cp in range(lo, hi):
+            ch = chr(cp)
+            folded = _slow_fold(ch)
+            if folded != ch:
+                table[cp] = folded if folded else None
+    return table
+
+def _build_key_table(fold_table):
+    table = {}
+    for lo, hi in TABLE_RANGES:
+        for cp in range(lo, hi):
+            ch = chr(cp)
+            folded = fold_table.get(cp, ch) or ''
+            folded = folded.casefold()
+            if folded != ch:
+                table[cp] = folded if folded else None
+    return table
+
+FOLD_TABLE = str.maketrans(_build_table())
+KEY_TABLE  = str.maketrans(_build_key_table(FOLD_TABLE))
+
+OUTSIDE_TABLE = re.compile("[^%s]" % "".join(
+    f"\\u{lo:04x}-\\u{hi - 1:04x}" for lo, hi in TABLE_RANGES
+))
+
+def _in_table(text):
+    return OUTSIDE_TABLE.search(text) is None
+
+def fold(text):
+    """
+        Remove diacritics (macrons, breves, accents) from `text`,
+        case is preserved
+    """
+    if text.isascii():
+        return text
+
+    folded = text.translate(FOLD_TABLE)
+    if folded.isascii() or _in_table(folded):
+        return folded
+    return _slow_fold(folded)
+
+def normalize_key(text):
+    """
+        Accent and case insensitive key for caches, history and indexes.
+        Keys are interned, so equal keys share a single string object.
+    """
+    text = " ".join(text.split())
+    if text.isascii():
+        return sys.intern(text.lower())
+
+    key = text.translate(KEY_TABLE)
+    if not (key.isascii() or _in_table(key)):
+        key = _slow_fold(key).casefold()
+    return sys.intern(key)
+
+def normalize_keys(texts):
+    return [normalize_key(t) for t in texts]
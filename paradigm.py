@@ -0,0 +1,574 @@
+#!/usr/bin/env python
+
+import os, re, pickle, argparse
+from threading import Lock
+
+from normalize import fold, normalize_key
+from cache import CACHE_DIR, atomic_write
+from cells import CellLookup, canonical
+
+# Regular paradigms are derived from the lemma alone: the endings of the
+# regular declensions and conjugations are written out below as rules,
+# applied to the stem of the lemma. A rule is only trusted once its tables
+# kept matching those fetched for the lemmas it applies to.
+#
+# Only the classes whose lemma gives every stem have a rule: the 3rd
+# declension needs the genitive (rex, regis), the 2nd, 3rd and 4th
+# conjugations the perfect and supine (moneo, monui; maneo, mansi), and
+# the dictionary entry gives neither.
+
+PERSONS = ["I sing.", "II sing.", "III sing.", "I plur.", "II plur.", "III plur."]
+CASES = ["Nom.", "Gen.", "Dat.", "Acc.", "Voc.", "Abl."]
+INVARIABLE = "Invar."
+
+# share the ending of regular classes but not their paradigms
+IRREGULAR = frozenset([
+    "do", "sto", "iuvo", "lavo", "sum", "possum", "prosum", "eo", "fero",
+    "volo", "nolo", "malo", "fio", "edo", "domus", "vis", "deus",
+    "unus", "solus", "totus", "nullus", "nonnullus", "ullus", "alius", "vetus", "plus",
+])
+
+# 1st conjugation verbs with a perfect in -ui (secui, sectum), and their compounds
+IRREGULAR_PERFECTS = frozenset([
+    "seco", "veto", "sono", "domo", "cubo", "tono", "crepo", "mico", "frico", "plico", "neco",
+])
+
+# verbs whose compounds share their irregular paradigm (circumdo, praesto, adiuvo)
+COMPOUNDED = frozenset(["do", "sto", "iuvo", "lavo"]) | IRREGULAR_PERFECTS
+
+PREFIXES = (
+    "a", "ab", "abs", "ac", "ad", "af", "ag", "al", "ante", "ap", "ar", "as", "at",
+    "circum", "co", "col", "com", "con", "cor", "de", "di", "dis", "e", "ex", "ef",
+    "il", "im", "in", "inter", "ir", "ob", "oc", "of", "op", "per", "pessum", "prae",
+    "praeter", "pro", "re", "red", "satis", "sub", "suc", "suf", "sup", "super", "sus",
+    "trans", "venum",
+)
+
+# what the gramma says of the gender of a noun
+GENDER_WORDS = {
+    "masculine": "m", "masc": "m", "m": "m",
+    "feminine": "f", "fem": "f", "f": "f",
+    "neuter": "n", "neut": "n", "n": "n",
+}
+
+# the genders a declension rule holds for, a neuter in -a is no 1st
+# declension noun (poema, arma) nor a feminine in -um a 2nd declension one
+RULE_GENDERS = {
+    ("declension", 1, "a"): "mf",
+    ("declension", 2, "us"): "mf",
+    ("declension", 2, "um"): "n",
+    ("declension", 4, "us"): "mf",
+    ("declension", 4, "u"): "n",
+    ("declension", 5, "es"): "mf",
+}
+
+# a trusted rule still leaves every SAMPLE_EVERY-th lemma to be fetched,
+# and so scored against the pages
+SAMPLE_EVERY = 10
+
+MIN_SAMPLES = 5
+MIN_AGREEMENT = 0.95
+MAX_MISSES = 20
+
+SINGLE_WORD = re.compile(r"^[^\W\d_]+$")
+WORD = re.compile(r"\w+")
+
+ORDINALS = {
+    "1st": 1, "first": 1, "i": 1,
+    "2nd": 2, "second": 2, "ii": 2,
+    "3rd": 3, "third": 3, "iii": 3,
+    "4th": 4, "fourth": 4, "iv": 4,
+    "5th": 5, "fifth": 5, "v": 5,
+}
+
+# nominal endings that only one regular declension has
+DECLENSION_OF = { "a": 1, "um": 2 }
+
+def simple(labels, endings):
+    """
+        One cell per label, stem + ending, or stem + each ending of a
+        tuple for the cells with variant forms
+    """
+    return tuple((label, "", e if isinstance(e, tuple) else (e, ), "") for label, e in zip(labels, endings))
+
+def compound(labels, extra, endings, suffixes):
+    """
+        One cell per label, stem + `extra` + each of `endings`, followed
+        by the auxiliary of the label (amat-us, a, um sum)
+    """
+    return tuple((label, extra, tuple(endings), s) for label, s in zip(labels, suffixes))
+
+def invariable(extra, *endings, suffix=""):
+    return ((INVARIABLE, extra, endings, suffix), )
+
+def declension(singular, plural):
+    # as the pages lay nouns out: a banner per number, the cases under it
+    return (("inflection", (
+        ("Singular", (("DEFAULT", simple(CASES, singular)), )),
+        ("Plural", (("DEFAULT", simple(CASES, plural)), )),
+    )), )
+
+def adjective(masculine, feminine, neuter):
+    # (singular, plural) endings of each gender, the genders under a
+    # banner per number as for nouns
+    genders = (("Masculine", masculine), ("Feminine", feminine), ("Neuter", neuter))
+    return (("inflection", tuple(
+        (title, tuple((g, simple(CASES, endings[n])) for g, endings in genders))
+        for n, title in enumerate(["Singular", "Plural"])
+    )), )
+
+def perfect_passive(auxiliaries):
+    return compound(PERSONS[:3], "at", ("us", "a", "um"), auxiliaries[:3]) + \
+           compound(PERSONS[3:], "at", ("i", "ae", "a"), auxiliaries[3:])
+
+FIRST_CONJUGATION = (
+    ("active", (
+        ("Indicative", (
+            ("Present", simple(PERSONS, ["o", "as", "at", "amus", "atis", "ant"])),
+            ("Imperfect", simple(PERSONS, ["abam", "abas", "abat", "abamus", "abatis", "abant"])),
+            ("Future", simple(PERSONS, ["abo", "abis", "abit", "abimus", "abitis", "abunt"])),
+            ("Perfect", simple(PERSONS, ["avi", "avisti", "avit", "avimus", "avistis", ("averunt", "avere")])),
+            ("Pluperfect", simple(PERSONS, ["averam", "averas", "averat", "averamus", "averatis", "averant"])),
+            ("Future perfect", simple(PERSONS, ["avero", "averis", "averit", "averimus", "averitis", "averint"])),
+        )),
+        ("Subjunctive", (
+            ("Present", simple(PERSONS, ["em", "es", "et", "emus", "etis", "ent"])),
+            ("Imperfect", simple(PERSONS, ["arem", "ares", "aret", "aremus", "aretis", "arent"])),
+            ("Perfect", simple(PERSONS, ["averim", "averis", "averit", "averimus", "averitis", "averint"])),
+            ("Pluperfect", simple(PERSONS, ["avissem", "avisses", "avisset", "avissemus", "avissetis", "avissent"])),
+        )),
+        ("Imperative", (
+            ("Present", simple(PERSONS[1::3], ["a", "ate"])),
+            ("Future", simple(PERSONS[1:3] + PERSONS[4:], ["ato", "ato", "atote", "anto"])),
+        )),
+        ("Infinitive", (
+            ("Present", invariable("", "are")),
+            ("Perfect", invariable("", "avisse")),
+            ("Future", invariable("at", "urum", "uram", "urum", suffix="esse")),
+        )),
+        ("Participle", (
+            ("Present", invariable("", "ans")),
+            ("Future", invariable("at", "urus", "ura", "urum")),
+        )),
+        ("Gerund", (
+            ("DEFAULT", simple(CASES[1:4] + CASES[5:], ["andi", "ando", "andum", "ando"])),
+        )),
+        ("Supine", (
+            ("DEFAULT", simple(CASES[3::2], ["atum", "atu"])),
+        )),
+    )),
+    ("passive", (
+        ("Indicative", (
+            ("Present", simple(PERSONS, ["or", "aris", "atur", "amur", "amini", "antur"])),
+            ("Imperfect", simple(PERSONS, ["abar", "abaris", "abatur", "abamur", "abamini", "abantur"])),
+            ("Future", simple(PERSONS, ["abor", "aberis", "abitur", "abimur", "abimini", "abuntur"])),
+            ("Perfect", perfect_passive(["sum", "es", "est", "sumus", "estis", "sunt"])),
+            ("Pluperfect", perfect_passive(["eram", "eras", "erat", "eramus", "eratis", "erant"])),
+            ("Future perfect", perfect_passive(["ero", "eris", "erit", "erimus", "eritis", "erunt"])),
+        )),
+        ("Subjunctive", (
+            ("Present", simple(PERSONS, ["er", "eris", "etur", "emur", "emini", "entur"])),
+            ("Imperfect", simple(PERSONS, ["arer", "areris", "aretur", "aremur", "aremini", "arentur"])),
+            ("Perfect", perfect_passive(["sim", "sis", "sit", "simus", "sitis", "sint"])),
+            ("Pluperfect", perfect_passive(["essem", "esses", "esset", "essemus", "essetis", "essent"])),
+        )),
+        ("Imperative", (
+            ("Present", simple(PERSONS[1::3], ["are", "amini"])),
+            ("Future", simple(PERSONS[1:3] + PERSONS[5:], ["ator", "ator", "antor"])),
+        )),
+        ("Infinitive", (
+            ("Present", invariable("", "ari")),
+            ("Perfect", invariable("at", "um", "am", "um", suffix="esse")),
+            ("Future", invariable("", "atum", suffix="iri")),
+        )),
+        ("Participle", (
+            ("Perfect", invariable("at", "us", "a", "um")),
+            ("Gerundive", invariable("and", "us", "a", "um")),
+        )),
+    )),
+)
+
+# (kind, number, lemma ending): tables of the stem
+RULES = {
+    ("declension", 1, "a"): declension(
+        ["a", "ae", "ae", "am", "a", "a"], ["ae", "arum", "is", "as", "ae", "is"]),
+    ("declension", 2, "us"): declension(
+        ["us", "i", "o", "um", "e", "o"], ["i", "orum", "is", "os", "i", "is"]),
+    ("declension", 2, "um"): declension(
+        ["um", "i", "o", "um", "um", "o"], ["a", "orum", "is", "a", "a", "is"]),
+    ("declension", 4, "us"): declension(
+        ["us", "us", "ui", "um", "us", "u"], ["us", "uum", "ibus", "us", "us", "ibus"]),
+    ("declension", 4, "u"): declension(
+        ["u", "us", "u", "u", "u", "u"], ["ua", "uum", "ibus", "ua", "ua", "ibus"]),
+    ("declension", 5, "es"): declension(
+        ["es", "ei", "ei", "em", "es", "e"], ["es", "erum", "ebus", "es", "es", "ebus"]),
+    ("adjective", 1, "us"): adjective(
+        (["us", "i", "o", "um", "e", "o"], ["i", "orum", "is", "os", "i", "is"]),
+        (["a", "ae", "ae", "am", "a", "a"], ["ae", "arum", "is", "as", "ae", "is"]),
+        (["um", "i", "o", "um", "um", "o"], ["a", "orum", "is", "a", "a", "is"])),
+    ("conjugation", 1, "o"): FIRST_CONJUGATION,
+}
+
+class GeneratedCell:
+    def __init__(self, type, forms):
+        self.type = type
+        self.forms = forms
+
+class GeneratedPlane:
+    def __init__(self, groups):
+        self.groups = groups
+
+class GeneratedTable(CellLookup):
+    """
+        A FlexionTable built from a paradigm rather than parsed
+    """
+    def __init__(self, planes):
+        self.planes = planes
+
+    @staticmethod
+    def from_plain(plain):
+        return GeneratedTable({
+            title: GeneratedPlane({
+                gtitle: [GeneratedCell(t, list(forms)) for t, forms in cells]
+                for gtitle, cells in groups
+            }) for title, groups in plain
+        })
+
+    def pretty_print(self, level):
+        ids = " " * (4 * level)
+        arr = []
+        for title, plane in self.planes.items():
+            if title:
+                arr.append(f"{ids}{title}")
+            for gtitle, cells in plane.groups.items():
+                arr.append(f"{ids}    {gtitle}")
+                for c in cells:
+                    arr.append(f"{ids}         [{c.type}] " +
+                               ", ".join([f"{a}-{b} {s}" for a, b, s in c.forms]))
+        return arr
+
+def plain_flexions(flexions):
+    """
+        Conjugation tables as nested tuples, comparable and picklable
+    """
+    return tuple(
+        (voice, None if table is None else tuple(
+            (title, tuple(
+                (gtitle, tuple((c.type, tuple(c.forms)) for c in cells))
+                for gtitle, cells in plane.groups.items()
+            )) for title, plane in table.planes.items()
+        )) for voice, table in flexions.items()
+    )
+
+def rule_label(key):
+    kind, number, ending = key
+    return f"{kind} {number} -{ending}"
+
+def spelled(word):
+    # u/v and i/j are the same letters to the lists above
+    return word.replace("j", "i").replace("v", "u")
+
+def compound_of(word, bases):
+    """
+        True if `word` is one of `bases` or a prefixed compound of one
+    """
+    word = spelled(word)
+    for base in bases:
+        base = spelled(base)
+        if word == base or (word.endswith(base) and word[:-len(base)] in PREFIXES):
+            return True
+    return False
+
+def classify(lemma, gramma):
+    """
+        (rule key, stem) of a lemma, or None when no rule applies to it
+    """
+    folded = fold(lemma).lower()
+    if not SINGLE_WORD.match(folded) or len(folded) != len(lemma):
+        return None
+    if spelled(folded) in map(spelled, IRREGULAR):
+        return None
+
+    words = WORD.findall(fold(gramma).lower())
+    number = next((ORDINALS[w] for w in words if w in ORDINALS), None)
+    if any(w.startswith("conj") for w in words):
+        kind = "conjugation"
+        if compound_of(folded, COMPOUNDED):
+            return None
+    elif any(w.startswith("decl") for w in words) or "noun" in words:
+        kind = "declension"
+        # plural only nouns (arma, castra) have no singular to derive
+        if "plural" in words or "pl" in words:
+            return None
+    elif any(w.startswith("adj") for w in words):
+        # of the 1st and 2nd declension (bonus, a, um) unless stated otherwise
+        kind = "adjective"
+        number = number or 1
+    else:
+        return None
+
+    genders = set(GENDER_WORDS[w] for w in words if w in GENDER_WORDS)
+    for key in RULES:
+        k, n, ending = key
+        if k != kind or not folded.endswith(ending) or len(folded) <= len(ending):
+            continue
+        if genders - set(RULE_GENDERS.get(key, "mfn")):
+            continue
+        if n == number or (number is None and kind == "declension" and DECLENSION_OF.get(ending) == n):
+            return key, folded[:-len(ending)]
+    return None
+
+def apply_rule(rule, stem):
+    """
+        Plain tables of a rule for `stem`, in plain_flexions() layout
+    """
+    return tuple(
+        (voice, tuple(
+            (title, tuple(
+                (gtitle, tuple(
+                    (label, tuple((stem + extra, e, suffix) for e in endings))
+                    for label, extra, endings, suffix in cells
+                )) for gtitle, cells in groups
+            )) for title, groups in planes
+        )) for voice, planes in rule
+    )
+
+# the words that tell the cells of a noun or adjective table apart,
+# wherever the page puts them: plane, group or cell label
+NOMINAL_WORDS = frozenset(["sg", "pl", "nom", "gen", "dat", "acc", "voc", "abl", "masc", "fem", "neut"])
+
+def nominal_key(*labels):
+    words = " ".join(canonical(l) for l in labels).split()
+    return " ".join(sorted(set(w for w in words if w in NOMINAL_WORDS)))
+
+def cell_forms(plain):
+    """
+        {(voice, plane, group, cell, n): forms} of plain tables, labels
+        canonical and forms written out, so that tables compare whatever
+        the wording of their titles or the split of stem and ending.
+        Nominal tables (voice "inflection") are keyed by number, case
+        and gender alone, whatever their layout.
+    """
+    out, seen = {}, {}
+    for voice, table in plain:
+        v = canonical(voice)
+        if table is None:
+            out[(v, )] = None
+            continue
+        for title, groups in table:
+            for gtitle, cells in groups:
+                for t, forms in cells:
+                    if v == "inflection":
+                        key = (v, "", "", nominal_key(title, gtitle, t))
+                    else:
+                        key = (v, canonical(title), canonical(gtitle), canonical(t))
+                    n = seen[key] = seen.get(key, -1) + 1
+                    out[key + (n, )] = tuple(sorted(
+                        normalize_key(f"{stem}{ending} {suffix}") for stem, ending, suffix in forms
+                    ))
+    return out
+
+def diff_flexions(expected, got, limit=None):
+    """
+        Differences between two plain_flexions() results, as lines
+    """
+    if got is None:
+        return ["  no rule applies"]
+
+    e, g = cell_forms(expected), cell_forms(got)
+    lines = []
+    for k in list(e) + [k for k in g if k not in e]:
+        if e.get(k) != g.get(k):
+            where = " / ".join(str(x) for x in k[:4] if x)
+            lines.append(f"  {where}: expected {e.get(k)}, generated {g.get(k)}")
+    return lines[:limit] if limit is not None else lines
+
+class ParadigmClass:
+    """
+        How well a rule did against the tables fetched for its lemmas
+    """
+    # scores kept before generated lemmas were counted
+    served = 0
+
+    def __init__(self):
+        self.tried = 0
+        self.agreed = 0
+        self.misses = []
+        self.served = 0
+
+    def agreement(self):
+        return self.agreed / self.tried if self.tried else 0.0
+
+    def trusted(self):
+        return self.tried >= MIN_SAMPLES and self.agreement() >= MIN_AGREEMENT
+
+class Paradigms:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "paradigms.pickle")
+        self.enabled = True
+        self.__classes = None
+        self.__dirty = False
+        self.__lock = Lock()
+
+    def __load(self):
+        if self.__classes is not None:
+            return self.__classes
+
+        try:
+            with open(self.path, 'rb') as f:
+                classes = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            classes = {}
+        # scores of rules since dropped, or of the replayed tables of old
+        self.__classes = { k: v for k, v in classes.items() if k in RULES }
+        return self.__classes
+
+    def classes(self):
+        return self.__load()
+
+    def predict(self, lemma, gramma):
+        """
+            Plain tables for `lemma` whatever the score of its rule,
+            None if no rule applies
+        """
+        c = classify(lemma, gramma)
+        if c is None:
+            return None
+        key, stem = c
+        return apply_rule(RULES[key], stem)
+
+    def generate(self, meaning):
+        """
+            FlexionTable-compatible tables keyed by voice, when the rule
+            of the lemma is trusted, otherwise None. Every SAMPLE_EVERY-th
+            lemma of a rule is left to be fetched all the same.
+        """
+        if not self.enabled:
+            return None
+        c = classify(meaning.lemma, meaning.gramma)
+        if c is None:
+            return None
+        key, stem = c
+        cls = self.__load().get(key)
+        if cls is None or not cls.trusted():
+            return None
+
+        # a sample is fetched instead, observe() keeps scoring the rule
+        with self.__lock:
+            cls.served += 1
+            self.__dirty = True
+            if cls.served % SAMPLE_EVERY == 0:
+                return None
+
+        return {
+            voice: GeneratedTable.from_plain(table)
+            for voice, table in apply_rule(RULES[key], stem)
+        }
+
+    def observe(self, entry):
+        """
+            Score the rule of a fetched entry against its recorded
+            tables, returns the diff lines of a wrong prediction
+        """
+        m = entry.meaning
+        flexions = entry.flexions()
+        if not m or all(t is None for t in flexions.values()):
+            return None
+
+        c = classify(m.lemma, m.gramma)
+        if c is None:
+            return None
+        key, stem = c
+        recorded = plain_flexions(flexions)
+        got = apply_rule(RULES[key], stem)
+        agreed = cell_forms(got) == cell_forms(recorded)
+
+        with self.__lock:
+            cls = self.__load().setdefault(key, ParadigmClass())
+            self.__dirty = True
+            cls.tried += 1
+            if agreed:
+                cls.agreed += 1
+                return None
+            cls.misses = (cls.misses + [m.lemma])[-MAX_MISSES:]
+
+        return diff_flexions(recorded, got)
+
+    def dump(self):
+        # plain lists, fit for json
+        with self.__lock:
+            return [
+                [list(key), { "tried": c.tried, "agreed": c.agreed, "misses": list(c.misses) }]
+                for key, c in self.__load().items()
+            ]
+
+    def merge(self, scores):
+        # scores kept elsewhere, see dump(), those already known here are kept
+        with self.__lock:
+            own = self.__load()
+            for key, score in scores:
+                key = tuple(key)
+                if key not in RULES or key in own:
+                    continue
+                cls = own[key] = ParadigmClass()
+                cls.tried, cls.agreed, cls.misses = score["tried"], score["agreed"], score["misses"]
+                self.__dirty = True
+
+    def reset(self):
+        with self.__lock:
+            self.__classes = {}
+            self.__dirty = True
+
+    def save(self):
+        with self.__lock:
+            if not self.__dirty:
+                return
+            atomic_write(self.path, pickle.dumps(self.__classes))
+            self.__dirty = False
+
+def validate(entries, show_diffs=0):
+    """
+        Score the rules against the tables of `entries` from scratch
+        and report the agreement of every rule
+    """
+    model = Paradigms(path=os.devnull)
+    diffs = []
+    for ent in entries:
+        lines = model.observe(ent)
+        if lines and len(diffs) < show_diffs:
+            diffs.append((ent.meaning.lemma, lines))
+
+    for lemma, lines in diffs:
+        print(f"{lemma}:")
+        print("\n".join(lines[:10]))
+        print()
+
+    rows = sorted(model.classes().items(), key=lambda kv: -kv[1].tried)
+    print(f"  {'rule':<48} {'samples':>8} {'agreement':>10}  trusted")
+    for key, cls in rows:
+        label = rule_label(key)
+        print(f"  {label[:48]:<48} {cls.tried:>8} {cls.agreement():>10.1%}  "
+              f"{'yes' if cls.trusted() else 'no'}")
+    return model
+
+if __name__ == "__main__":
+    from core import default_core
+
+    parser = argparse.ArgumentParser(description="Local paradigm generator")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    v = sub.add_parser("validate", help="diff generated paradigms against the cached entries")
+    v.add_argument("-d", "--diffs", type=int, default=5, help="wrong predictions to show")
+    sub.add_parser("learn", help="score the rules again against the cached entries")
+    args = parser.parse_args()
+
+    core = default_core()
+    paradigms = core.paradigms
+    if args.cmd == "validate":
+        validate(core.entries.entries(), args.diffs)
+    else:
+        paradigms.reset()
+        for ent in core.entries.entries():
+            paradigms.observe(ent)
+        paradigms.save()
+        trusted = sum(c.trusted() for c in paradigms.classes().values())
+        print(f"{len(paradigms.classes())} of {len(RULES)} rules scored, {trusted} trusted")
@@ -5,15 +5,19 @@ import traceback
 import textwrap
 import itertools
 
+from functools import partial
 from threading import Lock, Thread
-from time import sleep
+from time import sleep, monotonic
 from xdict import LatinDictEntry, ReverseDict, EntryNotFoundException
-from view import Formatter, render_entry, render_reverse, it, bold, render_explaination
+from view import Formatter, render_entry, render_reverse, iter_render_reverse, it, bold, render_explaination, ExplainStreamPrinter
 from utils import remove_accents
-from explainer import explainer
+from normalize import normalize_key
+from cells import find_cells, format_forms
+from core import default_core
+from deadline import Deadline, LookupCancelled, DEFAULT_BUDGETS, DEFAULT_TOTAL
 
 def get_history_key(key):
-    d = hashlib.sha256(str.encode(key)).hexdigest()
+    d = hashlib.sha256(str.encode(normalize_key(key))).hexdigest()
     return d[:6]
 
 class AsyncProgressDisplayer:
@@ -21,6 +25,9 @@ class AsyncProgressDisplayer:
         self.__spinner = ['-', '\\', '|', '/']
         self.__inhibit = Lock()
         self.__inhibit.acquire()
+        self.__waiting = False
+        self.__stage = None
+        self.__stage_start = None
 
         self.__th = Thread(target=self.__do_printing)
         self.__th.start()
@@ -33,16 +40,30 @@ class AsyncProgressDisplayer:
             if self.__should_stop:
                 return
             
-            print("loading...", self.__spinner[i], end='\r')
+            stage = self.__stage
+            if stage:
+                stage = f" [{stage} {monotonic() - self.__stage_start:.1f}s]"
+            print(f"\x1b[2Kloading{stage or ''}...", self.__spinner[i], end='\r')
             i = (i + 1) % 4
             self.__inhibit.release()
-            sleep(1)
+            sleep(0.25)
+
+    def set_stage(self, stage):
+        self.__stage_start = monotonic()
+        self.__stage = stage
 
     def start_wait(self):
+        if self.__waiting:
+            return
+        self.__waiting = True
         self.__inhibit.release()
 
     def end_wait(self):
+        if not self.__waiting:
+            return
         self.__inhibit.acquire(blocking=True)
+        self.__waiting = False
+        print("\x1b[2K", end='\r')
 
     def stop(self):
         self.__should_stop = True
@@ -52,11 +73,16 @@ class AsyncProgressDisplayer:
 
 CMD = re.compile(r"^@(?P<cmd>[A-Za-z0-9]+)\s*(?P<arg>.*)?$")
 class InteractiveQuery:
-    def __init__(self):
+    def __init__(self, core=None):
+        self.__core = core or default_core()
         self.__history = {}
         self.__hist_max = 500
+        # lookups finish in their own thread
+        self.__hist_lock = Lock()
 
         self.__wait_indicator = AsyncProgressDisplayer()
+        self.__budgets = dict(DEFAULT_BUDGETS)
+        self.__total_budget = DEFAULT_TOTAL
 
         self.__mode = "latin"
         self.__should_quit = False
@@ -69,15 +95,19 @@ class InteractiveQuery:
             "e":     self.__cmd_eng,
             "quit":  self.__cmd_quit,
             "hist":  self.__cmd_hist,
+            "export": self.__cmd_export,
+            "stats": self.__cmd_stats,
+            "mem":   self.__cmd_mem,
+            "cell":  self.__cmd_cell,
             "gpt":   self.__cmd_switch_gpt,
+            "stream": self.__cmd_switch_stream,
+            "backend": self.__cmd_backend,
+            "budget": self.__cmd_budget,
+            "reindex": self.__cmd_reindex,
             "h":     self.__cmd_help
         }
 
     def __add_history(self, query, ent):
-        if len(self.__history) >= self.__hist_max:
-            key = next(self.__history.keys())
-            del self.__history[key]
-    
         hist_type = "latin"
         key = query
         if isinstance(ent, LatinDictEntry):
@@ -87,25 +117,59 @@ class InteractiveQuery:
             hist_type = "eng"
 
         _k = get_history_key(f"{hist_type}_{key}")
-        self.__history[_k] = ((hist_type, query, ent))
+        with self.__hist_lock:
+            if len(self.__history) >= self.__hist_max:
+                del self.__history[next(iter(self.__history))]
+            self.__history[_k] = ((hist_type, query, ent))
 
     def __find_histroy(self, mode, key):
         _k = get_history_key(f"{mode}_{key}")
-        if _k in self.__history:
-            return self.__history[_k]
-        return None
+        with self.__hist_lock:
+            return self.__history.get(_k)
     
     def __get_entry(self, entry_class, *args):
+        # the lookup runs aside so that Ctrl-C only cancels it, a second
+        # Ctrl-C gives up waiting for the stage in progress
+        deadline = Deadline(self.__total_budget, self.__budgets, self.__wait_indicator.set_stage)
+        result = {}
+
+        def run():
+            try:
+                result["ent"] = entry_class(*args, deadline=deadline)
+            except BaseException as e:
+                result["err"] = e
+
+        th = Thread(target=run, daemon=True)
         self.__wait_indicator.start_wait()
         try:
-            ent = entry_class(*args)
-            self.__wait_indicator.end_wait()
-        except Exception as e:
+            th.start()
+            while th.is_alive():
+                try:
+                    th.join(0.1)
+                except KeyboardInterrupt:
+                    if deadline.cancelled():
+                        break
+                    deadline.cancel()
+        finally:
             self.__wait_indicator.end_wait()
-            raise e
 
-        return ent
+        if th.is_alive():
+            raise LookupCancelled("lookup abandoned")
+        if "err" in result:
+            raise result["err"]
+        return result["ent"]
     
+    def __print_suggestions(self, word, title):
+        suggestions = self.__core.suggester.suggest(word)
+        if not suggestions:
+            return
+
+        print(f" {title}:")
+        for form, _, lemmas in suggestions:
+            lemma_strs = [f"{l}{v} ({g})" if g else f"{l}{v}" for l, v, g in lemmas]
+            print(f"   {form:<16} {', '.join(lemma_strs)}")
+        print()
+
     def select_ambiguis(self, ent):
         choices = ent.similars()
         print(" Queried lexeme return the following possible lemmas:\n")
@@ -128,21 +192,76 @@ class InteractiveQuery:
             except:
                 pass
         
-        return self.__get_entry(LatinDictEntry, selected.lctx)
+        return self.__get_entry(self.__core.lookup, selected.lctx.word, selected.lctx.variant)
 
     def __cmd_switch_gpt(self, arg):
         """
             [0|1]
             Enable or disable GPT-assists explaination
             Disable it will speed up look up speed significantly
-            Enabled by default if a valid apikey is given
+            Enabled by default if an apikey is given, otherwise
+            select a backend first (@backend local)
         """
-        en = arg == 'y'
-        explainer.set_enabled(en)
+        explainer = self.__core.explainer
+        explainer.set_enabled(arg == 'y')
+        en = explainer.enabled()
 
         print("Disabled" if not en else "Enabled", "GPT-assisted explaining")
 
 
+    def __cmd_budget(self, arg):
+        """
+            [stage=seconds ...]
+            Set the time budget of lookup stages (total, entry,
+            flexion, opposite, explanation), 0 for no limit.
+            Show the budgets if no parameter
+        """
+        for kv in arg.split():
+            stage, _, val = kv.partition('=')
+            try:
+                val = float(val)
+            except ValueError:
+                print(f"Invalid budget '{kv}'")
+                return
+            if stage == "total":
+                self.__total_budget = val
+            elif stage in self.__budgets:
+                self.__budgets[stage] = val
+            else:
+                print(f"Unknown stage '{stage}'")
+                return
+
+        print(f"  {'total':<12} {self.__total_budget:>5.1f}s")
+        for stage, val in self.__budgets.items():
+            print(f"  {stage:<12} {val:>5.1f}s")
+
+    def __cmd_backend(self, arg):
+        """
+            [Name]
+            Select the explaination backend (openai, local, ...)
+            List backends and their latency if no parameter
+        """
+        explainer = self.__core.explainer
+        if arg:
+            if arg not in explainer.backends:
+                print(f"Unknown backend '{arg}'")
+                return
+            explainer.select(arg)
+
+        for l in explainer.status():
+            print(f"  {l}")
+
+    def __cmd_switch_stream(self, arg):
+        """
+            [y|n]
+            Show GPT explainations while they are being generated
+            Enabled by default
+        """
+        en = arg == 'y'
+        self.__core.explainer.set_streaming(en)
+
+        print("Disabled" if not en else "Enabled", "streamed explaining")
+
     def __cmd_latin(self, arg):
         """
             [Latin Word]
@@ -160,14 +279,25 @@ class InteractiveQuery:
 
             record = self.__find_histroy("latin", f"{word}{variant}")
             if not record:
-                ent = self.__get_entry(LatinDictEntry, word, variant)
+                if not self.__core.suggester.known(word):
+                    self.__print_suggestions(word, "Not a known form yet, close ones")
+
+                printer = ExplainStreamPrinter(on_start=self.__wait_indicator.end_wait)
+                try:
+                    ent = self.__get_entry(self.__core.lookup, word, variant, printer)
+                except EntryNotFoundException as e:
+                    print(str(e) or "Given word can not be found")
+                    self.__print_suggestions(word, "Did you mean")
+                    return
+                printer.finish()
 
                 if ent.require_clarify:
                     ent = self.select_ambiguis(ent)
                     if not ent:
                         return
 
-                self.__add_history(word, ent)
+                if not ent.is_partial():
+                    self.__add_history(word, ent)
 
             else:
                 _, _, ent = record
@@ -181,29 +311,67 @@ class InteractiveQuery:
 
     def __cmd_eng(self, arg):
         """
-            [English Word]
+            [English Word][!][,N]
             Query possible Latins matched with given English
+            Matches are shown as soon as they are parsed,
+            optionally stop after the first N matches
+            Known meanings are answered offline, '!' forces
+            the online dictionary
             Switch to english query mode if no parameter
         """
         if not arg:
             self.__mode = "eng"
             return
         
-        if not isinstance(arg, LatinDictEntry):
+        if isinstance(arg, ReverseDict):
+            ent = arg
+        else:
             record = self.__find_histroy("eng", arg)
-            if not record:
-                ent = self.__get_entry(ReverseDict, arg)
-                self.__add_history(arg, ent)
-            else:
+            if record:
                 _, _, ent = record
-        else:
-            ent = arg
+            else:
+                self.__stream_eng(arg)
+                return
 
         formatter = Formatter(int(self.columns), 2, 0, [])
         render_reverse(ent, formatter)
 
         pydoc.pager("\n".join(formatter.get_output()))
 
+    def __stream_eng(self, arg):
+        parts = arg.split(',')
+        word = parts[0].strip()
+        limit = None
+        if len(parts) > 1 and parts[1].strip().isdigit():
+            limit = int(parts[1])
+
+        local = not word.endswith('!')
+        word = word.rstrip('!').strip()
+        ent = self.__get_entry(partial(self.__core.reverse, local=local), word, limit)
+        if ent.local:
+            print(" Matches from the meanings parsed so far, append '!' to ask the online dictionary\n")
+
+        formatter = Formatter(int(self.columns), 2, 0, [])
+        rendering = iter_render_reverse(ent, formatter)
+        while True:
+            self.__wait_indicator.start_wait()
+            try:
+                more = next(rendering, None) is not None
+            except KeyboardInterrupt:
+                print("\nLookup cancelled, showing the matches parsed so far")
+                return
+            finally:
+                self.__wait_indicator.end_wait()
+
+            lines = formatter.flush()
+            if lines:
+                print("\n".join(lines))
+            if not more:
+                break
+
+        if not ent.is_partial():
+            self.__add_history(arg, ent)
+
     def __cmd_hist(self, arg):
         """
             [ID]
@@ -212,7 +380,9 @@ class InteractiveQuery:
         """
         if not arg:
             lines = []
-            for k, (type_, query, _) in self.__history.items():
+            with self.__hist_lock:
+                items = list(self.__history.items())
+            for k, (type_, query, _) in items:
                 lines.append(f"{k}. {it(type_)}. {bold(query)}")
 
             pydoc.pager("\n".join(lines))
@@ -221,6 +391,118 @@ class InteractiveQuery:
         type_, query, ent = self.__history[arg]
         self.__cmd_table[type_](ent)
         
+    def __cmd_export(self, arg):
+        """
+            [Path]
+            Export the paradigms of all latin words in history
+            as columnar arrays (.npz, or .parquet if pyarrow exists)
+        """
+        from columnar import ParadigmColumns
+
+        path = arg.strip() or "paradigms.npz"
+        with self.__hist_lock:
+            entries = [ent for type_, _, ent in self.__history.values() if type_ == "latin"]
+        cols = ParadigmColumns.from_entries(entries)
+        path = cols.save(path)
+
+        print(f"Exported {len(cols)} forms of {len(entries)} lemmas to {path}")
+
+    def __cmd_cell(self, arg):
+        """
+            [Latin Word][,Latin Word...] [Cell]
+            Print only the matching cells, e.g. 'amo perfect
+            indicative 3rd plural', of one or more words
+        """
+        words, _, query = (arg or "").strip().partition(' ')
+        if not words or not query.strip():
+            print("Usage: @cell word[,word...] cell description")
+            return
+
+        for word in [w.strip() for w in words.split(',') if w.strip()]:
+            ent = self.__get_entry(self.__core.lookup, word)
+            if ent.require_clarify:
+                ent = self.select_ambiguis(ent)
+                if not ent:
+                    continue
+            if not ent.is_partial():
+                self.__add_history(word, ent)
+
+            found = find_cells(ent.flexions(), query)
+            print(bold(ent.meaning.lemma if ent.meaning else word))
+            if not found:
+                print("   no such cell")
+            for (voice, plane, group, cell), c in found:
+                where = " / ".join(x for x in (voice, plane, group, cell) if x)
+                print(f"   {where:<50} {format_forms(c.forms)}")
+            print()
+
+    def __cmd_stats(self, arg):
+        """
+            No Parameter
+            Show page cache hits, revalidation hit ratio and bytes saved
+        """
+        for l in self.__core.stats.summary():
+            print(f"  {l}")
+
+    def __cmd_mem(self, arg):
+        """
+            [trace Latin Word]
+            Show the memory held by the caches and the history, the
+            largest cached entries and any parse tree still referenced;
+            with 'trace', the allocations made by looking up a word
+        """
+        import memory
+
+        cmd, _, word = (arg or "").strip().partition(' ')
+        if cmd == "trace":
+            if not word.strip():
+                print("Usage: @mem trace word")
+                return
+            _, tr = memory.trace(self.__get_entry, self.__core.lookup, word.strip())
+            print(f"  retained {memory.format_size(tr.retained())}, peak {memory.format_size(tr.peak)}")
+            for st in tr.top(10):
+                frame = st.traceback[0]
+                where = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                print(f"  {where:<40} {memory.format_size(st.size_diff):>12} {st.count_diff:>8} blocks")
+            return
+
+        core = self.__core
+        with self.__hist_lock:
+            history = list(self.__history.items())
+
+        sizes = memory.cache_sizes(core, [("history", [ent for _, (_, _, ent) in history])])
+        for name, size in sizes:
+            print(f"  {name:<40} {memory.format_size(size):>12}")
+        print(f"  {'total':<40} {memory.format_size(sum(s for _, s in sizes)):>12}")
+
+        cached = core.entries.cached()
+        if cached:
+            print(f"\n  largest of {len(cached)} entries in memory")
+            for key, size in memory.largest_entries(cached, 5):
+                print(f"  {key:<40} {memory.format_size(size):>12}")
+
+        retained = [(k, memory.retained_trees(ent, 1)) for k, (_, _, ent) in history]
+        retained = [(k, r[0]) for k, r in retained if r]
+        print(f"\n  {len(retained)} history entries hold a parse tree")
+        for k, (path, t) in retained[:5]:
+            print(f"  {k}. {t} at {path}")
+
+    def __cmd_reindex(self, arg):
+        """
+            No Parameter
+            Rebuild the form and meaning indexes from every cached entry
+        """
+        core = self.__core
+        n = 0
+        for ent in core.entries.entries():
+            core.forms.add_entry(ent)
+            core.meanings.add_entry(ent)
+            n += 1
+        core.forms.save()
+        core.meanings.save()
+
+        print(f"Indexed {n} entries, {len(core.forms)} forms and {len(core.meanings)} meanings")
+
     def __cmd_quit(self, arg):
         """
             No Parameter
@@ -282,16 +564,22 @@ class InteractiveQuery:
         print("   Type the word you want to know and hit enter.")
         print("   Use '@h' for help message.")
         print()
+        if self.__core.explainer.notice:
+            print(self.__core.explainer.notice)
+            print()
 
         while not self.__should_quit:
             try:
                 self.handle()
             except EntryNotFoundException as e:
-                print("Given word can not be found")
+                print(str(e) or "Given word can not be found")
+            except LookupCancelled as e:
+                print(f"\n{str(e) or 'Lookup cancelled'}")
             except KeyboardInterrupt as e:
                 break
             except Exception:
                 print(traceback.format_exc())
 
         print("\nVale")
+        self.__core.save()
         self.__wait_indicator.stop()
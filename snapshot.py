@@ -0,0 +1,444 @@
+import os, sys, mmap, struct
+from array import array
+
+from normalize import normalize_key
+from cells import CellLookup
+from cache import CACHE_DIR
+
+# Read-only dictionary snapshot, meant to be mmap'ed by many processes at
+# once: every record is a run of u32 words pointing into a shared string
+# table, so nothing is unpickled and untouched pages are never loaded.
+#
+#   header    magic, version, byte order, section table (offset, size)
+#   strings   u32 offsets[n + 1] + utf-8 data, id 0 is ""
+#   entries   u32 offsets[m + 1] + u32 words (see encode_entry)
+#   keys      sorted u32 string ids of "lemma#variant" keys + u32 entry ids
+#   forms     sorted u32 string ids of normalized forms + u32 ptr[f + 1]
+#             into u32 entry ids
+
+MAGIC = b"PLTLSNAP"
+VERSION = 1
+SECTIONS = [
+    "str_offsets", "str_data",
+    "entry_offsets", "entry_data",
+    "key_sids", "key_entries",
+    "form_sids", "form_ptr", "form_entries",
+]
+HEADER = struct.Struct("<8sII")
+SECTION = struct.Struct("<QQ")
+ALIGN = 8
+
+# where bundle.py puts imported entries, see open_default()
+DEFAULT_PATH = os.path.join(CACHE_DIR, "entries.snap")
+
+class StringTable:
+    def __init__(self):
+        self.ids = { "": 0 }
+        self.strings = [""]
+
+    def add(self, s):
+        s = s or ""
+        sid = self.ids.get(s)
+        if sid is None:
+            sid = len(self.strings)
+            self.ids[s] = sid
+            self.strings.append(s)
+        return sid
+
+def encode_entry(ent, strings):
+    """
+        [lemma, variant, gramma, require_clarify,
+         n, meaning * n,
+         n, (word, variant, property, explain) * n,
+         has_explain, (expression, grammar, semantic, nuances) if has_explain,
+         n_voices, (voice, has_table, n_planes,
+            (title, n_groups, (title, n_cells, (type, n_forms, (stem, ending, suffix) * n_forms) * n_cells) * n_groups
+         ) * n_planes) * n_voices]
+    """
+    s = strings.add
+    m = ent.meaning
+    words = [
+        s(m.lemma if m else ""), s(ent.variant()), s(m.gramma if m else ""),
+        int(bool(ent.require_clarify)),
+    ]
+
+    meanings = m.meanings if m else []
+    words.append(len(meanings))
+    words += [s(x) for x in meanings]
+
+    cands = ent.similars()
+    words.append(len(cands))
+    for a in cands:
+        words += [s(a.word), s(a.lctx.variant), s(a.property), s(a.explain)]
+
+    e = ent.explaination()
+    words.append(int(e is not None))
+    if e is not None:
+        words += [s(e.expression), s(e.explain_grammar), s(e.explain_semantic), s(e.explain_nuances)]
+
+    flexions = ent.flexions()
+    words.append(len(flexions))
+    for voice, table in flexions.items():
+        words += [s(voice), int(table is not None)]
+        if table is None:
+            continue
+        words.append(len(table.planes))
+        for title, plane in table.planes.items():
+            words += [s(title), len(plane.groups)]
+            for gtitle, cells in plane.groups.items():
+                words += [s(gtitle), len(cells)]
+                for cell in cells:
+                    words += [s(cell.type), len(cell.forms)]
+                    for stem, ending, suffix in cell.forms:
+                        words += [s(stem), s(ending), s(suffix)]
+    return words
+
+def encode_clarify(cands, strings):
+    """
+        Record of a lemma with several variants, read back like a
+        disambiguation page: no meaning, require_clarify and one
+        candidate per (lemma, variant, gramma, first meaning)
+    """
+    s = strings.add
+    words = [0, 0, 0, 1, 0, len(cands)]
+    for lemma, variant, gramma, explain in cands:
+        words += [s(lemma), s(variant), s(gramma), s(explain)]
+    return words + [0, 0]
+
+def entry_forms(ent):
+    m = ent.meaning
+    if not m:
+        return
+    yield m.lemma
+    for table in ent.flexions().values():
+        if table is None:
+            continue
+        for plane in table.planes.values():
+            for cells in plane.groups.values():
+                for cell in cells:
+                    for stem, ending, _ in cell.forms:
+                        yield f"{stem}{ending}"
+
+def build_snapshot(entries, path):
+    strings = StringTable()
+    entry_offsets = array('I', [0])
+    entry_data = array('I')
+    keys = {}
+    forms = {}
+    variants = {}
+
+    for eid, ent in enumerate(entries):
+        entry_data.extend(encode_entry(ent, strings))
+        entry_offsets.append(len(entry_data))
+
+        m = ent.meaning
+        if m:
+            lemma = normalize_key(m.lemma)
+            if keys.setdefault(f"{lemma}#{ent.variant()}", eid) == eid:
+                variants.setdefault(lemma, []).append(
+                    (eid, (m.lemma, ent.variant(), m.gramma, m.meanings[0] if m.meanings else "")))
+
+        for f in set(normalize_key(f) for f in entry_forms(ent)):
+            forms.setdefault(f, []).append(eid)
+
+    # a bare lemma is the entry itself only when it has a single variant,
+    # otherwise it asks which one is meant, as the site does
+    for lemma, found in variants.items():
+        if f"{lemma}#" in keys:
+            continue
+        if len(found) == 1:
+            keys[f"{lemma}#"] = found[0][0]
+            continue
+        keys[f"{lemma}#"] = len(entry_offsets) - 1
+        entry_data.extend(encode_clarify([c for _, c in found], strings))
+        entry_offsets.append(len(entry_data))
+
+    def sorted_ids(d):
+        items = sorted(d.items(), key=lambda kv: str.encode(kv[0]))
+        return array('I', [strings.add(k) for k, _ in items]), [v for _, v in items]
+
+    key_sids, key_entries = sorted_ids(keys)
+    key_entries = array('I', key_entries)
+
+    form_sids, form_lists = sorted_ids(forms)
+    form_ptr = array('I', [0])
+    form_entries = array('I')
+    for lst in form_lists:
+        form_entries.extend(lst)
+        form_ptr.append(len(form_entries))
+
+    str_offsets = array('I', [0])
+    str_data = bytearray()
+    for x in strings.strings:
+        str_data += str.encode(x)
+        str_offsets.append(len(str_data))
+
+    sections = {
+        "str_offsets": str_offsets.tobytes(), "str_data": bytes(str_data),
+        "entry_offsets": entry_offsets.tobytes(), "entry_data": entry_data.tobytes(),
+        "key_sids": key_sids.tobytes(), "key_entries": key_entries.tobytes(),
+        "form_sids": form_sids.tobytes(), "form_ptr": form_ptr.tobytes(),
+        "form_entries": form_entries.tobytes(),
+    }
+
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        pos = HEADER.size + SECTION.size * len(SECTIONS)
+        table = []
+        for name in SECTIONS:
+            pos += -pos % ALIGN
+            table.append((pos, len(sections[name])))
+            pos += len(sections[name])
+
+        f.write(HEADER.pack(MAGIC, VERSION, sys.byteorder == "little"))
+        for off, size in table:
+            f.write(SECTION.pack(off, size))
+        for name, (off, _) in zip(SECTIONS, table):
+            f.write(b"\0" * (off - f.tell()))
+            f.write(sections[name])
+    os.replace(tmp, path)
+
+    return len(entry_offsets) - 1
+
+class _Ctx:
+    def __init__(self, word, variant):
+        self.word = word
+        self.variant = variant
+
+class _Candidate:
+    def __init__(self, word, variant, property, explain):
+        self.word = word
+        self.lctx = _Ctx(word, variant)
+        self.property = property
+        self.explain = explain
+
+class _Meaning:
+    def __init__(self, lemma, gramma, meanings):
+        self.lemma = lemma
+        self.gramma = gramma
+        self.meanings = meanings
+
+class _Explained:
+    def __init__(self, expression, grammar, semantic, nuances):
+        self.expression = expression
+        self.explain_grammar = grammar
+        self.explain_semantic = semantic
+        self.explain_nuances = nuances
+
+class _Table(CellLookup):
+    def __init__(self):
+        self.planes = {}
+
+class _Plane:
+    def __init__(self):
+        self.groups = {}
+
+class _Cell:
+    def __init__(self, type, forms):
+        self.type = type
+        self.forms = forms
+
+class SnapshotEntry:
+    """
+        Read-only view of one entry, with the LatinDictEntry interface the
+        renderers use. Fields are decoded from the mapping on access.
+    """
+    def __init__(self, snap, eid):
+        self.__snap = snap
+        self.__eid = eid
+        self.__meaning = None
+
+    def __words(self):
+        return self.__snap.entry_words(self.__eid)
+
+    def __header(self):
+        w = self.__words()
+        st = self.__snap.string
+        i = 4
+        n = w[i]
+        meanings = [st(x) for x in w[i + 1:i + 1 + n]]
+        return w, i + 1 + n, meanings
+
+    @property
+    def meaning(self):
+        if self.__meaning is None:
+            w, _, meanings = self.__header()
+            if not w[0]:
+                return None
+            st = self.__snap.string
+            self.__meaning = _Meaning(st(w[0]), st(w[2]), meanings)
+        return self.__meaning
+
+    @property
+    def require_clarify(self):
+        return bool(self.__words()[3])
+
+    def __sections(self):
+        # offsets of candidates, explanation and flexion sections
+        w, i, _ = self.__header()
+        cands = i
+        i += 1 + 4 * w[i]
+        expl = i
+        i += 1 + (4 if w[i] else 0)
+        return w, cands, expl, i
+
+    def variant(self):
+        return self.__snap.string(self.__words()[1])
+
+    def similars(self):
+        w, i, _, _ = self.__sections()
+        st = self.__snap.string
+        return [
+            _Candidate(*[st(x) for x in w[i + 1 + 4 * k:i + 5 + 4 * k]]) for k in range(w[i])
+        ]
+
+    def explaination(self):
+        w, _, i, _ = self.__sections()
+        if not w[i]:
+            return None
+        st = self.__snap.string
+        return _Explained(*[st(x) for x in w[i + 1:i + 5]])
+
+    def flexions(self):
+        w, _, _, i = self.__sections()
+        st = self.__snap.string
+        conj = {}
+        n_voices = w[i]
+        i += 1
+        for _ in range(n_voices):
+            voice, has_table = st(w[i]), w[i + 1]
+            i += 2
+            if not has_table:
+                conj[voice] = None
+                continue
+            table = _Table()
+            n_planes = w[i]
+            i += 1
+            for _ in range(n_planes):
+                plane = _Plane()
+                title, n_groups = st(w[i]), w[i + 1]
+                i += 2
+                for _ in range(n_groups):
+                    gtitle, n_cells = st(w[i]), w[i + 1]
+                    i += 2
+                    cells = []
+                    for _ in range(n_cells):
+                        ctype, n_forms = st(w[i]), w[i + 1]
+                        i += 2
+                        forms = []
+                        for _ in range(n_forms):
+                            forms.append((st(w[i]), st(w[i + 1]), st(w[i + 2])))
+                            i += 3
+                        cells.append(_Cell(ctype, forms))
+                    plane.groups[gtitle] = cells
+                table.planes[title or None] = plane
+            conj[voice] = table
+        return conj
+
+    def sources(self):
+        return []
+
+    def missing(self):
+        return []
+
+    def is_partial(self):
+        return False
+
+    def is_generated(self):
+        return False
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        self.__f = open(path, 'rb')
+        self.__mm = mmap.mmap(self.__f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, little = HEADER.unpack_from(self.__mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} snapshot")
+        if bool(little) != (sys.byteorder == "little"):
+            raise ValueError(f"{path} was written with another byte order")
+
+        self.__mv = memoryview(self.__mm)
+        self.__sec = {}
+        for k, name in enumerate(SECTIONS):
+            off, size = SECTION.unpack_from(self.__mm, HEADER.size + SECTION.size * k)
+            view = self.__mv[off:off + size]
+            self.__sec[name] = view if name == "str_data" else view.cast('I')
+        self.__data_off = SECTION.unpack_from(self.__mm, HEADER.size + SECTION.size)[0]
+
+    def close(self):
+        for v in self.__sec.values():
+            v.release()
+        self.__mv.release()
+        self.__mm.close()
+        self.__f.close()
+
+    def __len__(self):
+        return len(self.__sec["entry_offsets"]) - 1
+
+    def string(self, sid):
+        o = self.__sec["str_offsets"]
+        base = self.__data_off
+        return self.__mm[base + o[sid]:base + o[sid + 1]].decode()
+
+    def __string_bytes(self, sid):
+        o = self.__sec["str_offsets"]
+        base = self.__data_off
+        return self.__mm[base + o[sid]:base + o[sid + 1]]
+
+    def entry_words(self, eid):
+        o = self.__sec["entry_offsets"]
+        return self.__sec["entry_data"][o[eid]:o[eid + 1]]
+
+    def __search(self, sids, key):
+        key = str.encode(key)
+        lo, hi = 0, len(sids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__string_bytes(sids[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(sids) and self.__string_bytes(sids[lo]) == key:
+            return lo
+        return -1
+
+    def entry(self, eid):
+        return SnapshotEntry(self, eid)
+
+    def get(self, word, variant=''):
+        k = self.__search(self.__sec["key_sids"], f"{normalize_key(word)}#{variant}")
+        if k < 0:
+            return None
+        return self.entry(self.__sec["key_entries"][k])
+
+    def lemmas_for(self, form):
+        k = self.__search(self.__sec["form_sids"], normalize_key(form))
+        if k < 0:
+            return []
+        ptr = self.__sec["form_ptr"]
+        return [self.entry(e) for e in self.__sec["form_entries"][ptr[k]:ptr[k + 1]]]
+
+def open_default(offline=False):
+    """
+        The snapshot of PULVIS_SNAPSHOT, else when `offline` the one
+        installed by bundle.py, None if there is neither. Online the
+        entries of a bundle would never be refreshed, they are fetched
+        and cached as any other.
+    """
+    path = os.environ.get("PULVIS_SNAPSHOT")
+    if not path and offline and os.path.exists(DEFAULT_PATH):
+        path = DEFAULT_PATH
+    return Snapshot(path) if path else None
+
+if __name__ == "__main__":
+    import argparse
+    from core import default_core
+
+    parser = argparse.ArgumentParser(description="Build a read-only snapshot of the entry cache")
+    parser.add_argument("output")
+    args = parser.parse_args()
+
+    n = build_snapshot(default_core().entries.entries(), args.output)
+    print(f"{n} entries written to {args.output}")
@@ -0,0 +1,50 @@
+import os, sys, tempfile
+
+import pytest
+
+# the modules live at the top of the repository, and tests never touch
+# the cache of the user
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["PULVIS_CACHE"] = tempfile.mkdtemp(prefix="pulvis-test-")
+os.environ.pop("PULVIS_SNAPSHOT", None)
+os.environ.pop("PULVIS_OFFLINE", None)
+
+class StubEntry:
+    """
+        The LatinDictEntry interface the caches, indexes and snapshots
+        read, over a real WordMeaning and the given flexion tables
+    """
+    def __init__(self, lemma, gramma="", meanings=(), variant="", flexions=None):
+        from xdict import WordMeaning
+        self.meaning = WordMeaning.from_plain(lemma, gramma, meanings)
+        self.require_clarify = False
+        self.__variant = variant
+        self.__flexions = flexions or {}
+
+    def variant(self):
+        return self.__variant
+
+    def similars(self):
+        return []
+
+    def explaination(self):
+        return None
+
+    def flexions(self):
+        return self.__flexions
+
+    def sources(self):
+        return []
+
+    def missing(self):
+        return []
+
+    def is_partial(self):
+        return False
+
+    def is_generated(self):
+        return False
+
+@pytest.fixture
+def make_entry():
+    return StubEntry
@@ -0,0 +1,65 @@
+# small pages in the markup of the online dictionary
+
+ENTRY = """<html><body><div id="myth">
+<span class="lemma">amo</span> <span class="grammatica">verb, 1st conjugation</span>
+<span class="english">to love</span>, <span class="english">to like</span>
+</div></body></html>"""
+
+DISAMBIGUATION = """<html><body><div class="ff_search_container">
+<div><div>1</div><div><a href="latin-english-dictionary.php?lemma=malum1">malum</a> <span>(noun) apple</span></div></div>
+<div><div>2</div><div><a href="latin-english-dictionary.php?lemma=malum2">malum</a> <span>(noun) evil</span></div></div>
+</div></body></html>"""
+
+FLEXION = """<html><body><div class="conjugation-container">
+<div class="ff_head">ACTIVE</div>
+<div class="background-red">Indicative</div>
+<div class="background-green">Present</div>
+<div class="ff_tbl_container">
+<div class="ff_row"><span>I sing.:</span><span><span class="radice">am</span><span class="desinenza">o</span></span></div>
+<div class="ff_row"><span>II sing.:</span><span><span class="radice">am</span><span class="desinenza">as</span></span></div>
+</div>
+</div></body></html>"""
+
+REVERSE = """<html><body><div id="myth">
+<span class="lemma">love</span> <span class="grammatica">verb</span>
+<span class="english">amo, diligo</span>
+<span class="lemma">apple</span> <span class="grammatica">noun</span>
+<span class="english">malum</span>
+</div></body></html>"""
+
+def flexion_rows(stem, labels, endings):
+    return "\n".join(
+        f'<div class="ff_row"><span>{label}:</span><span><span class="radice">{stem}</span>'
+        f'<span class="desinenza">{ending}</span></span></div>'
+        for label, ending in zip(labels, endings)
+    )
+
+CASES = ["Nom.", "Gen.", "Dat.", "Acc.", "Voc.", "Abl."]
+
+NOUN_FLEXION = f"""<html><body><div class="conjugation-container">
+<div class="background-red">Singular</div>
+<div class="ff_tbl_container">
+{flexion_rows("ros", CASES, ["a", "ae", "ae", "am", "a", "ā"])}
+</div>
+<div class="background-red">Plural</div>
+<div class="ff_tbl_container">
+{flexion_rows("ros", CASES, ["ae", "ārum", "īs", "ās", "ae", "īs"])}
+</div>
+</div></body></html>"""
+
+def adjective_plane(gender, stem, singular, plural):
+    return f"""<div class="background-red">{gender}</div>
+<div class="background-green">Singular</div>
+<div class="ff_tbl_container">
+{flexion_rows(stem, CASES, singular)}
+</div>
+<div class="background-green">Plural</div>
+<div class="ff_tbl_container">
+{flexion_rows(stem, CASES, plural)}
+</div>"""
+
+ADJECTIVE_FLEXION = f"""<html><body><div class="conjugation-container">
+{adjective_plane("Masculine", "bon", ["us", "ī", "ō", "um", "e", "ō"], ["ī", "ōrum", "īs", "ōs", "ī", "īs"])}
+{adjective_plane("Feminine", "bon", ["a", "ae", "ae", "am", "a", "ā"], ["ae", "ārum", "īs", "ās", "ae", "īs"])}
+{adjective_plane("Neuter", "bon", ["um", "ī", "ō", "um", "um", "ō"], ["a", "ōrum", "īs", "a", "a", "īs"])}
+</div></body></html>"""
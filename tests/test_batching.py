@@ -0,0 +1,47 @@
+from explainer import ExplainBatcher, FakeBackend, BatchedExplaination, match_entries
+
+class ShuffledBackend(FakeBackend):
+    # answers every batch in reverse order, with the same count
+    name = "shuffled"
+
+    def explain(self, words, on_partial=None, subjects=None):
+        expl = super().explain(words, on_partial, subjects)
+        return BatchedExplaination(expl.entries[::-1], self.name, expl.elapsed)
+
+def test_reordered_answers_reach_their_words():
+    batcher = ExplainBatcher(ShuffledBackend(), window=0.2)
+    try:
+        words = ["amo", "laudo", "porto", "rosa"]
+        futs = [batcher.submit(w) for w in words]
+        assert [f.result(timeout=5).expression for f in futs] == words
+    finally:
+        batcher.close()
+
+def test_unmatched_expressions_fall_back_to_order():
+    entries = FakeBackend().explain(["amo", "Laudo!", "extra"]).entries
+    got = match_entries(["laudo", "amo", "porto"], entries)
+    assert [e.expression for e in got] == ["Laudo!", "amo", "extra"]
+
+def test_missing_answers_are_none():
+    entries = FakeBackend().explain(["amo"]).entries
+    assert [e and e.expression for e in match_entries(["porto", "amo"], entries)] == [None, "amo"]
+
+def explainer_with(tmp_path, backend, fallback_after):
+    from explainer import Explainer
+    explainer = Explainer(api_key_file=str(tmp_path / "none"), fallback_after=fallback_after)
+    explainer.add_backend(backend, select=True)
+    return explainer
+
+def test_batched_answers_are_counted(tmp_path):
+    explainer = explainer_with(tmp_path, FakeBackend(), 5)
+    assert explainer.submit("amo").result(timeout=5).expression == "amo"
+    assert explainer.stats["fake"].calls == 1
+
+def test_slow_batches_are_answered_locally(tmp_path):
+    import time
+    explainer = explainer_with(tmp_path, FakeBackend(latency=0.5), 0.1)
+    ent = explainer.submit("amo").result(timeout=0.4)
+    assert ent.explain_semantic == "No meaning of amo is recorded locally."
+    assert explainer.stats["local"].calls == 1
+    time.sleep(0.6)
+    assert explainer.stats["fake"].calls == 1
@@ -0,0 +1,42 @@
+import json
+
+from bundle import Bundle, export_bundle, import_bundle
+from cache import FormIndex, MeaningIndex
+from paradigm import Paradigms
+from snapshot import Snapshot
+
+def indexes(root, name):
+    d = root / name
+    return (FormIndex(str(d / "forms.pickle")), MeaningIndex(str(d / "meanings.pickle")),
+            Paradigms(str(d / "paradigms.pickle")))
+
+def test_import_replaces_what_the_previous_bundle_indexed(tmp_path, make_entry):
+    entries = [make_entry("rosa", "noun", ["rose"]), make_entry("malum", "noun", ["apple"])]
+    forms, meanings, paradigms = indexes(tmp_path, "src")
+    for e in entries:
+        forms.add_entry(e)
+        meanings.add_entry(e)
+    path = str(tmp_path / "dict.bundle")
+    export_bundle(path, entries, forms, meanings, paradigms)
+
+    with Bundle(path) as b:
+        assert json.loads(b.section("forms"))["rosa"] == [["rosa", "", "noun"]]
+
+    forms, meanings, paradigms = indexes(tmp_path, "dst")
+    forms.add("lupus", "lupus", "", "noun")
+    meanings.add("wolf", "lupus", "", "noun")
+    local = make_entry("canis", "noun", ["dog"])
+    snap_path = str(tmp_path / "entries.snap")
+    import_bundle(path, forms, meanings, paradigms, snapshot_path=snap_path, entries=[local])
+
+    assert forms.lookup("lupus") == ()
+    assert not meanings.search("wolf")
+    assert forms.lookup("rosa") == (("rosa", "", "noun"), )
+    assert forms.lookup("canis") == (("canis", "", "noun"), )
+    assert [l for _, l, _ in meanings.search("apple")] == [[("malum", "", "noun")]]
+
+    snap = Snapshot(snap_path)
+    try:
+        assert snap.get("malum").meaning.meanings == ["apple"]
+    finally:
+        snap.close()
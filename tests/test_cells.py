@@ -0,0 +1,33 @@
+import pickle
+
+from paradigm import GeneratedTable
+from cells import find_cells
+
+def table():
+    return GeneratedTable.from_plain((
+        ("Indicative", (
+            ("Perfect", (("I sing.", (("amav", "i", ""), )), ("III plur.", (("amav", "erunt", ""), )))),
+            ("Future perfect", (("III plur.", (("amav", "erint", ""), )), )),
+        )),
+    ))
+
+def test_cells_by_label_and_position():
+    t = table()
+    assert t.cell("indicative", "perfect", "3rd plural").forms == [("amav", "erunt", "")]
+    assert t.cell("Indicative", "Perfect", 0, alt=0) == ("amav", "i", "")
+    assert t.cell("indicative", "perfect", "2nd plural") is None
+
+def test_queries_select_whole_titles():
+    found = find_cells({ "active": table() }, "active perfect 3rd plural")
+    assert [(k, c.forms) for k, c in found] == [
+        (("active", "Indicative", "Perfect", "III plur."), [("amav", "erunt", "")]),
+    ]
+    assert len(find_cells({ "active": table() }, "3rd plural")) == 2
+    assert find_cells({ "active": table() }, "pluperfect") == []
+
+def test_index_is_not_pickled():
+    t = table()
+    t.cell("indicative", "perfect", 0)
+    copy = pickle.loads(pickle.dumps(t))
+    assert "_CellLookup__index" not in vars(copy)
+    assert copy.cell("indicative", "perfect", "1st singular").forms == [("amav", "i", "")]
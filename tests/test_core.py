@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from core import LookupCore
+from deadline import Deadline, LookupCancelled
+from xdict import OfflineError
+
+class Partial:
+    def is_partial(self):
+        return True
+
+def building(core, word):
+    # as if another thread was building the entry of `word`
+    fut = Future()
+    core._LookupCore__inflight[core.entries.key(word, '')] = fut
+    return fut
+
+def test_waiters_keep_to_their_own_deadline(tmp_path):
+    core = LookupCore(root=str(tmp_path), offline=True)
+    building(core, "amo")
+    start = time.monotonic()
+    with pytest.raises(LookupCancelled):
+        core.lookup("amo", deadline=Deadline(total=0.3))
+    assert time.monotonic() - start < 2
+
+def test_waiters_do_not_get_a_partial_entry(tmp_path):
+    core = LookupCore(root=str(tmp_path), offline=True)
+    fut = building(core, "amo")
+    fut.set_result(Partial())
+    # the waiter builds its own entry, which offline means none at all
+    with pytest.raises(OfflineError):
+        core.lookup("amo", deadline=Deadline(total=5))
+
+def test_offline_cores_leave_a_given_explainer_alone(tmp_path):
+    from explainer import Explainer
+    shared = Explainer(api_key_file=str(tmp_path / "none"))
+    own = LookupCore(root=str(tmp_path / "a"), offline=True).explainer
+    LookupCore(root=str(tmp_path / "b"), explainer=shared, offline=True)
+    assert own.enabled() and own.backend() is own.local
+    assert not shared.enabled()
+
+def test_default_snapshot_is_only_opened_offline(tmp_path, monkeypatch, make_entry):
+    import snapshot
+    path = str(tmp_path / "entries.snap")
+    snapshot.build_snapshot([make_entry("amo", "verb", ["to love"])], path)
+    monkeypatch.setattr(snapshot, "DEFAULT_PATH", path)
+    assert snapshot.open_default() is None
+    snap = snapshot.open_default(offline=True)
+    try:
+        core = LookupCore(root=str(tmp_path), snapshot=snap, offline=True)
+        assert core.lookup("amo").meaning.meanings == ["to love"]
+    finally:
+        snap.close()
+
+def test_offline_entries_without_a_flexion_page_keep_their_meaning(tmp_path):
+    from pages import ENTRY
+    from xdict import LookupContext
+    core = LookupCore(root=str(tmp_path), offline=True)
+    core.pages.put(LookupContext("amo").entry, ENTRY)
+    ent = core.lookup("amo")
+    assert ent.meaning.meanings == ["to love", "to like"]
+    assert ent.missing() == [("flexion", "offline")]
+
+def test_offline_forms_resolve_to_their_lemma(tmp_path, make_entry):
+    from snapshot import Snapshot, build_snapshot
+    path = str(tmp_path / "entries.snap")
+    build_snapshot([
+        make_entry("amo", "verb", ["to love"], "1"),
+        make_entry("malum", "noun", ["apple"], "1"),
+        make_entry("malus", "adjective", ["bad"], "1"),
+    ], path)
+    snap = Snapshot(path)
+    try:
+        core = LookupCore(root=str(tmp_path / "cache"), snapshot=snap, offline=True)
+        core.forms.add("amat", "amo", "1", "verb")
+        core.forms.add("mali", "malum", "1", "noun")
+        core.forms.add("mali", "malus", "1", "adjective")
+
+        assert core.lookup("amat").meaning.meanings == ["to love"]
+
+        ent = core.lookup("mali")
+        assert ent.require_clarify and ent.meaning is None
+        assert [(a.lctx.word, a.lctx.variant, a.explain) for a in ent.similars()] == [
+            ("malum", "1", "apple"), ("malus", "1", "bad"),
+        ]
+    finally:
+        snap.close()
+
+def test_stand_in_explanations_are_not_cached(tmp_path):
+    from explainer import Explainer, FakeBackend
+    from pages import ENTRY, FLEXION
+    from xdict import LookupContext
+    explainer = Explainer(api_key_file=str(tmp_path / "none"), fallback_after=0.1)
+    explainer.add_backend(FakeBackend(latency=0.5), select=True)
+    core = LookupCore(root=str(tmp_path), explainer=explainer, offline=True)
+    ctx = LookupContext("amo")
+    core.pages.put(ctx.entry, ENTRY)
+    core.pages.put(ctx.conj_url, FLEXION)
+
+    ent = core.lookup("amo")
+    assert ent.missing() == [("explanation", "answered by local")]
+    assert core.entries.get("amo", "") is None
+
+    time.sleep(0.6)
+    ent = core.lookup("amo")
+    assert ent.explaination().explain_grammar.startswith("grammar of amo")
+    assert core.entries.get("amo", "") is not None
@@ -0,0 +1,51 @@
+import os
+
+from bs4 import BeautifulSoup
+
+import memory
+from cache import MeaningIndex
+from xdict import (parse_entry_page, parse_flexion_page, parse_reverse_entries,
+                   Ambiguity, WordMeaning, FlexionTable, ReverseDictTokenStream)
+from pages import ENTRY, DISAMBIGUATION, FLEXION, REVERSE
+
+def assert_released(*objs):
+    for obj in objs:
+        assert memory.retained_trees(obj) == []
+
+def test_entry_page_keeps_no_tree():
+    plain = parse_entry_page(ENTRY)
+    _, _, meaning, _ = plain
+    assert meaning[0] == "amo"
+    assert_released(plain, WordMeaning.from_plain(*meaning))
+
+def test_disambiguation_keeps_no_tree():
+    plain = parse_entry_page(DISAMBIGUATION)
+    candidates, require_clarify, _, _ = plain
+    assert require_clarify and [c[1] for c in candidates] == ["1", "2"]
+    assert_released(plain, [Ambiguity.from_plain(*c) for c in candidates])
+
+def test_parsed_ambiguities_keep_no_tree():
+    page = BeautifulSoup(DISAMBIGUATION, 'html.parser')
+    li = page.find_all('div', recursive=True)[1].find_all('div', recursive=False)[1]
+    a = Ambiguity(li)
+    assert (a.word, a.lctx.variant, a.property) == ("malum", "1", "noun")
+    assert_released(a)
+
+def test_flexion_page_keeps_no_tree():
+    plain = parse_flexion_page(FLEXION)
+    voice, table, _, _ = plain
+    assert voice == "active"
+    t = FlexionTable.from_plain(table)
+    assert t.cell("indicative", "present", "2nd singular").forms == [("am", "as", "")]
+    assert_released(plain, t)
+
+def test_reverse_entries_keep_no_tree():
+    container = BeautifulSoup(REVERSE, 'html.parser').find('div', id="myth")
+    meanings = MeaningIndex(os.devnull)
+    ents = list(parse_reverse_entries(ReverseDictTokenStream(container), meanings))
+    assert [e.lemma for e in ents] == ["love", "apple"]
+    assert_released(ents, meanings)
+
+def test_trees_are_found():
+    page = BeautifulSoup(ENTRY, 'html.parser')
+    assert memory.retained_trees({ "page": page.find(id="myth") })
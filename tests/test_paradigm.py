@@ -0,0 +1,95 @@
+from paradigm import (Paradigms, classify, apply_rule, plain_flexions, rule_label,
+                      RULES, MIN_SAMPLES, SAMPLE_EVERY)
+from xdict import WordMeaning, FlexionTable, parse_flexion_page
+from pages import NOUN_FLEXION, ADJECTIVE_FLEXION
+
+def forms(plain, voice, plane, group, cell):
+    tables = dict(plain)
+    groups = dict(dict(tables[voice])[plane])
+    return [f"{s}{e} {x}".strip() for s, e, x in dict(dict(groups)[group])[cell]]
+
+def fetched(make_entry, lemma, gramma):
+    # as a page would give it: other labels, stem and ending split elsewhere
+    key, stem = classify(lemma, gramma)
+    relabel = { "I sing.": "1st singular", "III plur.": "3rd plural" }
+    plain = tuple(
+        (voice, tuple(
+            (title, tuple(
+                (gtitle, tuple(
+                    (relabel.get(t, t), tuple((s[:-1], s[-1] + e, x) for s, e, x in fs))
+                    for t, fs in cells
+                )) for gtitle, cells in groups
+            )) for title, groups in planes
+        )) for voice, planes in apply_rule(RULES[key], stem)
+    )
+    return make_entry(lemma, gramma, flexions={ v: FlexionTable.from_plain(t) for v, t in plain })
+
+def test_rules_follow_the_regular_endings():
+    key, stem = classify("laudo", "verb, 1st conjugation")
+    plain = apply_rule(RULES[key], stem)
+    assert forms(plain, "active", "Indicative", "Perfect", "III plur.") == ["laudaverunt", "laudavere"]
+    assert forms(plain, "passive", "Indicative", "Perfect", "I sing.") == [
+        "laudatus sum", "laudata sum", "laudatum sum"]
+
+    key, stem = classify("rosa", "noun, feminine")
+    assert rule_label(key) == "declension 1 -a"
+    assert forms(apply_rule(RULES[key], stem), "inflection", "Plural", "DEFAULT", "Gen.") == ["rosarum"]
+
+def test_noun_rules_agree_with_a_fetched_page(make_entry):
+    voice, table, _, _ = parse_flexion_page(NOUN_FLEXION)
+    ent = make_entry("rosa", "noun, feminine", flexions={ voice: FlexionTable.from_plain(table) })
+    model = Paradigms(path="/dev/null")
+    assert model.observe(ent) is None
+    assert model.classes()[("declension", 1, "a")].agreed == 1
+
+    # whichever titles carry the number
+    relabelled = (("Declension", tuple((title, cells) for title, ((_, cells), ) in table)), )
+    ent = make_entry("rosa", "noun, feminine", flexions={ voice: FlexionTable.from_plain(relabelled) })
+    assert model.observe(ent) is None
+
+def test_adjective_rules_agree_with_a_page_laid_out_by_gender(make_entry):
+    voice, table, _, _ = parse_flexion_page(ADJECTIVE_FLEXION)
+    ent = make_entry("bonus", "adjective", flexions={ voice: FlexionTable.from_plain(table) })
+    model = Paradigms(path="/dev/null")
+    assert model.observe(ent) is None
+    assert model.classes()[("adjective", 1, "us")].agreed == 1
+
+def test_irregular_and_unknown_lemmas_have_no_rule():
+    assert classify("do", "verb, 1st conjugation") is None
+    assert classify("rex", "noun, 3rd declension") is None
+    assert classify("felix", "adjective") is None
+    assert classify("vetus", "adjective") is None
+
+def test_lemmas_sharing_a_regular_ending_have_no_rule():
+    for verb in ["seco", "veto", "sono", "domo", "cubo", "tono", "crepo", "increpo",
+                 "circumdo", "praesto", "adiuvo", "adjuvo"]:
+        assert classify(verb, "verb, 1st conjugation") is None, verb
+    assert classify("arma", "noun, neuter plural") is None
+    assert classify("poema", "noun, neuter") is None
+    assert classify("laudo", "transitive verb  I conjugation") is not None
+    assert classify("nauta", "noun, masculine") is not None
+
+def test_rules_are_trusted_once_fetched_tables_agree(make_entry):
+    model = Paradigms(path="/dev/null")
+    meaning = WordMeaning.from_plain("porto", "verb, 1st conjugation", [])
+    for lemma in ["amo", "laudo", "canto", "voco", "paro"][:MIN_SAMPLES]:
+        assert model.generate(meaning) is None
+        assert model.observe(fetched(make_entry, lemma, "verb, 1st conjugation")) is None
+    ent = make_entry("porto", "verb, 1st conjugation", flexions=model.generate(meaning))
+    assert plain_flexions(ent.flexions()) == model.predict("porto", "verb, 1st conjugation")
+
+def test_disagreeing_tables_are_reported(make_entry):
+    model = Paradigms(path="/dev/null")
+    ent = fetched(make_entry, "amo", "verb, 1st conjugation")
+    ent.flexions()["active"].planes["Indicative"].groups["Present"][0].forms = [("am", "eo", "")]
+    lines = model.observe(ent)
+    assert lines and "indicative / present" in lines[0]
+    assert model.classes()[("conjugation", 1, "o")].agreed == 0
+
+def test_trusted_rules_still_leave_samples_to_fetch(make_entry):
+    model = Paradigms(path="/dev/null")
+    for lemma in ["amo", "laudo", "canto", "voco", "paro"][:MIN_SAMPLES]:
+        model.observe(fetched(make_entry, lemma, "verb, 1st conjugation"))
+    meaning = WordMeaning.from_plain("porto", "verb, 1st conjugation", [])
+    generated = [model.generate(meaning) for _ in range(2 * SAMPLE_EVERY)]
+    assert sum(g is None for g in generated) == 2
@@ -0,0 +1,30 @@
+from snapshot import Snapshot, build_snapshot
+
+def build(tmp_path, entries):
+    path = str(tmp_path / "entries.snap")
+    build_snapshot(entries, path)
+    return Snapshot(path)
+
+def test_single_variant_is_the_bare_lemma(tmp_path, make_entry):
+    snap = build(tmp_path, [make_entry("amo", "verb", ["to love"], "1")])
+    try:
+        assert snap.get("amo").meaning.meanings == ["to love"]
+        assert snap.get("amo", "1").variant() == "1"
+    finally:
+        snap.close()
+
+def test_several_variants_ask_for_clarification(tmp_path, make_entry):
+    snap = build(tmp_path, [
+        make_entry("malum", "noun", ["apple"], "1"),
+        make_entry("malum", "noun", ["evil"], "2"),
+    ])
+    try:
+        ent = snap.get("malum")
+        assert ent.require_clarify and ent.meaning is None
+        assert [(a.lctx.word, a.lctx.variant, a.explain) for a in ent.similars()] == [
+            ("malum", "1", "apple"), ("malum", "2", "evil"),
+        ]
+        assert snap.get("malum", "2").meaning.meanings == ["evil"]
+        assert [e.variant() for e in snap.lemmas_for("malum")] == ["1", "2"]
+    finally:
+        snap.close()
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+import fakellm
+from explainer import Explaination
+
+LATENCY = 0.05
+
+@pytest.fixture
+def client():
+    server = fakellm.serve(0, latency=LATENCY, chunk_delay=0.002)
+    th = threading.Thread(target=server.serve_forever, daemon=True)
+    th.start()
+    try:
+        yield openai.OpenAI(api_key="fake", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_streamed_partials_grow_in_order(client):
+    words = ["amo (verb)", "laudo (verb)", "rosa (noun)"]
+    partials = []
+    e = Explaination(client, words, on_partial=partials.append)
+
+    assert [x.expression for x in e.entries] == words
+    assert len(partials) > len(words)
+
+    counts = [len(p.get("entries") or []) for p in partials]
+    assert counts == sorted(counts)
+    assert counts[-1] == len(words)
+
+    # every partial extends the previous one, expressions arrive in order
+    seen = []
+    for p in partials:
+        for i, entry in enumerate(p.get("entries") or []):
+            expr = entry.get("expression") or ""
+            if i < len(seen):
+                assert expr.startswith(seen[i]) or seen[i].startswith(expr)
+                seen[i] = max(seen[i], expr, key=len)
+            else:
+                seen.append(expr)
+    assert seen == words
+
+    final = partials[-1]["entries"]
+    assert [x["explain_semantic"] for x in final] == [x.explain_semantic for x in e.entries]
+
+def test_ttft_is_measured_on_the_first_partial(client):
+    e = Explaination(client, ["amo (verb)"], on_partial=lambda p: None)
+    assert LATENCY <= e.ttft <= e.elapsed
+    assert e.ttft < e.elapsed
+
+def test_without_callback_the_answer_is_not_streamed(client):
+    e = Explaination(client, ["amo (verb)"])
+    assert [x.expression for x in e.entries] == ["amo (verb)"]
+    assert e.ttft == e.elapsed
@@ -1,9 +1,8 @@
 import unicodedata
+from normalize import fold
 
 def remove_accents(text):
-    decomposed_text = unicodedata.normalize('NFD', text)
-    text_without_accents = ''.join(char for char in decomposed_text if unicodedata.category(char) != 'Mn')
-    return text_without_accents
+    return fold(text)
 
 def check_subset(ref, maybe_subset):
     return any([ e in ref for e in maybe_subset ])
@@ -1,4 +1,4 @@
-import itertools, textwrap
+import sys, itertools, textwrap
 
 def emph(s, no_reset=False):
     return f"\x1b[1;4m{s}" + ("\x1b[0m" if not no_reset else "")
@@ -17,6 +17,7 @@ class Formatter:
         self.__l = level
         self.__w_org = width
         self.__buffer = buffer
+        self.__flushed = 0
         self.__w = width - pad * 2 - level * len(Formatter.INDENT)
 
         self.__fmt = (" "*pad) + "%s" + (" "*pad)
@@ -43,6 +44,13 @@ class Formatter:
             r.append(self.__fmt%(s))
         return r
 
+    def flush(self):
+        r = []
+        for s in self.__buffer[self.__flushed:]:
+            r.append(self.__fmt%(s))
+        self.__flushed = len(self.__buffer)
+        return r
+
 def render_panel(panel, formatter, cols=3):
     pairs = list(panel.groups.items())
 
@@ -107,6 +115,8 @@ def render_entry(entry, formatter):
     formatter.append()
     formatter.append()
 
+    render_missing(entry, formatter)
+
     formatter.append(bold("LEMMA"))
     formatter.append()
     formatter.append(f"{bold(word.lemma)} - {it(word.gramma)}", offset=1)
@@ -131,10 +141,24 @@ def render_entry(entry, formatter):
     formatter.append()
 
     formatter.append(bold("FLEXIONS"))
+    if entry.is_generated():
+        formatter.append()
+        formatter.next_level().append(it("generated from a regular paradigm"))
     render_conjug(entry.flexions(), formatter.next_level())
     formatter.append()
 
 
+def render_missing(entry, formatter):
+    missing = entry.missing()
+    if not missing:
+        return
+
+    formatter.append(bold("PARTIAL RESULT"))
+    formatter.append()
+    for stage, reason in missing:
+        formatter.append(f"* {stage}: {it(reason)}", offset=1)
+    formatter.append()
+
 def render_reverse_ent(i, ent, formatter, render_explain=None):
     formatter.append(bold("LEMMA"))
     formatter.append()
@@ -167,17 +191,24 @@ def render_reverse_ent(i, ent, formatter, render_explain=None):
         
     
 
-def render_reverse(dict, formatter, render_explain=None):
+def iter_render_reverse(dict, formatter, render_explain=None):
     fmt = "{:^20}{:^%d}{:^20}"%(formatter.width() - 40)
     lem_var = dict.query
     formatter.append(fmt.format(lem_var, "ENGLISH-LATIN LOOKUP", lem_var))
     formatter.append()
     formatter.append()
 
-    for i, ent in enumerate(dict.entries):
+    for i, ent in enumerate(dict):
         formatter.append(bold(f"MATCH {i + 1}"))
         formatter.append()
         render_reverse_ent(i, ent, formatter.next_level(), render_explain)
+        yield ent
+
+    render_missing(dict, formatter)
+
+def render_reverse(dict, formatter, render_explain=None):
+    for _ in iter_render_reverse(dict, formatter, render_explain):
+        pass
 
 
 def render_expl_entry(ent, formatter):
@@ -219,4 +250,87 @@ def render_explaination(explain, formatter):
         render_expl_entry(entry, nextl)
         nextl.append()
 
-    formatter.append()
\ No newline at end of file
+    formatter.append()
+
+EXPL_FIELDS = [
+    ("expression", None),
+    ("explain_grammar", "GRAMMAR"),
+    ("explain_semantic", "SEMANTIC"),
+    ("explain_nuances", "NUANCES"),
+]
+
+class ExplainStreamPrinter:
+    # Prints partially parsed explainations as their fields grow.
+    # Fields arrive in order, so only the tail of the field being
+    # generated needs to be written out on each update.
+    def __init__(self, on_start=None, out=sys.stdout):
+        self.__on_start = on_start
+        self.__out = out
+        self.__reset()
+
+    def __reset(self):
+        self.__entry = 0
+        self.__field = 0
+        self.__text = None
+        self.__first = ""
+
+    def __is_new_response(self, entries):
+        if len(entries) < self.__entry + (self.__text is not None):
+            return True
+
+        first = entries[0].get("expression") or "" if entries else ""
+        if not (first.startswith(self.__first) or self.__first.startswith(first)):
+            return True
+
+        if len(first) > len(self.__first):
+            self.__first = first
+        return False
+
+    def __write(self, s):
+        self.__out.write(s)
+        self.__out.flush()
+
+    def __field_value(self, entries, i, f):
+        if i >= len(entries):
+            return None
+        return entries[i].get(EXPL_FIELDS[f][0])
+
+    def __call__(self, partial):
+        if self.__on_start:
+            self.__on_start()
+            self.__on_start = None
+
+        entries = partial.get("entries") or []
+        if self.__is_new_response(entries):
+            self.__write("\x1b[0m\n")
+            self.__reset()
+            self.__is_new_response(entries)
+
+        while True:
+            text = self.__field_value(entries, self.__entry, self.__field)
+            if text is None:
+                return
+
+            if self.__text is None:
+                title = EXPL_FIELDS[self.__field][1]
+                if title:
+                    self.__write(f"\n  {bold(title)}\n    ")
+                else:
+                    self.__write(f"\n{emph('', no_reset=True)}")
+                self.__text = ""
+
+            self.__write(text[len(self.__text):])
+            self.__text = text
+
+            nxt_entry, nxt_field = self.__entry, self.__field + 1
+            if nxt_field == len(EXPL_FIELDS):
+                nxt_entry, nxt_field = nxt_entry + 1, 0
+            if self.__field_value(entries, nxt_entry, nxt_field) is None:
+                return
+
+            self.__write("\x1b[0m\n")
+            self.__entry, self.__field, self.__text = nxt_entry, nxt_field, None
+
+    def finish(self):
+        if self.__text is not None:
+            self.__write("\x1b[0m\n")
@@ -1,8 +1,13 @@
-import requests, re
+import requests, re, itertools, threading
+from collections import deque
+from functools import wraps
 from bs4 import BeautifulSoup, Tag, NavigableString
 from utils import check_subset, remove_accents
+from cells import CellLookup
 
-from explainer import explainer
+from explainer import BatchedExplaination, ExplainSubject
+from deadline import LookupCancelled
+from concurrent.futures import TimeoutError as FutureTimeout
 
 def get_indent(level):
     return " " * (4 * level)
@@ -11,31 +16,152 @@ class EntryNotFoundException(Exception):
     def __init__(self, *args):
         super().__init__(*args)
 
+class OfflineError(EntryNotFoundException):
+    # what is not in the caches does not exist for an offline core
+    def __init__(self, url):
+        super().__init__(f"Offline, not in the local dictionary: {url}")
+        self.url = url
+
 class LookupContext:
     def __init__(self, word, variant = ''):
+        self.word = word
         self.variant = variant
 
         key = "parola" if not variant else "lemma"
         self.entry = f"https://www.online-latin-dictionary.com/latin-english-dictionary.php?{key}={word}{variant}"
         self.conj_url = f"https://www.online-latin-dictionary.com/latin-dictionary-flexion.php?{key}={word}{variant}"
 
-    def get_entry(self):
-        return LookupContext.get_html_object(self.entry)
-    
-    def get_flexion(self):
-        return LookupContext.get_html_object(self.conj_url)
-    
     @staticmethod
-    def request(path):
-        url = f"https://www.online-latin-dictionary.com/{path}"
-        return LookupContext.get_html_object(url) 
+    def url(path):
+        return f"https://www.online-latin-dictionary.com/{path}"
+
+class Transport:
+    """
+        Page fetching through a page cache, with conditional requests
+        once a cached page is stale. Safe to share between threads,
+        each thread gets its own HTTP session.
+    """
+    def __init__(self, pages, stats, rate_limiter=None, strip_pages=False, offline=False):
+        self.pages = pages
+        self.stats = stats
+
+        # never go to the network, cached pages are served however old
+        self.offline = offline
+
+        # optional object with an acquire() method, called before every
+        # request that actually goes to the network
+        self.rate_limiter = rate_limiter
+
+        # keep only the parts of a page the parsers look at in the page cache
+        self.strip_pages = strip_pages
+
+        self.__local = threading.local()
+
+    def session(self):
+        s = getattr(self.__local, "session", None)
+        if s is None:
+            s = self.__local.session = requests.Session()
+        return s
+
+    def request(self, path, timeout=None):
+        return self.get_html_object(LookupContext.url(path), timeout)
+
+    def fetch_text(self, url, timeout=None):
+        page = self.pages.load(url)
+        if page is not None and (self.offline or page.is_fresh(self.pages.max_age)):
+            self.stats.record(hits=1)
+            return page.text
+
+        text, _ = self.__download(url, page, timeout)
+        return text
+
+    def revalidate(self, url, timeout=None):
+        """
+            Check whether the cached copy of `url` is still current,
+            using a conditional GET once it is stale
+        """
+        # a fresh page needs no reading at all
+        if self.pages.is_fresh(url) or (self.offline and url in self.pages):
+            self.stats.record(hits=1)
+            return True
+
+        page = self.pages.load(url)
+        if page is None:
+            return False
 
-    @staticmethod
-    def get_html_object(url):
-        response = requests.get(url)            
-        response.raise_for_status()
+        _, modified = self.__download(url, page, timeout)
+        return not modified
+
+    def __download(self, url, cached=None, timeout=None):
+        if self.offline:
+            raise OfflineError(url)
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
 
-        return BeautifulSoup(response.text, 'html.parser')
+        headers = cached.validators() if cached else {}
+        response = self.session().get(url, headers=headers, timeout=timeout)
+
+        if cached is None:
+            self.stats.record(misses=1)
+        else:
+            self.stats.record(revalidations=1)
+
+        if response.status_code == 304 and cached is not None:
+            self.pages.touch(url)
+            self.stats.record(not_modified=1, bytes_saved=len(str.encode(cached.text)))
+            return cached.text, False
+
+        response.raise_for_status()
+        self.stats.record(bytes_downloaded=len(response.content))
+
+        text = response.text
+        if self.strip_pages:
+            text = strip_boilerplate(text)
+
+        self.pages.put(url, text, 
+                       response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+        modified = cached is None or text != cached.text
+        if not modified:
+            self.stats.record(not_modified=1)
+        return text, modified
+
+    def get_html_object(self, url, timeout=None):
+        return BeautifulSoup(self.fetch_text(url, timeout), 'html.parser')
+
+def is_content_block(t):
+    if t.get("id") == "myth":
+        return True
+    return check_subset(t.get("class", []), [
+        "disambigua", "ff_search_container", "conjugation-container"
+    ])
+
+def strip_boilerplate(text):
+    page = BeautifulSoup(text, 'html.parser')
+    kept = []
+    kept_ids = set()
+    for t in page.find_all(is_content_block):
+        if any(id(p) in kept_ids for p in t.parents):
+            continue
+        kept.append(t)
+        kept_ids.add(id(t))
+
+    return "<html><body>%s</body></html>" % "".join(str(t) for t in kept)
+
+def fetch_entry_stage(deadline, fetch):
+    # nothing can be shown without the entry page, so unlike the other
+    # stages running out of time here aborts the lookup
+    if deadline is None:
+        return fetch(None)
+
+    if not deadline.begin("entry"):
+        raise LookupCancelled("lookup cancelled")
+    try:
+        return fetch(deadline.timeout())
+    except requests.Timeout:
+        raise LookupCancelled("timed out fetching the entry")
+    finally:
+        deadline.end()
 
 class WordMeaning:
     def __init__(self, root : Tag):
@@ -46,6 +172,15 @@ class WordMeaning:
         for span in root.find_all("span", class_="english"):
             self.meanings.append(span.text)
 
+    @staticmethod
+    def from_plain(lemma, gramma, meanings):
+        m = WordMeaning.__new__(WordMeaning)
+        m.lemma, m.gramma, m.meanings = lemma, gramma, list(meanings)
+        return m
+
+    def plain(self):
+        return (self.lemma, self.gramma, tuple(self.meanings))
+
     def pretty_print(self, lvl):
         ids = get_indent(lvl)
         return [f'{ids} ({self.gramma})', 
@@ -66,6 +201,12 @@ class FlexionEntry:
         self.forms = []
         self.__parse_forms(forms)
 
+    @staticmethod
+    def from_plain(type, forms):
+        e = FlexionEntry.__new__(FlexionEntry)
+        e.type, e.forms = type, list(forms)
+        return e
+
     def __parse_forms(self, root):
         lst = []
         constructs = ['', [], '']
@@ -122,6 +263,14 @@ class FlexionPlane:
                         continue
                     arr.append(FlexionEntry(el))
                 self.groups[group_title] = arr
+
+    @staticmethod
+    def from_plain(groups):
+        p = FlexionPlane.__new__(FlexionPlane)
+        p.groups = {
+            title: [FlexionEntry.from_plain(t, forms) for t, forms in cells] for title, cells in groups
+        }
+        return p
         
     def pretty_print(self, level):
         ids = get_indent(level)
@@ -135,7 +284,7 @@ class FlexionPlane:
 
         return arr
 
-class FlexionTable:
+class FlexionTable(CellLookup):
     def __init__(self, root : Tag):
         self.planes = {}
 
@@ -156,6 +305,23 @@ class FlexionTable:
 
         if collects:
             self.planes[title] = FlexionPlane(collects)
+
+    @staticmethod
+    def from_plain(planes):
+        t = FlexionTable.__new__(FlexionTable)
+        t.planes = { title: FlexionPlane.from_plain(groups) for title, groups in planes }
+        return t
+
+    def plain(self):
+        """
+            The table as nested tuples, cheap to pickle across processes
+        """
+        return tuple(
+            (title, tuple(
+                (gtitle, tuple((c.type, tuple(c.forms)) for c in cells))
+                for gtitle, cells in plane.groups.items()
+            )) for title, plane in self.planes.items()
+        )
         
     def __find_all_stuff(self, t):
         classes = set(t.split(' '))
@@ -178,6 +344,30 @@ WORD_VAR=re.compile(r"^.*\?lemma=(?P<word>[^0-9]+)(?P<var>[0-9]+)$")
 EXTRACT=re.compile(r"^\((?P<prop>.+)\)(?P<mean>.*)$")
 MAYHAS_PARANTH=re.compile(r"^(\((?P<prop>.+)\))?\s*(?P<mean>.*)$")
 
+def find_disambigua_like(t):
+    if t == None:
+        return False
+    classes = set(t.split(' '))
+    return check_subset(classes, ["disambigua", "ff_search_container"])
+
+def parse_disambigua(root:Tag):
+    is_ambig = root.name == 'ul'
+    candidates = []
+    for li in root.children:
+        if not isinstance(li, Tag):
+            continue
+        if not is_ambig:
+            li = li.find_all('div', recursive=False)[1]
+
+        if li.a["href"] == '#':
+            continue
+        
+        candidates.append(Ambiguity(li))
+
+    # a search result list (rather than a 'see also' list) means
+    # the queried form belongs to several lemmas
+    return candidates, not is_ambig
+
 class Ambiguity:
     def __init__(self, ent):
         m = WORD_VAR.match(ent.a["href"]).groupdict()
@@ -189,6 +379,16 @@ class Ambiguity:
         self.explain = m2["mean"]
         self.property = m2["prop"]
 
+    @staticmethod
+    def from_plain(lemma, variant, word, explain, property):
+        a = Ambiguity.__new__(Ambiguity)
+        a.lctx = LookupContext(lemma, variant)
+        a.word, a.explain, a.property = word, explain, property
+        return a
+
+    def plain(self):
+        return (self.lctx.word, self.lctx.variant, self.word, self.explain, self.property)
+
     def __str__(self):
         return f"{self.word}   {self.explain} ({self.property})"
     
@@ -196,9 +396,76 @@ class Ambiguity:
         ids = get_indent(level)
         return f"{ids} {self.word} - {self.explain} ({self.property})"
 
+# Page parsers, from page text to plain tuples only, so that they can run
+# in another process (see LookupCore.parser). A parse tree is a web of
+# cycles, the parsers take it apart once done rather than leave it to the
+# cycle collector.
+
+def release_tree(page):
+    # decompose() on the document itself leaves its children linked
+    for node in list(page.contents):
+        node.decompose()
+    page.decompose()
+
+def parsed_page(fn):
+    @wraps(fn)
+    def parse(text):
+        page = BeautifulSoup(text, 'html.parser')
+        try:
+            return fn(page)
+        finally:
+            release_tree(page)
+    return parse
+
+@parsed_page
+def parse_entry_page(page):
+    """
+        (candidates, require_clarify, meaning, has_disambigua)
+    """
+    candidates, require_clarify = [], False
+    disambigua = page.find(class_=find_disambigua_like)
+    if disambigua:
+        candidates, require_clarify = parse_disambigua(disambigua)
+    candidates = [a.plain() for a in candidates]
+
+    body = None if require_clarify else page.find(id="myth")
+    meaning = WordMeaning(body).plain() if body else None
+    return candidates, require_clarify, meaning, disambigua is not None
+
+@parsed_page
+def parse_flexion_page(page):
+    """
+        (voice, table, opposite voice, opposite url) or None
+    """
+    conj = page.find('div', class_="conjugation-container")
+    if not conj:
+        return None
+
+    t = conj.find('div', recursive=False)
+    table = FlexionTable(conj).plain()
+    if t.text.startswith('ACTIVE'):
+        voice, opposite = "active", "passive"
+    elif t.text.startswith('PASSIVE'):
+        voice, opposite = "passive", "active"
+    else:
+        return "inflection", table, None, None
+
+    a_tag = conj.find('span', class_=['lnk'], recursive=False)
+    a_tag = a_tag.find('a', recursive=False) if a_tag else None
+    return voice, table, opposite, LookupContext.url(a_tag['href']) if a_tag else None
+
+@parsed_page
+def parse_table_page(page):
+    conj = page.find('div', class_="conjugation-container")
+    return FlexionTable(conj).plain() if conj else None
 
 class LatinDictEntry:
-    def __init__(self, word, variant=''):
+    # entries cached before generated flexions existed
+    __generated = False
+    # entries cached before their pages were recorded, see sources()
+    __sources = None
+
+    def __init__(self, word, variant='', on_explain=None, deadline=None, *, core):
         if isinstance(word, LookupContext):
             self.__context = word
         else:
@@ -206,88 +473,147 @@ class LatinDictEntry:
 
         self.__candidates = []
         self.__conj_table = {}
+        self.__explained = None
+        self.__sources = [self.__context.entry]
+        self.__deadline = deadline
+        self.__core = core
+        self.__missing = []
+        self.__opposite = None
+        self.__generated = False
         self.meaning = None
         self.require_clarify = False
-        self.__load_entry()
+        try:
+            self.__load_entry(on_explain)
+        finally:
+            if deadline:
+                self.__missing = list(deadline.missing)
+            # neither is part of the entry, nor can be pickled
+            self.__deadline = None
+            self.__core = None
+
+    @staticmethod
+    def clarify(word, candidates):
+        """
+            Entry asking which of `candidates` (Ambiguity) is meant by
+            `word`, as the disambiguation page of the site does
+        """
+        ent = LatinDictEntry.__new__(LatinDictEntry)
+        ent.__context = LookupContext(word)
+        ent.__candidates = list(candidates)
+        ent.__conj_table = {}
+        ent.__explained = None
+        ent.__sources = []
+        ent.__missing = []
+        ent.__opposite = None
+        ent.meaning = None
+        ent.require_clarify = True
+        return ent
+
+    def __timeout(self):
+        return self.__deadline.timeout() if self.__deadline else None
 
-    def __find_disambigua_like(self, t):
-        if t == None:
+    def __stage(self, name, fn, *args):
+        dl = self.__deadline
+        if dl is None:
+            try:
+                fn(*args)
+            except OfflineError:
+                self.__missing.append((name, "offline"))
+                return False
+            return True
+
+        if not dl.begin(name):
             return False
-        classes = set(t.split(' '))
-        return check_subset(classes, ["disambigua", "ff_search_container"])
+        try:
+            fn(*args)
+        except requests.Timeout:
+            dl.skip(name, "out of time")
+            return False
+        except OfflineError:
+            dl.skip(name, "offline")
+            return False
+        finally:
+            dl.end()
+        return True
 
-    def __load_entry(self):
-        ent = self.__context.get_entry()
-        disambigua = ent.find(class_=lambda x: self.__find_disambigua_like(x))
-        if disambigua:
-            self.__parse_disambigua(disambigua)
+    def __load_entry(self, on_explain=None):
+        url = self.__context.entry
+        transport = self.__core.transport
+        text = fetch_entry_stage(self.__deadline, lambda timeout: transport.fetch_text(url, timeout))
+        candidates, self.require_clarify, meaning, disambigua = self.__core.parse(parse_entry_page, text)
+        self.__candidates = [Ambiguity.from_plain(*a) for a in candidates]
 
         if self.require_clarify:
             return
 
-        body = ent.find(id="myth")
-        if not body:
+        if not meaning:
             if not disambigua:
                 raise EntryNotFoundException()
             return
         
-        self.__parse_entrybody(body)
-        self.__parse_flexion()
-
+        self.meaning = WordMeaning.from_plain(*meaning)
+
+        # regular paradigms need neither the flexion nor the opposite page
+        generated = self.__core.paradigms.generate(self.meaning)
+        if generated is not None:
+            self.__conj_table = generated
+            self.__generated = True
+        elif self.__stage("flexion", self.__parse_flexion) and self.__opposite:
+            oppon_conj, url = self.__opposite
+            if not self.__stage("opposite", self.__parse_opposite, oppon_conj, url):
+                self.__conj_table[oppon_conj] = None
+        self.__stage("explanation", self.__explain, on_explain)
+
+    def __explain(self, on_explain):
         words = f"{remove_accents(self.meaning.lemma)} ({self.meaning.gramma})"
-        e = explainer.explain([words])
-        if e:
-            self.__explained = e.entries[0]
+        subject = ExplainSubject(self.meaning.lemma, self.meaning.gramma,
+                                 self.meaning.meanings, self.__conj_table)
+        explainer = self.__core.explainer
+        e = explainer.explain([words], on_explain, [subject], self.__deadline)
+        if not e:
+            return
+
+        self.__explained = e.entries[0]
+        # an answer from another backend than the selected one stands in
+        # for a slow one, the entry is not cached so that the next lookup
+        # gets the late answer of the selected backend
+        if getattr(e, "backend", None) != explainer.backend().name:
+            reason = f"answered by {e.backend}"
+            if self.__deadline:
+                self.__deadline.skip("explanation", reason)
+            else:
+                self.__missing.append(("explanation", reason))
 
     def __parse_flexion(self):
-        flexion = self.__context.get_flexion()
-        conj = flexion.find('div', class_="conjugation-container")
-        if not conj:
+        self.__sources.append(self.__context.conj_url)
+        text = self.__core.transport.fetch_text(self.__context.conj_url, self.__timeout())
+        parsed = self.__core.parse(parse_flexion_page, text)
+        if not parsed:
             return
-        
-        t = conj.find('div', recursive=False)
-        oppon_conj = None
-        if t.text.startswith('ACTIVE'):
-            oppon_conj = "passive"
-            self.__conj_table["active"] = FlexionTable(conj)
-        elif t.text.startswith('PASSIVE'):
-            oppon_conj = "active"
-            self.__conj_table["passive"] = FlexionTable(conj)
-        else:
-            self.__conj_table["inflection"] = FlexionTable(conj)
+
+        voice, table, oppon_conj, url = parsed
+        self.__conj_table[voice] = FlexionTable.from_plain(table)
+        if oppon_conj is None:
             return
-        
-        a_tag = conj.find('span', class_=['lnk'], recursive=False)
-        a_tag = a_tag.find('a', recursive=False) if a_tag else None
-        if not a_tag:
+
+        if not url:
             self.__conj_table[oppon_conj] = None
             return
         
-        flex_oppon = LookupContext.request(a_tag['href'])
-        conj_oppon = flex_oppon.find('div', class_="conjugation-container")
-        self.__conj_table[oppon_conj] = FlexionTable(conj_oppon)
-
-
-    def __parse_entrybody(self, root:Tag):
-        self.meaning = WordMeaning(root)
+        self.__opposite = (oppon_conj, url)
 
-    def __parse_disambigua(self, root:Tag):
-        is_ambig = root.name == 'ul'
-        self.require_clarify = not is_ambig
-        for li in root.children:
-            if not isinstance(li, Tag):
-                continue
-            if not is_ambig:
-                li = li.find_all('div', recursive=False)[1]
-
-            if li.a["href"] == '#':
-                continue
-            
-            am = Ambiguity(li)
-            self.__candidates.append(am)
+    def __parse_opposite(self, oppon_conj, url):
+        self.__sources.append(url)
+        text = self.__core.transport.fetch_text(url, self.__timeout())
+        table = self.__core.parse(parse_table_page, text)
+        self.__conj_table[oppon_conj] = FlexionTable.from_plain(table) if table else None
 
     def flexions(self):
         return self.__conj_table
+
+    def sources(self):
+        # None when unknown, such an entry has to be fetched again
+        return self.__sources
     
     def similars(self):
         return self.__candidates
@@ -298,6 +624,21 @@ class LatinDictEntry:
     def explaination(self):
         return self.__explained
 
+    def is_generated(self):
+        """
+            True if the flexions come from the local paradigm generator
+        """
+        return self.__generated
+
+    def missing(self):
+        """
+            Stages left out of this entry, as (stage, reason) pairs
+        """
+        return self.__missing
+
+    def is_partial(self):
+        return bool(self.__missing)
+
     def pretty_print(self, level):
         ids = get_indent(level)
 
@@ -336,10 +677,37 @@ class ReverseDictEntry:
     def add_vocab_to_recent(self, val):
         self.gramma[self.__recent_gramma].append(val)
 
-    def update_explaination(self):
+    def add_vocab(self, gramma, val):
+        self.gramma.setdefault(gramma, []).append(val)
+
+    def update_explaination(self, explainer, on_explain=None, deadline=None):
+        subjects = {
+            k: [ExplainSubject(v, k, [self.lemma, n] if n else [self.lemma]) for v, n in vs]
+            for k, vs in self.gramma.items()
+        }
+
+        if on_explain:
+            for k, vs in self.gramma.items():
+                words = [f"{remove_accents(v)} ({k})" for v,_ in vs]
+                self.explains[k] = explainer.explain(words, on_explain, subjects[k], deadline)
+            return
+
+        # every word of every group goes through the micro-batcher,
+        # so the groups share LLM round-trips
+        pending = {}
         for k, vs in self.gramma.items():
-            words = [f"{remove_accents(v)} ({k})" for v,_ in vs]
-            self.explains[k] = explainer.explain(words)
+            pending[k] = [
+                explainer.submit(f"{remove_accents(v)} ({k})", s) for (v, _), s in zip(vs, subjects[k])
+            ]
+
+        for k, futs in pending.items():
+            try:
+                results = [f.result(timeout=deadline.timeout() if deadline else None) for f in futs]
+            except FutureTimeout:
+                deadline.skip("explanation", "out of time")
+                return
+            entries = [e for e in results if e]
+            self.explains[k] = BatchedExplaination(entries) if entries else None
 
     @staticmethod
     def createEntry(stream):
@@ -452,8 +820,18 @@ class ReverseDictToken:
 
 class ReverseDictTokenStream:
     def __init__(self, container: Tag):
+        self.__root = container
         self.__c = container.children
-        self.__next = []
+        self.__next = deque()
+
+    def close(self):
+        # the tokens hold tags, release the whole page with them
+        root = self.__root
+        while root.parent is not None:
+            root = root.parent
+        self.__next.clear()
+        self.__c = iter(())
+        release_tree(root)
 
     def __find_next(self):
         while True:
@@ -473,46 +851,142 @@ class ReverseDictTokenStream:
     
     def __next__(self):
         if self.__next:
-            return self.__next.pop(0)
+            return self.__next.popleft()
         return self.__find_next()
     
     def look_ahead(self, n = 1):
         try:
-            for _ in range(n):
-                nxt = self.__find_next()
-                self.__next.append(nxt)
-            return self.__next[-1]
+            while len(self.__next) < n:
+                self.__next.append(self.__find_next())
+            return self.__next[n - 1]
         except StopIteration:
             return None
 
 
 
+# Entries are parsed lazily: iterating yields each ReverseDictEntry as soon
+# as its tokens are consumed. Parsed entries are kept in `entries`, so a
+# second iteration replays them before resuming the parse.
+def parse_reverse_entries(tokens, meanings):
+    try:
+        while True:
+            try:
+                ent = ReverseDictEntry.createEntry(tokens)
+            except StopIteration:
+                return
+            if not ent:
+                continue
+
+            for k, vs in ent.gramma.items():
+                for v, _ in vs:
+                    meanings.add(ent.lemma, v, '', k)
+            yield ent
+    finally:
+        tokens.close()
+
+def local_reverse_entries(matches):
+    for gloss, lemmas, _ in matches:
+        ent = ReverseDictEntry()
+        ent.set_lemma(gloss)
+        for lemma, variant, gramma in lemmas:
+            ent.add_vocab(gramma, (lemma, ""))
+        yield ent
+
 class ReverseDict:
-    def __init__(self, word):
+    def __init__(self, word, limit=None, on_explain=None, deadline=None, local=True, *, core):
         self.query = word
-        obj = LookupContext.request(f"english-latin-dictionary.php?parola={word}")
+        self.__on_explain = on_explain
+        self.__deadline = deadline
+        self.__missing = []
+        self.entries = []
+        self.__limit = limit
+        self.__explainer = core.explainer
+
+        # answer from the meanings parsed so far when every query word is found
+        matches = core.meanings.search(word, limit, require_all=True) if local else None
+        self.local = bool(matches)
+        if self.local:
+            self.__source = local_reverse_entries(matches)
+            return
+
+        path = f"english-latin-dictionary.php?parola={word}"
+        obj = fetch_entry_stage(deadline, lambda timeout: core.transport.request(path, timeout))
         container = obj.find('div', id="myth")
         if not container:
             raise EntryNotFoundException()
-        
-        self.entries = []
 
-        tokens = ReverseDictTokenStream(container)
-        while True:
+        self.__source = parse_reverse_entries(ReverseDictTokenStream(container), core.meanings)
+
+    def __explain(self, ent):
+        dl = self.__deadline
+        explainer = self.__explainer
+        if dl is None:
+            ent.update_explaination(explainer, self.__on_explain)
+            return
+
+        if dl.begin("explanation"):
             try:
-                ent = ReverseDictEntry.createEntry(tokens)
-                if not ent:
-                    continue
-                self.entries.append(ent)
-            except StopIteration:
-                break
+                ent.update_explaination(explainer, self.__on_explain, dl)
+            finally:
+                dl.end()
+
+        self.__missing = list(dl.missing)
+        self.__deadline = None
+        self.__on_explain = None
+
+    def __parse_next(self):
+        if self.__source is None:
+            return None
+
+        if self.__limit is not None and len(self.entries) >= self.__limit:
+            self.__source.close()
+            self.__source = None
+            return None
+
+        ent = next(self.__source, None)
+        if ent is None:
+            # drop the stream so the parse tree can be released
+            self.__source = None
+            return None
+
+        if not self.entries:
+            self.__explain(ent)
+
+        self.entries.append(ent)
+        return ent
+
+    def __iter__(self):
+        i = 0
+        while True:
+            if i < len(self.entries):
+                yield self.entries[i]
+                i += 1
+                continue
+
+            if not self.__parse_next():
+                return
+
+    def completed(self):
+        return self.__source is None
+
+    def missing(self):
+        return self.__missing
+
+    def is_partial(self):
+        return bool(self.__missing)
+
+    def take(self, n):
+        return list(itertools.islice(self, n))
 
-        self.entries[0].update_explaination()
+    def load_all(self):
+        for _ in self:
+            pass
+        return self.entries
         
     def pretty_print(self, level):
         ids = get_indent(level)
         arr = []
-        for x in self.entries:
+        for x in self:
             arr.append(f"{ids} ENTRY")
             arr += x.pretty_print(level + 1)
         